@@ -5,9 +5,76 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
     DATABASE_URL: str = "postgresql+psycopg://luna:lunapass@db:5432/luna"
+    # Comma-separated read replica URLs for GET endpoints; empty sends all traffic to DATABASE_URL
+    READ_REPLICA_URLS: str = ""
+    REPLICA_HEALTH_CHECK_SECONDS: float = 10.0
+    # Connect timeout for replica health probes and replica sessions (PostgreSQL only)
+    REPLICA_CONNECT_TIMEOUT_SECONDS: int = 2
+    # How long a user's reads stay on the primary after they write
+    READ_YOUR_WRITES_SECONDS: float = 5.0
     APP_ENV: str = "local"
     LOG_LEVEL: str = "INFO"
+    # Access log sampling as "prefix=rate" pairs, e.g. "/health=0,/recommendations=0.1"
+    LOG_SAMPLE_RATES: str = ""
+    LOG_QUEUE_SIZE: int = 10000
     PORT: int = 8000
 
+    # Interest index rebuild interval, so writes made by other workers reach this one; 0 never rebuilds
+    INTEREST_INDEX_REFRESH_SECONDS: float = 60.0
+    # Social graph reload interval, for friendships written by other workers or seed scripts; 0 never reloads
+    SOCIAL_GRAPH_REFRESH_SECONDS: float = 60.0
+    # How often to check whether people suggestions need a background recompute; 0 never recomputes
+    PEOPLE_SUGGESTIONS_REFRESH_SECONDS: float = 30.0
+
+    # Startup warm-up: pool connections opened per database, and whether to load in-memory indexes
+    WARMUP_POOL_CONNECTIONS: int = 1
+    WARMUP_PRELOAD_CACHES: bool = True
+
+    # Reservation slot grid: SLOT_MINUTES-long slots from the start to the end hour, SLOT_HORIZON_DAYS ahead;
+    # a venue seats VENUE_DEFAULT_CAPACITY people per slot unless it sets its own capacity
+    SLOT_MINUTES: int = 60
+    SLOT_DAY_START_HOUR: int = 17
+    SLOT_DAY_END_HOUR: int = 23
+    SLOT_HORIZON_DAYS: int = 14
+    VENUE_DEFAULT_CAPACITY: int = 20
+
+    # Background sweeper: cancels stale PENDING reservations and declines dead invitations in bounded batches
+    SWEEPER_ENABLED: bool = True
+    SWEEPER_INTERVAL_SECONDS: float = 300.0
+    SWEEPER_BATCH_SIZE: int = 500
+    SWEEPER_MAX_BATCHES: int = 20
+    SWEEPER_BATCH_PAUSE_SECONDS: float = 0.05
+    PENDING_RESERVATION_TTL_HOURS: float = 72.0
+    # Hard-delete cancelled reservations this many days after their time; 0 keeps them
+    SWEEPER_PURGE_CANCELLED_AFTER_DAYS: int = 0
+    # Reservations this many days past are cold: the sweeper moves them to the archive tables and
+    # reservation queries leave them out; 0 keeps everything hot
+    RESERVATION_ARCHIVE_AFTER_DAYS: int = 0
+
+    # Server-sent events: "local" for one worker, "postgres" for LISTEN/NOTIFY fan-out across workers
+    EVENTS_BROKER: str = "local"
+    EVENTS_KEEPALIVE_SECONDS: float = 15.0
+    # Events buffered per open stream before it is told to resync
+    EVENTS_QUEUE_SIZE: int = 100
+    # Events waiting for the Postgres broker's publisher thread before new ones are dropped
+    EVENTS_PUBLISH_QUEUE_SIZE: int = 10000
+
+    # Per-request profiling (requests opt in with X-Profile: 1 or ?profile=1)
+    PROFILING_ENABLED: bool = False
+    PROFILE_DIR: str = "/tmp/luna-profiles"
+    PROFILE_SAMPLE_INTERVAL_MS: float = 1.0
+    # Profiles kept in PROFILE_DIR; older ones are deleted as new ones are written
+    PROFILE_MAX_PROFILES: int = 200
+
+    # Process-pool venue scoring; 0 workers keeps scoring in the request thread
+    RECOMMENDATION_WORKERS: int = 0
+    RECOMMENDATION_PARALLEL_THRESHOLD: int = 20000
+
+    # Distance scores are shared per geohash cell (precision 8 is ~38 m x 19 m); 0 cells scores exact locations
+    RECOMMENDATION_GEOHASH_PRECISION: int = 8
+    RECOMMENDATION_DISTANCE_CACHE_CELLS: int = 256
+    # Total distance-score slots cached across cells (8 bytes each), so large catalogues evict cells sooner
+    RECOMMENDATION_DISTANCE_CACHE_ENTRIES: int = 4_000_000
+
 
 settings = Settings()
@@ -1,6 +1,29 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import asyncio
+import itertools
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from fastapi import Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from app.config import settings
+from app.state import register
+
+logger = logging.getLogger(__name__)
+
+@event.listens_for(Engine, "connect")
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores ON DELETE CASCADE unless foreign keys are switched on for each connection
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
 
 engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -15,6 +38,168 @@ def get_db():
         db.close()
 
 
+def _connect_args(url: str, connect_timeout: int) -> dict:
+    # Bounds how long a probe or a request waits on an unreachable replica; SQLite has no such option
+    return {"connect_timeout": connect_timeout} if url.startswith("postgresql") else {}
+
+
+class ReplicaSet:
+    """
+    Read replicas picked round-robin, skipping ones that failed their last health check.
+
+    Replicas are probed with `SELECT 1` by `check_periodically`, a background
+    task started from `lifespan`, never on the request path; each probe gives
+    up after `connect_timeout` seconds. Unhealthy replicas are re-probed on the
+    same schedule, so they rejoin the rotation once they recover.
+    """
+
+    def __init__(self, urls: Iterable[str], check_interval: float = 10.0, connect_timeout: int = 2):
+        self.urls: List[str] = list(urls)
+        self.engines = [
+            create_engine(url, pool_pre_ping=True, connect_args=_connect_args(url, connect_timeout))
+            for url in self.urls
+        ]
+        self.sessionmakers = [
+            sessionmaker(autocommit=False, autoflush=False, bind=replica) for replica in self.engines
+        ]
+        self.check_interval = check_interval
+        self._healthy = [True] * len(self.urls)
+        self._next = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def _probe(self, position: int) -> bool:
+        try:
+            with self.engines[position].connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return True
+        except Exception:
+            return False
+
+    def check_all(self):
+        """Probe every replica once and update the rotation."""
+        for position in range(len(self.urls)):
+            healthy = self._probe(position)
+            if healthy != self._healthy[position]:
+                logger.warning(
+                    "Read replica %d is now %s", position, "healthy" if healthy else "unhealthy"
+                )
+            self._healthy[position] = healthy
+
+    async def check_periodically(self):
+        """Probe the replicas every `check_interval` seconds until cancelled."""
+        while True:
+            try:
+                await run_in_threadpool(self.check_all)
+            except Exception:
+                logger.exception("Read replica health check failed")
+            await asyncio.sleep(self.check_interval)
+
+    def session(self) -> Optional[Session]:
+        """A session on the next healthy replica, or None if there is none."""
+        if not self.urls:
+            return None
+        start = next(self._next)
+        for offset in range(len(self.urls)):
+            position = (start + offset) % len(self.urls)
+            if self._healthy[position]:
+                return self.sessionmakers[position]()
+        return None
+
+
+# Response header set on successful writes, and sent back by clients on their next reads
+LAST_WRITE_HEADER = "X-Last-Write"
+
+
+def last_write_token() -> str:
+    """Token for a response to a write: the wall-clock time of the write."""
+    return f"{time.time():.3f}"
+
+
+def wrote_recently(token: Optional[str]) -> bool:
+    """Whether a client token from LAST_WRITE_HEADER is younger than READ_YOUR_WRITES_SECONDS."""
+    try:
+        written_at = float(token)
+    except (TypeError, ValueError):
+        return False
+    return time.time() - written_at < settings.READ_YOUR_WRITES_SECONDS
+
+
+class PrimaryPins:
+    """
+    Users whose reads stay on this worker's primary session for a while after a write involves them.
+
+    Pins live in this process only. The writer itself carries its pin across
+    workers as the LAST_WRITE_HEADER token; these pins cover the other users a
+    write touches (invited participants, a group the agent booked), for reads
+    that land on the same worker.
+    """
+
+    def __init__(self):
+        self._until: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def pin(self, *user_ids: int):
+        until = time.monotonic() + settings.READ_YOUR_WRITES_SECONDS
+        with self._lock:
+            for user_id in user_ids:
+                self._until[user_id] = until
+
+    def is_pinned(self, user_id: int) -> bool:
+        with self._lock:
+            until = self._until.get(user_id)
+            if until is not None and until <= time.monotonic():
+                del self._until[user_id]
+                until = None
+        return until is not None
+
+    def clear(self):
+        with self._lock:
+            self._until.clear()
+
+
+read_replicas = ReplicaSet(
+    [url.strip() for url in settings.READ_REPLICA_URLS.split(",") if url.strip()],
+    check_interval=settings.REPLICA_HEALTH_CHECK_SECONDS,
+    connect_timeout=settings.REPLICA_CONNECT_TIMEOUT_SECONDS,
+)
+primary_pins = register(PrimaryPins())
+
+
+def get_read_db(request: Request, primary: Session = Depends(get_db)):
+    """
+    Session for read-only endpoints: a replica unless the read must see the primary.
+
+    The primary is used when no replica is configured or healthy, when the
+    client sends `X-Read-Consistency: strong`, when the client sends back a
+    recent LAST_WRITE_HEADER token, or when the `user_id` in the path is pinned
+    on this worker. The primary session is created either way (it only connects
+    when used), which keeps `get_db` overrides in tests effective here too.
+    """
+    user_id = request.path_params.get("user_id")
+    if (
+        request.headers.get("X-Read-Consistency", "").lower() == "strong"
+        or wrote_recently(request.headers.get(LAST_WRITE_HEADER))
+        or (user_id is not None and user_id.isdigit() and primary_pins.is_pinned(int(user_id)))
+    ):
+        yield primary
+        return
+
+    replica = read_replicas.session()
+    if replica is None:
+        yield primary
+        return
+
+    replica.info["replica"] = True
+    try:
+        yield replica
+    finally:
+        replica.close()
+
+
 def init_db():
     """Initialize database tables. Call this manually or via migration."""
+    from app import models  # noqa: F401 - registers the tables on Base.metadata
+
     Base.metadata.create_all(bind=engine)
@@ -1,43 +1,148 @@
+import atexit
+import copy
 import logging
+import logging.handlers
+import queue
+import random
 import sys
 import json
 from datetime import datetime
+from typing import Dict
 from app.config import settings
 
+# Extra attributes copied from the record into the JSON line when present
+EXTRA_FIELDS = (
+    "path",
+    "method",
+    "route",
+    "user_id",
+    "venue_id",
+    "reservation_id",
+    "status_code",
+    "duration_ms",
+    "error",
+    "warmup_ms",
+    "reservation_count",
+)
+
 
 class JSONFormatter(logging.Formatter):
     def format(self, record):
         log_data = {
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.utcfromtimestamp(record.created).isoformat(),
             "level": record.levelname,
             "message": record.getMessage(),
             "module": record.module,
             "function": record.funcName,
         }
 
-        if hasattr(record, "path"):
-            log_data["path"] = record.path
-        if hasattr(record, "method"):
-            log_data["method"] = record.method
-        if hasattr(record, "user_id"):
-            log_data["user_id"] = record.user_id
-        if hasattr(record, "status_code"):
-            log_data["status_code"] = record.status_code
+        for field in EXTRA_FIELDS:
+            if hasattr(record, field):
+                log_data[field] = getattr(record, field)
 
         if record.exc_info:
             log_data["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            log_data["exception"] = record.exc_text
+
+        return json.dumps(log_data, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hand records to a background listener without blocking the caller.
+
+    Message interpolation stays on the calling thread (args may reference
+    request-scoped objects), but JSON encoding and the stdout write happen on
+    the listener thread. When the queue is full the record is dropped and
+    counted instead of stalling the request.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class AccessLogSampler:
+    """
+    Decide whether an access log line should be written for a path.
+
+    Rates are configured as comma-separated `prefix=rate` pairs, e.g.
+    "/health=0,/recommendations=0.1". The longest matching prefix wins and
+    unmatched paths are always logged.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
 
-        return json.dumps(log_data)
+    @classmethod
+    def from_setting(cls, value: str) -> "AccessLogSampler":
+        rates = {}
+        for pair in value.split(","):
+            prefix, _, rate = pair.strip().partition("=")
+            if prefix and rate:
+                rates[prefix] = min(max(float(rate), 0.0), 1.0)
+        return cls(rates)
+
+    def rate_for(self, path: str) -> float:
+        for prefix, rate in self.rates:
+            if path.startswith(prefix):
+                return rate
+        return 1.0
+
+    def should_log(self, path: str) -> bool:
+        rate = self.rate_for(path)
+        return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+
+access_log_sampler = AccessLogSampler.from_setting(settings.LOG_SAMPLE_RATES)
+
+_listener = None
 
 
 def setup_logging():
+    global _listener
+
     logger = logging.getLogger()
     logger.setLevel(getattr(logging, settings.LOG_LEVEL.upper()))
 
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setFormatter(JSONFormatter())
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JSONFormatter())
+
+    stop_logging()
+    log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
 
     logger.handlers.clear()
-    logger.addHandler(handler)
+    logger.addHandler(NonBlockingQueueHandler(log_queue))
 
     return logger
+
+
+def stop_logging():
+    """Flush queued records and stop the background listener."""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
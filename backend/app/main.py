@@ -1,13 +1,24 @@
-from fastapi import FastAPI, Request, status
-from fastapi.responses import JSONResponse
+from fastapi import Depends, FastAPI, Request, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 import time
 
 from app.config import settings
-from app.logging_config import setup_logging
-from app.routers import users, venues, interests, recommendations, reservations
+from app.logging_config import setup_logging, access_log_sampler
+from app import metrics
+from app.db import LAST_WRITE_HEADER, last_write_token, read_replicas
+from app.services.aggregates import refresh_periodically as interest_index_loop
+from app.services.events import event_bus
+from app.services.graph import refresh_periodically as social_graph_loop
+from app.services.people import refresh_periodically as people_suggestions_loop
+from app.services.recommendation import shutdown_scoring_pool
+from app.services.sweeper import run_periodically as sweeper_loop
+from app.routers import users, venues, interests, recommendations, reservations, pages, events
+from app.warmup import warm_up
 
 # Setup logging
 logger = setup_logging()
@@ -16,8 +27,25 @@ logger = setup_logging()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Application starting", extra={"app_env": settings.APP_ENV})
+    # Configure mappers, compile hot queries, open pool connections and load indexes before serving
+    await run_in_threadpool(warm_up)
+    tasks = []
+    if len(read_replicas):
+        tasks.append(asyncio.create_task(read_replicas.check_periodically()))
+    if settings.SWEEPER_ENABLED:
+        tasks.append(asyncio.create_task(sweeper_loop()))
+    if settings.INTEREST_INDEX_REFRESH_SECONDS > 0:
+        tasks.append(asyncio.create_task(interest_index_loop()))
+    if settings.SOCIAL_GRAPH_REFRESH_SECONDS > 0:
+        tasks.append(asyncio.create_task(social_graph_loop()))
+    if settings.PEOPLE_SUGGESTIONS_REFRESH_SECONDS > 0:
+        tasks.append(asyncio.create_task(people_suggestions_loop()))
     yield
     logger.info("Application shutting down")
+    for task in tasks:
+        task.cancel()
+    event_bus.close()
+    shutdown_scoring_pool()
 
 
 app = FastAPI(
@@ -34,47 +62,44 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[LAST_WRITE_HEADER],
 )
 
 
 # Request logging middleware
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    start_time = time.time()
-
-    # Log incoming request
-    logger.info(
-        f"Incoming request",
-        extra={
-            "method": request.method,
-            "path": request.url.path,
-        },
-    )
+    start_time = time.perf_counter()
 
     try:
         response = await call_next(request)
 
-        # Log response
-        duration = time.time() - start_time
-        logger.info(
-            f"Request completed",
-            extra={
-                "method": request.method,
-                "path": request.url.path,
-                "status_code": response.status_code,
-                "duration_ms": round(duration * 1000, 2),
-            },
-        )
+        # One combined access line per request, subject to per-path sampling
+        path = request.url.path
+        if logger.isEnabledFor(logging.INFO) and (
+            response.status_code >= 500 or access_log_sampler.should_log(path)
+        ):
+            duration = time.perf_counter() - start_time
+            logger.info(
+                "Request completed",
+                extra={
+                    "method": request.method,
+                    "path": path,
+                    "status_code": response.status_code,
+                    "duration_ms": round(duration * 1000, 2),
+                },
+            )
 
         return response
 
     except Exception as e:
         # Log error without leaking stack trace in production
         logger.error(
-            f"Request failed",
+            "Request failed",
             extra={
                 "method": request.method,
                 "path": request.url.path,
+                "duration_ms": round((time.perf_counter() - start_time) * 1000, 2),
                 "error": str(e) if settings.APP_ENV == "local" else "Internal server error",
             },
         )
@@ -86,12 +111,78 @@ async def log_requests(request: Request, call_next):
         )
 
 
+# Read-your-writes token: clients send it back on their reads so any worker routes them to the primary
+@app.middleware("http")
+async def mark_writes(request: Request, call_next):
+    response = await call_next(request)
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        response.headers[LAST_WRITE_HEADER] = last_write_token()
+    return response
+
+
+# Metrics middleware (labels by route template so path params don't explode cardinality)
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    start_time = time.perf_counter()
+    status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    metrics.http_requests_in_flight.inc()
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        metrics.http_requests_in_flight.dec()
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "unmatched")
+        metrics.http_requests_total.labels(request.method, route_path, status_code).inc()
+        metrics.http_request_duration_seconds.labels(request.method, route_path).observe(
+            time.perf_counter() - start_time
+        )
+
+
+# Opt-in profiling middleware; not registered at all unless enabled
+if settings.PROFILING_ENABLED:
+    from app import profiling
+
+    profiling.install_db_timing()
+    # Registered before the routers are included, so every route gets it
+    app.router.dependencies.append(Depends(profiling.track_thread))
+
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        if not profiling.profiling_requested(request.headers, request.query_params):
+            return await call_next(request)
+
+        profile = profiling.RequestProfile(settings.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+        token = profiling.activate(profile)
+        profile.start()
+        try:
+            response = await call_next(request)
+        finally:
+            profile.stop()
+            profiling.deactivate(token)
+
+        await run_in_threadpool(
+            profile.write,
+            settings.PROFILE_DIR,
+            {"method": request.method, "path": request.url.path, "status_code": response.status_code},
+            settings.PROFILE_MAX_PROFILES,
+        )
+        logger.info(
+            "Profiled request %s", profile.id, extra={"method": request.method, "path": request.url.path}
+        )
+        response.headers["X-Profile-Id"] = profile.id
+        return response
+
+
 # Include routers
 app.include_router(users.router)
 app.include_router(venues.router)
 app.include_router(interests.router)
 app.include_router(recommendations.router)
 app.include_router(reservations.router)
+app.include_router(pages.router)
+app.include_router(events.router)
 
 
 @app.get("/")
@@ -106,3 +197,10 @@ def root():
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics_endpoint():
+    return PlainTextResponse(
+        metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,271 @@
+"""
+In-process Prometheus-style metrics.
+
+Writes are lock-free on the hot path: every thread increments its own cell
+and the exposition endpoint sums the cells when scraped. A lock is only
+taken the first time a thread touches a metric or a new label set appears.
+"""
+import math
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _ThreadCells:
+    """Per-thread accumulators of a fixed width, summed on read."""
+
+    def __init__(self, width: int):
+        self._width = width
+        self._local = threading.local()
+        self._cells: List[List[float]] = []
+        self._lock = threading.Lock()
+
+    def cell(self) -> List[float]:
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = [0.0] * self._width
+            with self._lock:
+                self._cells.append(cell)
+            self._local.cell = cell
+            return cell
+
+    def totals(self) -> List[float]:
+        with self._lock:
+            cells = list(self._cells)
+        totals = [0.0] * self._width
+        for cell in cells:
+            for i, value in enumerate(cell):
+                totals[i] += value
+        return totals
+
+
+class _Metric:
+    metric_type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._child(())
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _child(self, key: Tuple[str, ...]):
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._new_child()
+                    self._children[key] = child
+        return child
+
+    def labels(self, *values) -> "_Metric":
+        return self._child(tuple(str(v) for v in values))
+
+    def _label_str(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+
+class _ValueChild:
+    def __init__(self):
+        self._cells = _ThreadCells(1)
+
+    def inc(self, amount: float = 1.0):
+        self._cells.cell()[0] += amount
+
+    def dec(self, amount: float = 1.0):
+        self._cells.cell()[0] -= amount
+
+    def value(self) -> float:
+        return self._cells.totals()[0]
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def _new_child(self):
+        return _ValueChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def value(self) -> float:
+        return self._default.value()
+
+    def _render_child(self, key, child):
+        return [f"{self.name}{self._label_str(key)} {_fmt(child.value())}"]
+
+
+class Gauge(Counter):
+    """A counter that can go down; used for in-flight style values."""
+
+    metric_type = "gauge"
+
+    def dec(self, amount: float = 1.0):
+        self._default.dec(amount)
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self._buckets = buckets
+        # One slot per bucket, then sum and count
+        self._cells = _ThreadCells(len(buckets) + 2)
+
+    def observe(self, value: float):
+        cell = self._cells.cell()
+        for i, bound in enumerate(self._buckets):
+            if value <= bound:
+                cell[i] += 1
+                break
+        cell[-2] += value
+        cell[-1] += 1
+
+    def snapshot(self) -> List[float]:
+        return self._cells.totals()
+
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def _render_child(self, key, child):
+        totals = child.snapshot()
+        lines = []
+        cumulative = 0.0
+        for bound, count in zip(self.buckets, totals):
+            cumulative += count
+            label = self._label_str(key, ("le", _fmt(bound)))
+            lines.append(f"{self.name}_bucket{label} {_fmt(cumulative)}")
+        lines.append(f"{self.name}_bucket{self._label_str(key, ('le', '+Inf'))} {_fmt(totals[-1])}")
+        lines.append(f"{self.name}_sum{self._label_str(key)} {_fmt(totals[-2])}")
+        lines.append(f"{self.name}_count{self._label_str(key)} {_fmt(totals[-1])}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# HTTP
+http_requests_total = REGISTRY.counter(
+    "http_requests_total", "HTTP requests by route template and status code.", ("method", "route", "status")
+)
+http_request_duration_seconds = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route")
+)
+http_requests_in_flight = REGISTRY.gauge("http_requests_in_flight", "HTTP requests currently being served.")
+
+# Database
+db_queries_total = REGISTRY.counter("db_queries_total", "SQL statements executed.")
+
+# Recommendation engine
+recommendation_requests_total = REGISTRY.counter(
+    "recommendation_requests_total", "Recommendation lists generated."
+)
+recommendation_venues_scored_total = REGISTRY.counter(
+    "recommendation_venues_scored_total", "Venues scored by the recommendation engine."
+)
+recommendation_friends_considered_total = REGISTRY.counter(
+    "recommendation_friends_considered_total", "Friend candidates ranked by the recommendation engine."
+)
+recommendation_cache_hits_total = REGISTRY.counter(
+    "recommendation_cache_hits_total", "Recommendation cache lookups that hit.", ("cache",)
+)
+recommendation_cache_misses_total = REGISTRY.counter(
+    "recommendation_cache_misses_total", "Recommendation cache lookups that missed.", ("cache",)
+)
+coalesced_requests_total = REGISTRY.counter(
+    "coalesced_requests_total", "Calls that shared an identical in-flight computation.", ("flight",)
+)
+
+# Locking
+lock_wait_seconds = REGISTRY.histogram(
+    "lock_wait_seconds", "Time spent waiting for per-venue locks.", ("kind",)
+)
+
+# Reservation sweeper
+sweeper_batches_total = REGISTRY.counter(
+    "sweeper_batches_total", "Sweeper batches run, by action.", ("action",)
+)
+sweeper_rows_total = REGISTRY.counter(
+    "sweeper_rows_total", "Rows expired, declined or purged by the sweeper.", ("action",)
+)
+sweeper_run_seconds = REGISTRY.histogram("sweeper_run_seconds", "Duration of sweeper runs.")
+
+# Server-sent events
+events_published_total = REGISTRY.counter(
+    "events_published_total", "Events published to subscribers.", ("type",)
+)
+events_dropped_total = REGISTRY.counter(
+    "events_dropped_total", "Events dropped because a subscriber fell behind."
+)
+event_subscribers = REGISTRY.gauge("event_subscribers", "Open event streams in this worker.")
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    db_queries_total.inc()
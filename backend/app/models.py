@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, JSON, ForeignKey, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql import false
 from datetime import datetime
 import enum
 from app.db import Base
@@ -48,6 +49,8 @@ class Venue(Base):
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
     description = Column(String, nullable=True)
+    # Seats per reservation slot; None uses settings.VENUE_DEFAULT_CAPACITY
+    capacity = Column(Integer, nullable=True)
 
     interests = relationship("UserInterest", back_populates="venue", cascade="all, delete-orphan")
     reservations = relationship("Reservation", back_populates="venue")
@@ -80,6 +83,8 @@ class Friendship(Base):
 
 class Reservation(Base):
     __tablename__ = "reservations"
+    # Serves the per-venue time-window lookups in app.services.availability
+    __table_args__ = (Index("ix_reservations_venue_time", "venue_id", "time"),)
 
     id = Column(Integer, primary_key=True, index=True)
     venue_id = Column(Integer, ForeignKey("venues.id"), nullable=False)
@@ -87,19 +92,102 @@ class Reservation(Base):
     time = Column(DateTime, nullable=False)
     status = Column(SQLEnum(ReservationStatus), nullable=False, default=ReservationStatus.PENDING)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Booked by app.services.agent rather than by a user; only these take in more confirmed users
+    created_by_agent = Column(Boolean, nullable=False, default=False, server_default=false())
 
     venue = relationship("Venue", back_populates="reservations")
     creator = relationship("User", back_populates="reservations_created")
-    participants = relationship("ReservationParticipant", back_populates="reservation", cascade="all, delete-orphan")
+    # Participant rows go with the reservation through ON DELETE CASCADE, not one ORM DELETE each
+    participants = relationship(
+        "ReservationParticipant",
+        back_populates="reservation",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
 
 
 class ReservationParticipant(Base):
     __tablename__ = "reservation_participants"
 
     id = Column(Integer, primary_key=True, index=True)
-    reservation_id = Column(Integer, ForeignKey("reservations.id"), nullable=False)
+    reservation_id = Column(Integer, ForeignKey("reservations.id", ondelete="CASCADE"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     status = Column(SQLEnum(ParticipantStatus), nullable=False, default=ParticipantStatus.INVITED)
 
     reservation = relationship("Reservation", back_populates="participants")
     user = relationship("User", back_populates="reservation_participations")
+
+
+class ReservationArchive(Base):
+    """
+    Reservations moved out of `reservations` once they are long past (see app.services.archive).
+
+    On Postgres the table is range-partitioned by month on `time`, so the
+    partition key is part of the primary key. There are no foreign keys:
+    archived rows are history and don't hold up deleting users or venues.
+    """
+
+    __tablename__ = "reservations_archive"
+    __table_args__ = (
+        Index("ix_reservations_archive_creator_time", "created_by_user_id", "time"),
+        {"postgresql_partition_by": "RANGE (time)"},
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    time = Column(DateTime, primary_key=True)
+    venue_id = Column(Integer, nullable=False)
+    created_by_user_id = Column(Integer, nullable=False)
+    status = Column(SQLEnum(ReservationStatus), nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    created_by_agent = Column(Boolean, nullable=False)
+    archived_at = Column(DateTime, nullable=False)
+
+
+class ReservationParticipantArchive(Base):
+    """Participants of archived reservations, with the reservation's time copied in as the partition key."""
+
+    __tablename__ = "reservation_participants_archive"
+    __table_args__ = (
+        Index("ix_reservation_participants_archive_reservation", "reservation_id"),
+        Index("ix_reservation_participants_archive_user_time", "user_id", "time"),
+        {"postgresql_partition_by": "RANGE (time)"},
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    time = Column(DateTime, primary_key=True)
+    reservation_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    status = Column(SQLEnum(ParticipantStatus), nullable=False)
+
+
+class UserReservation(Base):
+    """
+    One row per reservation a user created or was invited to, maintained by app.services.plans.
+
+    The reservation's time and whether it is cancelled are copied in, so a
+    user's plans are one range read of ix_user_reservations_user_time.
+    """
+
+    __tablename__ = "user_reservations"
+    __table_args__ = (Index("ix_user_reservations_user_time", "user_id", "time", "reservation_id"),)
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    reservation_id = Column(
+        Integer, ForeignKey("reservations.id", ondelete="CASCADE"), primary_key=True, index=True
+    )
+    time = Column(DateTime, nullable=False)
+    cancelled = Column(Boolean, nullable=False, default=False)
+
+
+class PrecomputedRecommendation(Base):
+    """Location-independent recommendations computed by the batch job, served when no lat/lon is given."""
+
+    __tablename__ = "precomputed_recommendations"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    payload = Column(JSON, nullable=False)
+    computed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    stale = Column(Boolean, nullable=False, default=False)
+    invalidated_at = Column(DateTime, nullable=True)
+    # Bumped by every invalidation; the batch only stores over the version it read before its snapshot
+    version = Column(Integer, nullable=False, default=0, server_default="0")
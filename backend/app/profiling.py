@@ -0,0 +1,188 @@
+"""
+Opt-in per-request sampling profiler.
+
+Only loaded when PROFILING_ENABLED is set. A request asks to be profiled with
+an `X-Profile: 1` header or `?profile=1` query flag; while it runs, a sampler
+thread records the Python stacks of the threads that request runs on and
+SQLAlchemy events time every statement. Those threads are found through the
+request's context: the `track_thread` dependency, and every statement the
+request executes, register the thread they run in, so concurrent requests on
+other threads stay out of the profile. Two files are written per profiled
+request, and only the newest PROFILE_MAX_PROFILES profiles are kept:
+
+- `<id>.collapsed.txt`: collapsed stacks, loadable by speedscope or flamegraph.pl
+- `<id>.db.json`: DB time breakdown grouped by statement
+"""
+import glob
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Leaf frames of threads that are parked rather than doing work
+IDLE_FRAMES = {("threading.py", "wait"), ("queue.py", "get"), ("selectors.py", "select")}
+
+_active_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("active_profile", default=None)
+
+
+class RequestProfile:
+    def __init__(self, interval: float):
+        self.id = uuid.uuid4().hex[:12]
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.queries: Dict[str, List[float]] = {}
+        # Threads the request has run on; only these are sampled
+        self.thread_ids: Set[int] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started_at = 0.0
+        self.duration = 0.0
+
+    def start(self):
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self._started_at
+
+    def add_thread(self, thread_id: int):
+        if thread_id not in self.thread_ids:
+            with self._lock:
+                self.thread_ids = self.thread_ids | {thread_id}
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            thread_ids = self.thread_ids
+            frames = sys._current_frames()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+                if leaf in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def record_query(self, statement: str, seconds: float):
+        with self._lock:
+            self.queries.setdefault(statement, []).append(seconds)
+
+    def db_breakdown(self) -> dict:
+        statements = [
+            {
+                "statement": statement,
+                "count": len(timings),
+                "total_ms": round(sum(timings) * 1000, 3),
+                "max_ms": round(max(timings) * 1000, 3),
+            }
+            for statement, timings in self.queries.items()
+        ]
+        statements.sort(key=lambda s: s["total_ms"], reverse=True)
+        return {
+            "db_time_ms": round(sum(s["total_ms"] for s in statements), 3),
+            "db_query_count": sum(s["count"] for s in statements),
+            "statements": statements,
+        }
+
+    def write(self, directory: str, request_info: dict, keep: Optional[int] = None) -> str:
+        """
+        Write the collapsed stacks and DB breakdown; returns the collapsed file path.
+
+        Blocking file I/O: call it from a worker thread. With `keep`, older
+        profiles in `directory` beyond the newest `keep` are deleted.
+        """
+        os.makedirs(directory, exist_ok=True)
+        collapsed_path = os.path.join(directory, f"{self.id}.collapsed.txt")
+        with open(collapsed_path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        summary = {
+            **request_info,
+            "profile_id": self.id,
+            "duration_ms": round(self.duration * 1000, 3),
+            "samples": self.samples,
+            "sample_interval_ms": self.interval * 1000,
+            **self.db_breakdown(),
+        }
+        with open(os.path.join(directory, f"{self.id}.db.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+        if keep is not None:
+            prune(directory, keep)
+        return collapsed_path
+
+
+def prune(directory: str, keep: int):
+    """Delete all but the newest `keep` profiles in `directory`."""
+    summaries = sorted(glob.glob(os.path.join(directory, "*.db.json")), key=os.path.getmtime, reverse=True)
+    for summary in summaries[keep:]:
+        profile_id = os.path.basename(summary)[: -len(".db.json")]
+        for path in (summary, os.path.join(directory, f"{profile_id}.collapsed.txt")):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # A concurrent prune got there first
+                pass
+
+
+def profiling_requested(headers, query_params) -> bool:
+    flag = headers.get("x-profile") or query_params.get("profile")
+    return flag is not None and flag.lower() in ("1", "true", "yes")
+
+
+def activate(profile: RequestProfile):
+    return _active_profile.set(profile)
+
+
+def deactivate(token):
+    _active_profile.reset(token)
+
+
+def track_thread():
+    """Dependency registering the thread it runs in with the request's profile, if it has one."""
+    profile = _active_profile.get()
+    if profile is not None:
+        profile.add_thread(threading.get_ident())
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _active_profile.get()
+    if profile is not None:
+        profile.add_thread(threading.get_ident())
+        context._profile_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _active_profile.get()
+    started = getattr(context, "_profile_started", None)
+    if profile is not None and started is not None:
+        profile.record_query(statement, time.perf_counter() - started)
+
+
+def install_db_timing():
+    """Attach statement timing hooks (idempotent)."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,55 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import get_read_db
+from app.models import User as UserModel
+from app.services.events import Subscription, event_bus, format_sse
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+
+async def event_stream(request: Request, subscription: Subscription, keepalive: float):
+    """Yield SSE frames until the client disconnects or the bus closes the stream."""
+    try:
+        # Flushes the headers so the client knows the stream is open
+        yield ": connected\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), keepalive)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keepalive\n\n"
+                continue
+            if event is None:
+                break
+            yield format_sse(event)
+    finally:
+        event_bus.unsubscribe(subscription)
+
+
+@router.get("/{user_id}")
+async def stream_events(user_id: int, request: Request, db: Session = Depends(get_read_db)):
+    """
+    Stream reservation and interest changes for a user as server-sent events.
+
+    Event types: `reservation.created`, `reservation.updated`,
+    `reservation.cancelled`, `interest.updated`, and `resync` when events were
+    dropped and the client should refetch its reservations.
+    """
+    user = await run_in_threadpool(db.get, UserModel, user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Subscribe before responding so nothing published from here on is missed
+    subscription = event_bus.subscribe(user_id)
+    return StreamingResponse(
+        event_stream(request, subscription, settings.EVENTS_KEEPALIVE_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
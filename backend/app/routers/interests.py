@@ -3,15 +3,20 @@ from sqlalchemy.orm import Session
 from sqlalchemy import and_
 from typing import List
 from datetime import datetime, timedelta
-from app.db import get_db
+from app.db import get_db, get_read_db, primary_pins
 from app.models import (
     User as UserModel,
     Venue as VenueModel,
     UserInterest as UserInterestModel,
+    Friendship as FriendshipModel,
     InterestStatus,
 )
 from app.schemas import UserInterest, UserInterestCreate
 from app.services.agent import auto_create_reservation_if_ready
+from app.services.aggregates import interest_index
+from app.services.events import event_bus
+from app.services.people import people_suggestions
+from app.services.precompute import mark_stale
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,7 +25,7 @@ router = APIRouter(prefix="/users", tags=["interests"])
 
 
 @router.get("/{user_id}/interests", response_model=List[UserInterest])
-def get_user_interests(user_id: int, db: Session = Depends(get_db)):
+def get_user_interests(user_id: int, db: Session = Depends(get_read_db)):
     """Get all interests for a user."""
     user = db.query(UserModel).filter(UserModel.id == user_id).first()
     if not user:
@@ -60,10 +65,14 @@ def create_or_update_interest(
     if existing_interest:
         # Update existing interest
         existing_interest.status = interest.status
+        mark_stale(db, [user_id], include_followers=True)
         db.commit()
         db.refresh(existing_interest)
         logger.info(
-            f"Updated interest for user {user_id} in venue {interest.venue_id} to {interest.status}",
+            "Updated interest for user %s in venue %s to %s",
+            user_id,
+            interest.venue_id,
+            interest.status.value,
             extra={"user_id": user_id, "venue_id": interest.venue_id},
         )
         result_interest = existing_interest
@@ -75,14 +84,31 @@ def create_or_update_interest(
             status=interest.status,
         )
         db.add(db_interest)
+        mark_stale(db, [user_id], include_followers=True)
         db.commit()
         db.refresh(db_interest)
         logger.info(
-            f"Created interest for user {user_id} in venue {interest.venue_id} with status {interest.status}",
+            "Created interest for user %s in venue %s with status %s",
+            user_id,
+            interest.venue_id,
+            interest.status.value,
             extra={"user_id": user_id, "venue_id": interest.venue_id},
         )
         result_interest = db_interest
 
+    # Keep the materialized interest aggregates in sync with the committed row
+    interest_index.apply(user_id, interest.venue_id, interest.status)
+    primary_pins.pin(user_id)
+    people_suggestions.mark_interest_changed(user_id)
+
+    # The user's other sessions and everyone who lists them as a friend see the change
+    followers = db.query(FriendshipModel.user_id).filter(FriendshipModel.friend_id == user_id)
+    event_bus.publish(
+        [user_id, *(follower_id for follower_id, in followers)],
+        "interest.updated",
+        {"user_id": user_id, "venue_id": interest.venue_id, "status": interest.status.value},
+    )
+
     # If status is CONFIRMED, trigger agent to check for auto-reservation
     if interest.status == InterestStatus.CONFIRMED:
         # Get all users who have confirmed interest in this venue
@@ -101,8 +127,8 @@ def create_or_update_interest(
 
         # If 2 or more users confirmed, try to create reservation
         if len(confirmed_user_ids) >= 2:
-            # Set reservation time to tomorrow at 7 PM
-            reservation_time = datetime.now() + timedelta(days=1)
+            # Book the first slot with room from tomorrow at 7 PM on
+            reservation_time = datetime.utcnow() + timedelta(days=1)
             reservation_time = reservation_time.replace(hour=19, minute=0, second=0, microsecond=0)
 
             agent_result = auto_create_reservation_if_ready(
@@ -114,13 +140,16 @@ def create_or_update_interest(
             )
 
             if agent_result["success"]:
+                primary_pins.pin(*confirmed_user_ids)
                 logger.info(
-                    f"Auto-created reservation for venue {interest.venue_id}",
+                    "Auto-created reservation for venue %s",
+                    interest.venue_id,
                     extra={"venue_id": interest.venue_id, "user_count": len(confirmed_user_ids)},
                 )
             else:
                 logger.info(
-                    f"Agent did not create reservation: {agent_result['message']}",
+                    "Agent did not create reservation: %s",
+                    agent_result["message"],
                     extra={"venue_id": interest.venue_id},
                 )
 
@@ -0,0 +1,70 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.db import get_read_db
+from app.models import (
+    User as UserModel,
+    UserInterest as UserInterestModel,
+    Reservation as ReservationModel,
+    ReservationStatus,
+)
+from app.schemas import UserProfile, UserHome
+from app.routers.users import user_friendships
+from app.routers.reservations import user_reservations_query
+from app.routers.recommendations import load_recommendations, parse_user_location
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/users", tags=["pages"])
+
+
+@router.get("/{user_id}/profile", response_model=UserProfile)
+def get_user_profile(user_id: int, db: Session = Depends(get_read_db)):
+    """
+    Get everything the profile screen needs in one call.
+
+    Returns the user, their friendships (from the in-memory graph) and their venue interests.
+    """
+    user = db.query(UserModel).filter(UserModel.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    friends = user_friendships(db, user_id)
+    interests = db.query(UserInterestModel).filter(UserInterestModel.user_id == user_id).all()
+
+    return {"user": user, "friends": friends, "interests": interests}
+
+
+@router.get("/{user_id}/home", response_model=UserHome)
+def get_user_home(
+    user_id: int,
+    lat: Optional[float] = Query(None, description="User's current latitude"),
+    lon: Optional[float] = Query(None, description="User's current longitude"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of recommended venues (default all)"),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Get everything the home/discover screen needs in one call.
+
+    Returns the recommended venues (all of them, as `/recommendations` does,
+    unless `limit` is given) and the user's pending reservations.
+    """
+    user = db.query(UserModel).filter(UserModel.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    user_location = parse_user_location(lat, lon)
+    recommendations = load_recommendations(db, user_id, user_location, limit=limit)
+
+    pending_reservations = (
+        user_reservations_query(db, user_id)
+        .filter(ReservationModel.status == ReservationStatus.PENDING)
+        .all()
+    )
+
+    return {
+        "user": user,
+        "recommended_venues": recommendations,
+        "pending_reservations": pending_reservations,
+    }
@@ -1,23 +1,76 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import Optional
-from app.db import get_db
+from typing import List, Optional, Tuple
+from app.db import get_read_db
 from app.models import User as UserModel
-from app.schemas import RecommendationsResponse
-from app.services.recommendation import get_recommendations_for_user
+from app.schemas import RecommendationsResponse, RecommendedVenue
+from app.services.recommendation import distance_cache, get_recommendations_for_user
+from app.services.people import people_suggestions, MAX_SUGGESTIONS_PER_USER
+from app.services.precompute import get_precomputed
+from app.services.singleflight import SingleFlight
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/recommendations", tags=["recommendations"])
 
+# Concurrent identical requests (same user, location cell and limit) share one computation
+recommendation_flight = SingleFlight("recommendations")
+
+
+def parse_user_location(
+    lat: Optional[float], lon: Optional[float]
+) -> Optional[Tuple[float, float]]:
+    """Validate optional lat/lon query parameters and return them as a location tuple."""
+    if lat is not None and lon is not None:
+        if not (-90 <= lat <= 90):
+            raise HTTPException(status_code=422, detail="Latitude must be between -90 and 90")
+        if not (-180 <= lon <= 180):
+            raise HTTPException(status_code=422, detail="Longitude must be between -180 and 180")
+        return (lat, lon)
+    elif lat is not None or lon is not None:
+        raise HTTPException(
+            status_code=422, detail="Both latitude and longitude must be provided together"
+        )
+    return None
+
+
+def load_recommendations(
+    db: Session,
+    user_id: int,
+    user_location: Optional[Tuple[float, float]],
+    limit: Optional[int] = None,
+) -> List:
+    """
+    Serve the batch-precomputed list when no location is given, else score live.
+
+    Identical concurrent calls are coalesced; the shared result is a list of
+    validated `RecommendedVenue` models so it does not depend on the leader's session.
+    """
+
+    def compute() -> List[RecommendedVenue]:
+        recommendations = None
+        if user_location is None:
+            recommendations = get_precomputed(db, user_id, limit)
+        if recommendations is None:
+            recommendations = get_recommendations_for_user(db, user_id, user_location, limit=limit)
+        return [RecommendedVenue.model_validate(r) for r in recommendations]
+
+    # Primary and replica reads are not interchangeable for read-your-writes
+    key = (user_id, distance_cache.cell_key(user_location), limit, db.info.get("replica", False))
+    return recommendation_flight.do(key, compute)
+
 
 @router.get("/{user_id}", response_model=RecommendationsResponse)
 def get_recommendations(
     user_id: int,
     lat: Optional[float] = Query(None, description="User's current latitude"),
     lon: Optional[float] = Query(None, description="User's current longitude"),
-    db: Session = Depends(get_db),
+    include_people_suggestions: bool = Query(
+        False, description="Also suggest friends-of-friends to connect with"
+    ),
+    people_limit: int = Query(10, ge=1, le=MAX_SUGGESTIONS_PER_USER),
+    db: Session = Depends(get_read_db),
 ):
     """
     Get personalized venue and people recommendations for a user.
@@ -25,6 +78,8 @@ def get_recommendations(
     Query parameters:
     - lat: User's current latitude (optional)
     - lon: User's current longitude (optional)
+    - include_people_suggestions: Add second-degree connections to the response (optional)
+    - people_limit: Maximum number of suggested people (default 10)
 
     Returns ranked venues with scores and recommended people for each venue.
     """
@@ -34,24 +89,35 @@ def get_recommendations(
         raise HTTPException(status_code=404, detail="User not found")
 
     # Validate location parameters
-    user_location = None
-    if lat is not None and lon is not None:
-        if not (-90 <= lat <= 90):
-            raise HTTPException(status_code=422, detail="Latitude must be between -90 and 90")
-        if not (-180 <= lon <= 180):
-            raise HTTPException(status_code=422, detail="Longitude must be between -180 and 180")
-        user_location = (lat, lon)
-    elif lat is not None or lon is not None:
-        raise HTTPException(
-            status_code=422, detail="Both latitude and longitude must be provided together"
-        )
+    user_location = parse_user_location(lat, lon)
 
     # Get recommendations
-    recommendations = get_recommendations_for_user(db, user_id, user_location)
+    recommendations = load_recommendations(db, user_id, user_location)
 
     logger.info(
-        f"Generated {len(recommendations)} recommendations for user {user_id}",
+        "Generated %d recommendations for user %s",
+        len(recommendations),
+        user_id,
         extra={"user_id": user_id},
     )
 
-    return {"recommended_venues": recommendations}
+    response = {"recommended_venues": recommendations}
+
+    if include_people_suggestions:
+        suggestions = people_suggestions.suggestions_for(db, user_id, people_limit)
+        users = {}
+        if suggestions:
+            suggested_ids = [s.user_id for s in suggestions]
+            users = {u.id: u for u in db.query(UserModel).filter(UserModel.id.in_(suggested_ids))}
+        response["suggested_people"] = [
+            {
+                "user": users[s.user_id],
+                "score": s.score,
+                "mutual_friends": s.mutual_friends,
+                "shared_interests": s.shared_interests,
+            }
+            for s in suggestions
+            if s.user_id in users
+        ]
+
+    return response
@@ -1,18 +1,41 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import exists, select, update
+from typing import List, Literal, Optional
 from datetime import datetime
-from app.db import get_db
+from app.db import get_db, get_read_db, primary_pins
 from app.models import (
     User as UserModel,
     Venue as VenueModel,
     Reservation as ReservationModel,
     ReservationParticipant as ParticipantModel,
+    UserReservation,
     ParticipantStatus,
+    ReservationStatus,
 )
-from app.schemas import Reservation, ReservationCreate, ReservationAccept, AgentResult
-from app.services.agent import auto_create_reservation_if_ready, check_and_confirm_reservation
+from app.schemas import (
+    Reservation,
+    ReservationCreate,
+    ReservationAccept,
+    AgentResult,
+    InvitationResponses,
+    ReservationCancel,
+    ReservationCancelResult,
+)
+from app.services.agent import (
+    after_cancel,
+    auto_create_reservation_if_ready,
+    cancel_reservations,
+    check_and_confirm_reservation,
+    confirm_ready_reservations,
+    purge_reservations,
+    venue_booking_lock,
+)
+from app.services.archive import archived_reservations_for_user, hot_since
+from app.services.availability import CONFLICT_WINDOW, availability_index, find_same_group
+from app.services.events import event_bus, publish_reservation_event
+from app.services.plans import add_members
+from app.services.slots import slot_allocator
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,6 +43,56 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/reservations", tags=["reservations"])
 
 
+def reservation_detail_query(db: Session):
+    """Reservations with the relations the response schema needs preloaded."""
+    return db.query(ReservationModel).options(
+        joinedload(ReservationModel.venue),
+        selectinload(ReservationModel.participants).joinedload(ParticipantModel.user),
+    )
+
+
+def user_reservations_query(
+    db: Session,
+    user_id: int,
+    when: Optional[Literal["upcoming", "past"]] = None,
+    include_cancelled: bool = True,
+):
+    """
+    Reservations where the user is creator or participant, with response relations preloaded.
+
+    Reads the user's rows of the user_reservations index in time order; "past"
+    lists the most recent first. Archived (cold) reservations are left out;
+    `get_user_reservations` adds them from the archive tables.
+    """
+    query = (
+        reservation_detail_query(db)
+        .join(UserReservation, UserReservation.reservation_id == ReservationModel.id)
+        .filter(UserReservation.user_id == user_id)
+    )
+    if not include_cancelled:
+        query = query.filter(UserReservation.cancelled.is_(False))
+
+    now = datetime.utcnow()
+    since = hot_since(now)
+    if since is not None:
+        query = query.filter(UserReservation.time >= since)
+    if when == "past":
+        return query.filter(UserReservation.time < now).order_by(
+            UserReservation.time.desc(), UserReservation.reservation_id.desc()
+        )
+    if when == "upcoming":
+        query = query.filter(UserReservation.time >= now)
+    return query.order_by(UserReservation.time, UserReservation.reservation_id)
+
+
+def _reservation_active():
+    """Correlated condition for participant UPDATEs: the participant's reservation is not cancelled."""
+    return exists().where(
+        ReservationModel.id == ParticipantModel.reservation_id,
+        ReservationModel.status != ReservationStatus.CANCELLED,
+    )
+
+
 @router.post("", response_model=Reservation, status_code=201)
 def create_reservation(reservation: ReservationCreate, db: Session = Depends(get_db)):
     """
@@ -41,32 +114,70 @@ def create_reservation(reservation: ReservationCreate, db: Session = Depends(get
         if not user:
             raise HTTPException(status_code=404, detail=f"User {user_id} not found")
 
-    # Create reservation (first participant is the creator)
-    creator_id = reservation.participant_user_ids[0]
-
-    db_reservation = ReservationModel(
-        venue_id=reservation.venue_id,
-        created_by_user_id=creator_id,
-        time=reservation.time,
-    )
+    # Hold the venue so a concurrent request cannot book the same group or seats in between
+    with venue_booking_lock(
+        db,
+        reservation.venue_id,
+        reservation.time - CONFLICT_WINDOW,
+        reservation.time + CONFLICT_WINDOW,
+    ):
+        # Reject a second reservation for the same group in the same slot
+        duplicate = find_same_group(
+            db, reservation.venue_id, reservation.time, reservation.participant_user_ids
+        )
+        if duplicate:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Reservation {duplicate.id} already exists for these participants at this time",
+            )
 
-    db.add(db_reservation)
-    db.flush()
+        # Create reservation (first participant is the creator)
+        creator_id = reservation.participant_user_ids[0]
 
-    # Add participants
-    for user_id in reservation.participant_user_ids:
-        participant = ParticipantModel(
-            reservation_id=db_reservation.id,
-            user_id=user_id,
-            status=ParticipantStatus.INVITED,
+        db_reservation = ReservationModel(
+            venue_id=reservation.venue_id,
+            created_by_user_id=creator_id,
+            time=reservation.time,
         )
-        db.add(participant)
 
-    db.commit()
-    db.refresh(db_reservation)
+        db.add(db_reservation)
+        db.flush()
+
+        seats = len(reservation.participant_user_ids)
+        if not slot_allocator.book(db, reservation.venue_id, db_reservation.id, reservation.time, seats):
+            db.rollback()
+            raise HTTPException(status_code=409, detail="Venue has no room for this group at this time")
+
+        # Add participants
+        for user_id in reservation.participant_user_ids:
+            participant = ParticipantModel(
+                reservation_id=db_reservation.id,
+                user_id=user_id,
+                status=ParticipantStatus.INVITED,
+            )
+            db.add(participant)
+        add_members(db, db_reservation.id, reservation.time, reservation.participant_user_ids)
+
+        try:
+            db.commit()
+        except Exception:
+            slot_allocator.release(reservation.venue_id, db_reservation.id)
+            raise
+        db.refresh(db_reservation)
+        # Inside the lock, so the next request for this venue sees it
+        availability_index.add(db_reservation.venue_id, db_reservation.time, db_reservation.id)
+    primary_pins.pin(*reservation.participant_user_ids)
+    publish_reservation_event(
+        "reservation.created",
+        db_reservation,
+        venue_id=db_reservation.venue_id,
+        time=db_reservation.time.isoformat(),
+    )
 
     logger.info(
-        f"Created reservation {db_reservation.id} for venue {reservation.venue_id}",
+        "Created reservation %s for venue %s",
+        db_reservation.id,
+        reservation.venue_id,
         extra={"reservation_id": db_reservation.id, "venue_id": reservation.venue_id},
     )
 
@@ -81,106 +192,267 @@ def accept_reservation(accept: ReservationAccept, db: Session = Depends(get_db))
     This updates the participant's status and may trigger automatic reservation confirmation
     if all participants have accepted.
     """
-    # Verify reservation exists
-    reservation = (
-        db.query(ReservationModel).filter(ReservationModel.id == accept.reservation_id).first()
+    # Accept in place; no row back means a missing or cancelled reservation, user or participation
+    accepted = db.execute(
+        update(ParticipantModel)
+        .where(
+            ParticipantModel.reservation_id == accept.reservation_id,
+            ParticipantModel.user_id == accept.user_id,
+            _reservation_active(),
+        )
+        .values(status=ParticipantStatus.ACCEPTED)
+        .returning(ParticipantModel)
+    ).scalars().first()
+
+    if accepted is None:
+        existing = db.get(ReservationModel, accept.reservation_id)
+        if existing is None:
+            raise HTTPException(status_code=404, detail="Reservation not found")
+        if existing.status == ReservationStatus.CANCELLED:
+            raise HTTPException(status_code=409, detail="Reservation is cancelled")
+        if db.get(UserModel, accept.user_id) is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        raise HTTPException(
+            status_code=404, detail="User is not a participant in this reservation"
+        )
+
+    # Check if all participants have accepted and auto-confirm, in the same transaction. A
+    # confirmation comes back through RETURNING, as the accepted participant row did above;
+    # both are in the session, so the load below keeps their values.
+    check_and_confirm_reservation(db, accept.reservation_id)
+
+    # Deliberately one more read: the venue, the other participants and their users are in neither
+    # RETURNING and nothing earlier in this request loads them. One joined SELECT in the same
+    # transaction fetches all of them; the reservation and accepted rows it repeats keep their
+    # RETURNING values from the identity map.
+    reservation = Reservation.model_validate(
+        db.query(ReservationModel)
+        .options(
+            joinedload(ReservationModel.venue),
+            joinedload(ReservationModel.participants).joinedload(ParticipantModel.user),
+        )
+        .filter(ReservationModel.id == accept.reservation_id)
+        .one()
     )
-    if not reservation:
-        raise HTTPException(status_code=404, detail="Reservation not found")
+    db.commit()
 
-    # Verify user exists
-    user = db.query(UserModel).filter(UserModel.id == accept.user_id).first()
-    if not user:
+    logger.info(
+        "User %s accepted reservation %s",
+        accept.user_id,
+        accept.reservation_id,
+        extra={"user_id": accept.user_id, "reservation_id": accept.reservation_id},
+    )
+    primary_pins.pin(*(p.user_id for p in reservation.participants))
+    publish_reservation_event(
+        "reservation.updated",
+        reservation,
+        user_id=accept.user_id,
+        participant_status=ParticipantStatus.ACCEPTED.value,
+    )
+
+    if reservation.status == ReservationStatus.CONFIRMED:
+        message = "Reservation accepted and confirmed"
+    else:
+        message = "Reservation accepted, waiting for other participants"
+    return {"success": True, "message": message, "reservation": reservation}
+
+
+@router.post("/respond", response_model=List[Reservation])
+def respond_to_invitations(batch: InvitationResponses, db: Session = Depends(get_db)):
+    """
+    Accept or decline several invitations for one user in a single transaction.
+
+    Every affected reservation gets one set-based auto-confirm check. Either all
+    responses are applied or none are: if the user is not a participant in any
+    listed reservation, nothing changes and 404 lists the offending ids; if any
+    of them is cancelled, nothing changes and 409 lists those.
+    """
+    statuses = {}
+    for response in batch.responses:
+        if statuses.setdefault(response.reservation_id, response.status) != response.status:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Conflicting responses for reservation {response.reservation_id}",
+            )
+
+    if db.get(UserModel, batch.user_id) is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Find participant record
-    participant = (
-        db.query(ParticipantModel)
-        .filter(
-            and_(
-                ParticipantModel.reservation_id == accept.reservation_id,
-                ParticipantModel.user_id == accept.user_id,
+    updated = set()
+    for status in (ParticipantStatus.ACCEPTED, ParticipantStatus.DECLINED):
+        reservation_ids = [rid for rid, wanted in statuses.items() if wanted == status]
+        if reservation_ids:
+            updated.update(
+                db.execute(
+                    update(ParticipantModel)
+                    .where(
+                        ParticipantModel.user_id == batch.user_id,
+                        ParticipantModel.reservation_id.in_(reservation_ids),
+                        _reservation_active(),
+                    )
+                    .values(status=status)
+                    .returning(ParticipantModel.reservation_id)
+                ).scalars()
             )
-        )
-        .first()
-    )
 
-    if not participant:
+    missing = set(statuses) - updated
+    if missing:
+        cancelled = sorted(
+            db.execute(
+                select(ReservationModel.id).where(
+                    ReservationModel.id.in_(list(missing)),
+                    ReservationModel.status == ReservationStatus.CANCELLED,
+                )
+            ).scalars()
+        )
+        db.rollback()
+        if cancelled:
+            raise HTTPException(status_code=409, detail=f"Reservations {cancelled} are cancelled")
         raise HTTPException(
-            status_code=404, detail="User is not a participant in this reservation"
+            status_code=404, detail=f"User is not a participant in reservations {sorted(missing)}"
         )
 
-    # Update participant status
-    participant.status = ParticipantStatus.ACCEPTED
+    confirm_ready_reservations(db, list(statuses))
+
+    # Build the response before committing so it comes from this transaction's rows
+    rows = {
+        r.id: r
+        for r in reservation_detail_query(db).filter(ReservationModel.id.in_(list(statuses)))
+    }
+    reservations = [Reservation.model_validate(rows[rid]) for rid in statuses]
     db.commit()
 
     logger.info(
-        f"User {accept.user_id} accepted reservation {accept.reservation_id}",
-        extra={"user_id": accept.user_id, "reservation_id": accept.reservation_id},
+        "User %s responded to %d invitations",
+        batch.user_id,
+        len(statuses),
+        extra={"user_id": batch.user_id},
     )
-
-    # Check if all participants have accepted and auto-confirm
-    updated_reservation = check_and_confirm_reservation(db, accept.reservation_id)
-
-    if updated_reservation:
-        return {
-            "success": True,
-            "message": "Reservation accepted and confirmed",
-            "reservation": updated_reservation,
-        }
-    else:
-        db.refresh(reservation)
-        return {
-            "success": True,
-            "message": "Reservation accepted, waiting for other participants",
-            "reservation": reservation,
-        }
+    primary_pins.pin(*{p.user_id for r in reservations for p in r.participants})
+    for reservation in reservations:
+        if statuses[reservation.id] == ParticipantStatus.DECLINED:
+            # Hand the decliner's seat back now rather than at the venue's next rebuild
+            seats = sum(p.status != ParticipantStatus.DECLINED for p in reservation.participants)
+            slot_allocator.shrink(reservation.venue_id, reservation.id, seats)
+        publish_reservation_event(
+            "reservation.updated",
+            reservation,
+            user_id=batch.user_id,
+            participant_status=statuses[reservation.id].value,
+        )
+    return reservations
 
 
 @router.get("/{user_id}", response_model=List[Reservation])
-def get_user_reservations(user_id: int, db: Session = Depends(get_db)):
-    """Get all reservations for a user (as creator or participant)."""
+def get_user_reservations(
+    user_id: int,
+    include_cancelled: bool = False,
+    when: Optional[Literal["upcoming", "past"]] = Query(
+        None, description="Only reservations from now on (soonest first) or before now (latest first)"
+    ),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of reservations"),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Get a user's reservations (as creator or participant) in time order, cancelled ones only on request.
+
+    Reservations the sweeper has archived are read back from the archive
+    tables, so a user's history does not end at the hot horizon.
+    """
     user = db.query(UserModel).filter(UserModel.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Get reservations where user is creator or participant
-    reservations = (
-        db.query(ReservationModel)
-        .join(ParticipantModel)
-        .filter(
-            or_(
-                ReservationModel.created_by_user_id == user_id,
-                and_(
-                    ParticipantModel.reservation_id == ReservationModel.id,
-                    ParticipantModel.user_id == user_id,
-                ),
-            )
-        )
-        .distinct()
-        .all()
+    query = user_reservations_query(db, user_id, when=when, include_cancelled=include_cancelled)
+    if limit is not None:
+        query = query.limit(limit)
+    reservations = query.all()
+    if when == "upcoming":
+        return reservations
+
+    # Archived reservations are older than every hot one, so they go before (or after, newest first)
+    newest_first = when == "past"
+    if limit is not None and newest_first and len(reservations) == limit:
+        return reservations
+    archived = archived_reservations_for_user(
+        db, user_id, newest_first=newest_first, include_cancelled=include_cancelled, limit=limit
     )
+    if newest_first:
+        return (reservations + archived)[:limit]
+    return (archived + reservations)[:limit]
 
-    return reservations
+
+@router.post("/cancel", response_model=ReservationCancelResult)
+def cancel_reservations_in_bulk(cancel: ReservationCancel, db: Session = Depends(get_db)):
+    """Cancel several reservations with one UPDATE; missing or already cancelled ids are skipped."""
+    cancelled = cancel_reservations(db, set(cancel.reservation_ids))
+    db.commit()
+    after_cancel(cancelled)
+
+    cancelled_ids = {reservation["id"] for reservation in cancelled}
+    logger.info(
+        "Cancelled %d of %d reservations",
+        len(cancelled_ids),
+        len(set(cancel.reservation_ids)),
+        extra={"reservation_count": len(cancelled_ids)},
+    )
+    return {
+        "cancelled": sorted(cancelled_ids),
+        "skipped": sorted(set(cancel.reservation_ids) - cancelled_ids),
+    }
 
 
 @router.delete("/{reservation_id}")
-def cancel_reservation(reservation_id: int, db: Session = Depends(get_db)):
-    """Cancel/delete a reservation."""
-    reservation = (
-        db.query(ReservationModel).filter(ReservationModel.id == reservation_id).first()
+def cancel_reservation(reservation_id: int, purge: bool = False, db: Session = Depends(get_db)):
+    """
+    Cancel a reservation.
+
+    Cancelling sets the status to CANCELLED and keeps the reservation and its
+    participants as history. With `purge=true` the reservation is deleted
+    instead, and the database's ON DELETE CASCADE removes the participants.
+    """
+    if purge:
+        return _purge_reservation(reservation_id, db)
+
+    cancelled = cancel_reservations(db, [reservation_id])
+    if not cancelled:
+        if db.get(ReservationModel, reservation_id) is None:
+            raise HTTPException(status_code=404, detail="Reservation not found")
+        return {"success": True, "message": "Reservation already cancelled"}
+
+    db.commit()
+    after_cancel(cancelled)
+
+    logger.info(
+        "Cancelled reservation %s",
+        reservation_id,
+        extra={"reservation_id": reservation_id},
     )
 
-    if not reservation:
+    return {"success": True, "message": "Reservation cancelled"}
+
+
+def _purge_reservation(reservation_id: int, db: Session):
+    participant_ids = list(
+        db.scalars(
+            select(ParticipantModel.user_id).where(ParticipantModel.reservation_id == reservation_id)
+        )
+    )
+    purged = purge_reservations(db, [reservation_id])
+    if not purged:
         raise HTTPException(status_code=404, detail="Reservation not found")
 
-    # Delete the reservation (cascade will delete participants)
-    db.delete(reservation)
     db.commit()
+    _, venue_id = purged[0]
+    availability_index.remove(venue_id, {reservation_id})
+    slot_allocator.release(venue_id, reservation_id)
+    primary_pins.pin(*participant_ids)
+    event_bus.publish(participant_ids, "reservation.cancelled", {"reservation_id": reservation_id})
 
     logger.info(
-        f"Cancelled reservation {reservation_id}",
+        "Purged reservation %s",
+        reservation_id,
         extra={"reservation_id": reservation_id},
     )
 
-    return {"success": True, "message": "Reservation cancelled"}
+    return {"success": True, "message": "Reservation deleted"}
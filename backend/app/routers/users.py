@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
-from app.db import get_db
+from app.db import get_db, get_read_db, primary_pins
 from app.models import User as UserModel, Friendship as FriendshipModel
-from app.schemas import User, UserCreate, Friendship
+from app.schemas import User, UserCreate, Friendship, FriendshipCreate
+from app.services.graph import get_social_graph, social_graph
+from app.services.people import people_suggestions
+from app.services.precompute import mark_stale
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,6 +14,29 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/users", tags=["users"])
 
 
+def user_friendships(db: Session, user_id: int) -> List[dict]:
+    """A user's friendships read from the in-memory graph, with friend users fetched in one query."""
+    edges = get_social_graph(db).friendships(user_id)
+    if not edges:
+        return []
+
+    friends = {
+        u.id: u
+        for u in db.query(UserModel).filter(UserModel.id.in_([friend_id for _, friend_id, _ in edges]))
+    }
+    return [
+        {
+            "id": edge_id,
+            "user_id": user_id,
+            "friend_id": friend_id,
+            "strength": strength,
+            "friend": friends[friend_id],
+        }
+        for edge_id, friend_id, strength in edges
+        if friend_id in friends
+    ]
+
+
 @router.post("", response_model=User, status_code=201)
 def create_user(user: UserCreate, db: Session = Depends(get_db)):
     """Create a new user."""
@@ -18,20 +44,21 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    primary_pins.pin(db_user.id)
 
-    logger.info(f"Created user {db_user.id}", extra={"user_id": db_user.id})
+    logger.info("Created user %s", db_user.id, extra={"user_id": db_user.id})
     return db_user
 
 
 @router.get("", response_model=List[User])
-def list_users(db: Session = Depends(get_db)):
+def list_users(db: Session = Depends(get_read_db)):
     """List all users."""
     users = db.query(UserModel).all()
     return users
 
 
 @router.get("/{user_id}", response_model=User)
-def get_user(user_id: int, db: Session = Depends(get_db)):
+def get_user(user_id: int, db: Session = Depends(get_read_db)):
     """Get a specific user."""
     user = db.query(UserModel).filter(UserModel.id == user_id).first()
     if not user:
@@ -40,11 +67,57 @@ def get_user(user_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/{user_id}/friends", response_model=List[Friendship])
-def get_user_friends(user_id: int, db: Session = Depends(get_db)):
+def get_user_friends(user_id: int, db: Session = Depends(get_read_db)):
     """Get a user's friends and friendship strengths."""
     user = db.query(UserModel).filter(UserModel.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    friendships = db.query(FriendshipModel).filter(FriendshipModel.user_id == user_id).all()
-    return friendships
+    return user_friendships(db, user_id)
+
+
+@router.post("/{user_id}/friends", response_model=Friendship, status_code=201)
+def create_or_update_friendship(
+    user_id: int, friendship: FriendshipCreate, db: Session = Depends(get_db)
+):
+    """Add a friend, or update the strength of an existing friendship."""
+    if user_id == friendship.friend_id:
+        raise HTTPException(status_code=422, detail="Users cannot befriend themselves")
+
+    users = db.query(UserModel).filter(UserModel.id.in_([user_id, friendship.friend_id])).all()
+    if user_id not in {u.id for u in users}:
+        raise HTTPException(status_code=404, detail="User not found")
+    if friendship.friend_id not in {u.id for u in users}:
+        raise HTTPException(status_code=404, detail="Friend not found")
+
+    db_friendship = (
+        db.query(FriendshipModel)
+        .filter(
+            FriendshipModel.user_id == user_id,
+            FriendshipModel.friend_id == friendship.friend_id,
+        )
+        .first()
+    )
+    if db_friendship:
+        db_friendship.strength = friendship.strength
+    else:
+        db_friendship = FriendshipModel(
+            user_id=user_id, friend_id=friendship.friend_id, strength=friendship.strength
+        )
+        db.add(db_friendship)
+    mark_stale(db, [user_id])
+    db.commit()
+    db.refresh(db_friendship)
+
+    social_graph.upsert(user_id, friendship.friend_id, friendship.strength, db_friendship.id)
+    primary_pins.pin(user_id)
+    people_suggestions.mark_friendship_changed(user_id, friendship.friend_id)
+
+    logger.info(
+        "Set friendship %s -> %s to strength %s",
+        user_id,
+        friendship.friend_id,
+        friendship.strength,
+        extra={"user_id": user_id},
+    )
+    return db_friendship
@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from app.db import get_db
+from app.db import get_db, get_read_db
 from app.models import Venue as VenueModel
 from app.schemas import Venue, VenueCreate
+from app.services.catalogue import venue_catalogue
+from app.services.precompute import mark_stale
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,10 +18,13 @@ def create_venue(venue: VenueCreate, db: Session = Depends(get_db)):
     """Create a new venue."""
     db_venue = VenueModel(**venue.model_dump())
     db.add(db_venue)
+    # Every precomputed list could now include the new venue
+    mark_stale(db)
     db.commit()
     db.refresh(db_venue)
+    venue_catalogue.invalidate()
 
-    logger.info(f"Created venue {db_venue.id}", extra={"venue_id": db_venue.id})
+    logger.info("Created venue %s", db_venue.id, extra={"venue_id": db_venue.id})
     return db_venue
 
 
@@ -30,7 +35,7 @@ def list_venues(
     max_lat: Optional[float] = Query(None),
     min_lon: Optional[float] = Query(None),
     max_lon: Optional[float] = Query(None),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """
     List venues with optional filters.
@@ -58,7 +63,7 @@ def list_venues(
 
 
 @router.get("/{venue_id}", response_model=Venue)
-def get_venue(venue_id: int, db: Session = Depends(get_db)):
+def get_venue(venue_id: int, db: Session = Depends(get_read_db)):
     """Get a specific venue."""
     venue = db.query(VenueModel).filter(VenueModel.id == venue_id).first()
     if not venue:
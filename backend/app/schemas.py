@@ -1,6 +1,6 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
-from typing import Optional, List
+from typing import Literal, Optional, List
 from app.models import InterestStatus, ReservationStatus, ParticipantStatus
 
 
@@ -27,6 +27,8 @@ class VenueBase(BaseModel):
     latitude: float
     longitude: float
     description: Optional[str] = None
+    # Seats per reservation slot; the server default applies when unset
+    capacity: Optional[int] = Field(None, ge=1)
 
 
 class VenueCreate(VenueBase):
@@ -58,6 +60,11 @@ class UserInterest(BaseModel):
     created_at: datetime
 
 
+class FriendshipCreate(BaseModel):
+    friend_id: int
+    strength: float = Field(1.0, ge=0)
+
+
 class Friendship(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
@@ -79,8 +86,16 @@ class RecommendedVenue(BaseModel):
     recommended_people: List[RecommendedPerson]
 
 
+class SuggestedPerson(BaseModel):
+    user: User
+    score: float
+    mutual_friends: int
+    shared_interests: int
+
+
 class RecommendationsResponse(BaseModel):
     recommended_venues: List[RecommendedVenue]
+    suggested_people: List[SuggestedPerson] = []
 
 
 class ReservationCreate(BaseModel):
@@ -94,6 +109,26 @@ class ReservationAccept(BaseModel):
     user_id: int
 
 
+class InvitationResponse(BaseModel):
+    reservation_id: int
+    status: Literal[ParticipantStatus.ACCEPTED, ParticipantStatus.DECLINED]
+
+
+class InvitationResponses(BaseModel):
+    user_id: int
+    responses: List[InvitationResponse] = Field(..., min_length=1)
+
+
+class ReservationCancel(BaseModel):
+    reservation_ids: List[int] = Field(..., min_length=1)
+
+
+class ReservationCancelResult(BaseModel):
+    cancelled: List[int]
+    # Missing or already cancelled
+    skipped: List[int]
+
+
 class ReservationParticipant(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
@@ -120,3 +155,15 @@ class AgentResult(BaseModel):
     success: bool
     message: str
     reservation: Optional[Reservation] = None
+
+
+class UserProfile(BaseModel):
+    user: User
+    friends: List[Friendship]
+    interests: List[UserInterest]
+
+
+class UserHome(BaseModel):
+    user: User
+    recommended_venues: List[RecommendedVenue]
+    pending_reservations: List[Reservation]
@@ -1,7 +1,8 @@
-from datetime import datetime, timedelta
-from typing import List, Optional
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Collection, List, Optional, Tuple, Union
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import Select, and_, delete, exists, select, update
 from app.models import (
     UserInterest,
     Reservation,
@@ -10,6 +11,13 @@ from app.models import (
     ReservationStatus,
     ParticipantStatus,
 )
+from app.config import settings
+from app.db import primary_pins
+from app.services.availability import CONFLICT_WINDOW, availability_index, reservations_between
+from app.services.events import event_bus, publish_reservation_event
+from app.services.locks import is_shared, venue_lock
+from app.services.plans import add_members, mark_cancelled
+from app.services.slots import horizon_end, slot_allocator
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,13 +31,19 @@ def auto_create_reservation_if_ready(
     creator_user_id: int,
 ) -> dict:
     """
-    Automatically create a reservation if all users have confirmed interest.
+    Automatically book a reservation once all users have confirmed interest.
+
+    The group gets the earliest slot at or after `time` with room for all of
+    them (see app.services.slots). If some of the users already hold a
+    reservation the agent booked at the venue from `time` on, within the slot
+    horizon, the rest join it instead of a second reservation being booked.
+    Reservations users made themselves are never joined.
 
     Args:
         db: Database session
         venue_id: ID of the venue
         user_ids: List of user IDs who should be participating
-        time: Desired reservation time
+        time: Earliest acceptable reservation time
         creator_user_id: User who initiated the reservation
 
     Returns:
@@ -38,6 +52,58 @@ def auto_create_reservation_if_ready(
             - message: str
             - reservation: Optional[Reservation]
     """
+    start, end = _group_window(time)
+    # Concurrent confirmations for one venue must not both see "no reservation yet" and both book
+    with venue_booking_lock(db, venue_id, start, end):
+        return _book_group(db, venue_id, user_ids, time, creator_user_id, start, end)
+
+
+@contextmanager
+def venue_booking_lock(db: Session, venue_id: int, start: datetime, end: datetime):
+    """
+    Serialize bookings at one venue, with this process's view of [start, end] there brought up to date.
+
+    Only reservations in the window are re-read, so the cost of taking the
+    lock follows the bookings near the requested time, not the venue's history.
+    """
+    with venue_lock(db, venue_id):
+        if is_shared(db):
+            # Other workers may have booked since this process's indexes last saw the window
+            availability_index.reload_window(db, venue_id, start, end)
+            slot_allocator.refresh(db, venue_id, start, end)
+        yield
+
+
+def _group_window(time: datetime) -> Tuple[datetime, datetime]:
+    # Where a booking of ours for the group may already be: anywhere the allocator could have put it
+    return time - CONFLICT_WINDOW, max(horizon_end(), time + CONFLICT_WINDOW)
+
+
+def _hold_slot(
+    db: Session, venue_id: int, reservation_id: int, seats: int, not_before: datetime
+) -> Optional[datetime]:
+    """Book the earliest slot at or after `not_before` with room for `seats`; None if there is none."""
+    while True:
+        slot = slot_allocator.find(db, venue_id, seats, not_before)
+        if slot is None:
+            return None
+        if is_shared(db):
+            # The slot may lie past the window the lock refreshed; re-read just that slot
+            slot_allocator.refresh(db, venue_id, slot, slot)
+        # Another request may have taken the seats since `find`; look again if so
+        if slot_allocator.book(db, venue_id, reservation_id, slot, seats):
+            return slot
+
+
+def _book_group(
+    db: Session,
+    venue_id: int,
+    user_ids: List[int],
+    time: datetime,
+    creator_user_id: int,
+    start: datetime,
+    end: datetime,
+) -> dict:
     # Check if all users have confirmed interest in the venue
     confirmed_users = []
     missing_confirmations = []
@@ -62,7 +128,9 @@ def auto_create_reservation_if_ready(
     # If not all users have confirmed, return failure
     if missing_confirmations:
         logger.info(
-            f"Cannot create reservation: users {missing_confirmations} have not confirmed interest in venue {venue_id}"
+            "Cannot create reservation: users %s have not confirmed interest in venue %s",
+            missing_confirmations,
+            venue_id,
         )
         return {
             "success": False,
@@ -70,49 +138,34 @@ def auto_create_reservation_if_ready(
             "reservation": None,
         }
 
-    # Check if a reservation already exists for this venue and time window (within 30 minutes)
-    time_window_start = time - timedelta(minutes=30)
-    time_window_end = time + timedelta(minutes=30)
-
-    existing_reservation = (
-        db.query(Reservation)
-        .filter(
-            and_(
-                Reservation.venue_id == venue_id,
-                Reservation.time >= time_window_start,
-                Reservation.time <= time_window_end,
-                Reservation.status != ReservationStatus.CANCELLED,
-            )
-        )
-        .first()
-    )
+    # A booking of ours from the requested time on that already includes part of the group
+    existing_reservation = _group_reservation(db, venue_id, user_ids, start, end)
 
     if existing_reservation:
-        # Check if all users are already participants
-        existing_participant_ids = {p.user_id for p in existing_reservation.participants}
-        all_users_included = all(uid in existing_participant_ids for uid in user_ids)
+        return _join_reservation(db, existing_reservation, user_ids)
 
-        if all_users_included:
-            logger.info(
-                f"Reservation {existing_reservation.id} already exists with all participants"
-            )
-            return {
-                "success": True,
-                "message": "Reservation already exists",
-                "reservation": existing_reservation,
-            }
+    slot = slot_allocator.find(db, venue_id, len(user_ids), time)
+    if slot is None:
+        return _no_slot(venue_id, len(user_ids))
 
     # All users confirmed, create the reservation
     new_reservation = Reservation(
         venue_id=venue_id,
         created_by_user_id=creator_user_id,
-        time=time,
+        time=slot,
         status=ReservationStatus.CONFIRMED,
+        created_by_agent=True,
     )
 
     db.add(new_reservation)
     db.flush()  # Get the reservation ID
 
+    slot = _hold_slot(db, venue_id, new_reservation.id, len(user_ids), time)
+    if slot is None:
+        db.rollback()
+        return _no_slot(venue_id, len(user_ids))
+    new_reservation.time = slot
+
     # Add all participants as ACCEPTED
     for user_id in user_ids:
         participant = ReservationParticipant(
@@ -121,12 +174,27 @@ def auto_create_reservation_if_ready(
             status=ParticipantStatus.ACCEPTED,
         )
         db.add(participant)
+    add_members(db, new_reservation.id, new_reservation.time, [creator_user_id, *user_ids])
 
-    db.commit()
+    try:
+        db.commit()
+    except Exception:
+        slot_allocator.release(venue_id, new_reservation.id)
+        raise
     db.refresh(new_reservation)
+    availability_index.add(venue_id, new_reservation.time, new_reservation.id)
+    publish_reservation_event(
+        "reservation.created",
+        new_reservation,
+        venue_id=venue_id,
+        time=new_reservation.time.isoformat(),
+    )
 
     logger.info(
-        f"Auto-created reservation {new_reservation.id} for venue {venue_id} at {time}",
+        "Auto-created reservation %s for venue %s at %s",
+        new_reservation.id,
+        venue_id,
+        new_reservation.time,
         extra={"reservation_id": new_reservation.id},
     )
 
@@ -137,38 +205,242 @@ def auto_create_reservation_if_ready(
     }
 
 
+def _no_slot(venue_id: int, seats: int) -> dict:
+    logger.info(
+        "No slot at venue %s seats %d people within %d days",
+        venue_id,
+        seats,
+        settings.SLOT_HORIZON_DAYS,
+        extra={"venue_id": venue_id},
+    )
+    return {
+        "success": False,
+        "message": f"No slot with room for {seats} people in the next {settings.SLOT_HORIZON_DAYS} days",
+        "reservation": None,
+    }
+
+
+def _group_reservation(
+    db: Session, venue_id: int, user_ids: List[int], start: datetime, end: datetime
+) -> Optional[Reservation]:
+    """
+    The earliest agent-booked, confirmed reservation at the venue in [start, end]
+    that any of `user_ids` is going to.
+
+    The agent places a group in the requested slot, or the next one with room
+    up to the end of the slot horizon, so that is where the group's booking is
+    looked for.
+    """
+    group = set(user_ids)
+    for reservation in reservations_between(db, venue_id, start, end):
+        if not reservation.created_by_agent or reservation.status != ReservationStatus.CONFIRMED:
+            continue
+        going = {p.user_id for p in reservation.participants if p.status != ParticipantStatus.DECLINED}
+        if group & going:
+            return reservation
+    return None
+
+
+def _join_reservation(db: Session, reservation: Reservation, user_ids: List[int]) -> dict:
+    """Add the users not yet in `reservation` to it as ACCEPTED, if its slot has room."""
+    members = {p.user_id: p for p in reservation.participants}
+    joining = [user_id for user_id in user_ids if user_id not in members]
+    if not joining:
+        logger.info("Reservation %s already exists with all participants", reservation.id)
+        return {
+            "success": True,
+            "message": "Reservation already exists",
+            "reservation": reservation,
+        }
+
+    seats = sum(p.status != ParticipantStatus.DECLINED for p in members.values()) + len(joining)
+    if not slot_allocator.book(db, reservation.venue_id, reservation.id, reservation.time, seats):
+        return {
+            "success": False,
+            "message": f"Reservation {reservation.id} has no room for {len(joining)} more",
+            "reservation": None,
+        }
+
+    for user_id in joining:
+        db.add(
+            ReservationParticipant(
+                reservation_id=reservation.id, user_id=user_id, status=ParticipantStatus.ACCEPTED
+            )
+        )
+    # The creator is already indexed even if they never were a participant
+    add_members(
+        db,
+        reservation.id,
+        reservation.time,
+        [user_id for user_id in joining if user_id != reservation.created_by_user_id],
+    )
+    db.commit()
+    db.refresh(reservation)
+    publish_reservation_event("reservation.updated", reservation, joined_user_ids=joining)
+
+    logger.info(
+        "Users %s joined reservation %s",
+        joining,
+        reservation.id,
+        extra={"reservation_id": reservation.id},
+    )
+    return {
+        "success": True,
+        "message": "Joined existing reservation",
+        "reservation": reservation,
+    }
+
+
+def confirm_ready_reservations(db: Session, reservation_ids: Collection[int]) -> List[Reservation]:
+    """
+    Confirm every pending reservation in `reservation_ids` whose group is settled.
+
+    A group is settled when nobody is still INVITED and at least one
+    participant ACCEPTED; participants who DECLINED drop out of the group.
+    This is one conditional UPDATE ... RETURNING, so the check runs in the
+    database with no read-then-write race between concurrent responses.
+    Runs in the caller's transaction; the caller commits.
+
+    Returns:
+        The reservations this call confirmed
+    """
+    if not reservation_ids:
+        return []
+
+    has_accepted = exists().where(
+        ReservationParticipant.reservation_id == Reservation.id,
+        ReservationParticipant.status == ParticipantStatus.ACCEPTED,
+    )
+    has_invited = exists().where(
+        ReservationParticipant.reservation_id == Reservation.id,
+        ReservationParticipant.status == ParticipantStatus.INVITED,
+    )
+    confirmed = list(
+        db.execute(
+            update(Reservation)
+            .where(
+                Reservation.id.in_(list(reservation_ids)),
+                Reservation.status == ReservationStatus.PENDING,
+                has_accepted,
+                ~has_invited,
+            )
+            .values(status=ReservationStatus.CONFIRMED)
+            .returning(Reservation)
+        ).scalars()
+    )
+
+    for reservation in confirmed:
+        logger.info(
+            "Auto-confirmed reservation %s",
+            reservation.id,
+            extra={"reservation_id": reservation.id},
+        )
+    return confirmed
+
+
 def check_and_confirm_reservation(db: Session, reservation_id: int) -> Optional[Reservation]:
     """
-    Check if all participants have accepted and auto-confirm the reservation.
+    Confirm a pending reservation if its group is settled (see `confirm_ready_reservations`).
 
     Args:
         db: Database session
         reservation_id: ID of the reservation to check
 
     Returns:
-        The reservation if updated, None otherwise
+        The reservation if this call confirmed it, None otherwise
     """
-    reservation = db.query(Reservation).filter(Reservation.id == reservation_id).first()
+    confirmed = confirm_ready_reservations(db, [reservation_id])
+    return confirmed[0] if confirmed else None
 
-    if not reservation:
-        return None
 
-    if reservation.status == ReservationStatus.CONFIRMED:
-        return reservation
+def cancel_reservations(db: Session, reservation_ids: Union[Collection[int], Select]) -> List[dict]:
+    """
+    Soft-cancel reservations with one status UPDATE; rows and participants are kept as history.
 
-    # Check if all participants have accepted
-    all_accepted = all(
-        p.status == ParticipantStatus.ACCEPTED for p in reservation.participants
-    )
+    `reservation_ids` is a collection of ids or a SELECT of them, which is
+    inlined as `WHERE id IN (SELECT ...)`. Reservations that are missing or
+    already cancelled are left alone. Runs in the caller's transaction; the
+    caller commits and then calls `after_cancel`.
 
-    if all_accepted and len(reservation.participants) > 0:
-        reservation.status = ReservationStatus.CONFIRMED
-        db.commit()
-        db.refresh(reservation)
-        logger.info(
-            f"Auto-confirmed reservation {reservation_id}",
-            extra={"reservation_id": reservation_id},
+    Returns:
+        One dict per reservation this call cancelled, with its id, venue_id,
+        created_by_user_id and participant_ids
+    """
+    if not isinstance(reservation_ids, Select):
+        if not reservation_ids:
+            return []
+        reservation_ids = list(reservation_ids)
+
+    cancelled = db.execute(
+        update(Reservation)
+        .where(
+            Reservation.id.in_(reservation_ids),
+            Reservation.status != ReservationStatus.CANCELLED,
         )
-        return reservation
+        .values(status=ReservationStatus.CANCELLED)
+        .returning(Reservation.id, Reservation.venue_id, Reservation.created_by_user_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if not cancelled:
+        return []
 
-    return None
+    participants = {row.id: [] for row in cancelled}
+    mark_cancelled(db, list(participants))
+    for reservation_id, user_id in db.execute(
+        select(ReservationParticipant.reservation_id, ReservationParticipant.user_id).where(
+            ReservationParticipant.reservation_id.in_(list(participants))
+        )
+    ):
+        participants[reservation_id].append(user_id)
+
+    return [
+        {
+            "id": row.id,
+            "venue_id": row.venue_id,
+            "created_by_user_id": row.created_by_user_id,
+            "participant_ids": participants[row.id],
+        }
+        for row in cancelled
+    ]
+
+
+def after_cancel(cancelled: List[dict]):
+    """Post-commit bookkeeping for `cancel_reservations` results: indexes, read pins and events."""
+    by_venue = {}
+    for reservation in cancelled:
+        by_venue.setdefault(reservation["venue_id"], set()).add(reservation["id"])
+        slot_allocator.release(reservation["venue_id"], reservation["id"])
+        primary_pins.pin(*reservation["participant_ids"])
+        event_bus.publish(
+            [reservation["created_by_user_id"], *reservation["participant_ids"]],
+            "reservation.cancelled",
+            {"reservation_id": reservation["id"]},
+        )
+    for venue_id, reservation_ids in by_venue.items():
+        availability_index.remove(venue_id, reservation_ids)
+
+
+def purge_reservations(db: Session, reservation_ids: Union[Collection[int], Select]) -> List[tuple]:
+    """
+    Hard-delete reservations with one DELETE; the database cascades to their participants.
+
+    `reservation_ids` is a collection of ids or a SELECT of them, as for
+    `cancel_reservations`. Runs in the caller's transaction; the caller commits.
+
+    Returns:
+        (id, venue_id) of each reservation deleted
+    """
+    if not isinstance(reservation_ids, Select):
+        if not reservation_ids:
+            return []
+        reservation_ids = list(reservation_ids)
+
+    return [
+        tuple(row)
+        for row in db.execute(
+            delete(Reservation)
+            .where(Reservation.id.in_(reservation_ids))
+            .returning(Reservation.id, Reservation.venue_id)
+            .execution_options(synchronize_session=False)
+        )
+    ]
@@ -0,0 +1,198 @@
+"""
+Materialized interest aggregates used by the recommendation engine.
+
+The index keeps, for every venue, the sorted ids of users with an active
+(INTERESTED or CONFIRMED) interest, and for every user the set of venues they
+like. "How many of my friends like venue X" becomes a set intersection and
+global popularity is the length of a venue's array, so scoring needs no SQL
+COUNT per venue.
+
+The index is per process: it is rebuilt from `user_interests` at startup (or
+lazily on first use) and updated in place by `create_or_update_interest`.
+Writes made by other API workers or outside the API (e.g. seed scripts) are
+picked up by `refresh_periodically`, which rebuilds the index every
+`INTEREST_INDEX_REFRESH_SECONDS`.
+"""
+import asyncio
+import logging
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Collection, Dict, FrozenSet, List, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import UserInterest, InterestStatus
+from app.state import register
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = (InterestStatus.INTERESTED, InterestStatus.CONFIRMED)
+
+_EMPTY_IDS = array("q")
+_EMPTY_SET: FrozenSet[int] = frozenset()
+
+
+class InterestIndex:
+    def __init__(self):
+        self._venue_users: Dict[int, array] = {}
+        self._user_venues: Dict[int, FrozenSet[int]] = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+        # Bumped by every rebuild, so derived data (people suggestions) can tell it is out of date
+        self.version = 0
+        # Writes applied while a rebuild is reading rows, replayed onto its snapshot
+        self._rebuilds = 0
+        self._pending: List[Tuple[int, int, bool]] = []
+
+    def __getstate__(self):
+        # Picklable for batch worker processes; the lock is per process
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def rebuild(self, db: Session):
+        """
+        Recompute the whole index from the database.
+
+        Writes applied while the rows are being read may or may not be in them,
+        so they are recorded and replayed onto the new snapshot before it is
+        installed; `apply` is idempotent, so replaying one already read is harmless.
+        """
+        with self._lock:
+            self._rebuilds += 1
+        try:
+            rows = (
+                db.query(UserInterest.venue_id, UserInterest.user_id)
+                .filter(UserInterest.status.in_(ACTIVE_STATUSES))
+                .order_by(UserInterest.venue_id, UserInterest.user_id)
+                .all()
+            )
+
+            venue_users: Dict[int, array] = {}
+            user_venues: Dict[int, set] = {}
+            for venue_id, user_id in rows:
+                venue_users.setdefault(venue_id, array("q")).append(user_id)
+                user_venues.setdefault(user_id, set()).add(venue_id)
+
+            with self._lock:
+                self._venue_users = venue_users
+                self._user_venues = {u: frozenset(v) for u, v in user_venues.items()}
+                for write in self._pending:
+                    self._apply_locked(*write)
+                self.loaded = True
+                self.version += 1
+        finally:
+            with self._lock:
+                self._rebuilds -= 1
+                if not self._rebuilds:
+                    self._pending = []
+
+    def ensure_loaded(self, db: Session) -> "InterestIndex":
+        if not self.loaded:
+            with self._lock:
+                needs_build = not self.loaded
+            if needs_build:
+                self.rebuild(db)
+        return self
+
+    def apply(self, user_id: int, venue_id: int, status: InterestStatus):
+        """Reflect one committed interest write. Arrays are replaced, never mutated, so readers stay safe."""
+        write = (user_id, venue_id, status in ACTIVE_STATUSES)
+        with self._lock:
+            if self._rebuilds:
+                self._pending.append(write)
+            if self.loaded:
+                self._apply_locked(*write)
+
+    def _apply_locked(self, user_id: int, venue_id: int, active: bool):
+        users = self._venue_users.get(venue_id, _EMPTY_IDS)
+        pos = bisect_left(users, user_id)
+        present = pos < len(users) and users[pos] == user_id
+        if active and not present:
+            updated = array("q", users)
+            updated.insert(pos, user_id)
+            self._venue_users[venue_id] = updated
+        elif not active and present:
+            updated = array("q", users)
+            del updated[pos]
+            self._venue_users[venue_id] = updated
+
+        venues = self._user_venues.get(user_id, _EMPTY_SET)
+        self._user_venues[user_id] = venues | {venue_id} if active else venues - {venue_id}
+
+    def clear(self):
+        with self._lock:
+            self._venue_users = {}
+            self._user_venues = {}
+            self.loaded = False
+
+    def interested_users(self, venue_id: int) -> array:
+        """Sorted ids of users actively interested in a venue."""
+        return self._venue_users.get(venue_id, _EMPTY_IDS)
+
+    def popularity(self, venue_id: int) -> int:
+        return len(self._venue_users.get(venue_id, _EMPTY_IDS))
+
+    def most_popular(self, limit: int) -> List[Tuple[int, int]]:
+        """(venue_id, interested user count) pairs, most popular first."""
+        counts = [(venue_id, len(users)) for venue_id, users in self._venue_users.items()]
+        counts.sort(key=lambda item: item[1], reverse=True)
+        return counts[:limit]
+
+    def user_venues(self, user_id: int) -> FrozenSet[int]:
+        return self._user_venues.get(user_id, _EMPTY_SET)
+
+    def is_interested(self, user_id: int, venue_id: int) -> bool:
+        return venue_id in self._user_venues.get(user_id, _EMPTY_SET)
+
+    def count_interested_among(self, venue_id: int, user_ids: Collection[int]) -> int:
+        """How many of `user_ids` (ideally a set) are interested in the venue."""
+        users = self._venue_users.get(venue_id, _EMPTY_IDS)
+        if not users or not user_ids:
+            return 0
+        if len(users) <= len(user_ids):
+            return sum(1 for user_id in users if user_id in user_ids)
+        count = 0
+        for user_id in user_ids:
+            pos = bisect_left(users, user_id)
+            if pos < len(users) and users[pos] == user_id:
+                count += 1
+        return count
+
+    def shared_venue_count(self, user_id: int, other_id: int) -> int:
+        return len(self.user_venues(user_id) & self.user_venues(other_id))
+
+
+interest_index = register(InterestIndex())
+
+
+def get_interest_index(db: Session) -> InterestIndex:
+    return interest_index.ensure_loaded(db)
+
+
+def _refresh():
+    db = SessionLocal()
+    try:
+        interest_index.rebuild(db)
+    finally:
+        db.close()
+
+
+async def refresh_periodically():
+    """Rebuild the loaded index every INTEREST_INDEX_REFRESH_SECONDS until cancelled; started from `lifespan`."""
+    while True:
+        await asyncio.sleep(settings.INTEREST_INDEX_REFRESH_SECONDS)
+        if not interest_index.loaded:
+            continue
+        try:
+            await run_in_threadpool(_refresh)
+        except Exception:
+            logger.exception("Interest index refresh failed")
@@ -0,0 +1,202 @@
+"""
+Hot and cold reservations.
+
+With `RESERVATION_ARCHIVE_AFTER_DAYS` set, reservations whose time is more than
+that many days past are cold. The sweeper's archive action moves them, with
+their participants, from `reservations` and `reservation_participants` into
+`reservations_archive` and `reservation_participants_archive`: `copy_to_archive`
+and then `purge_reservations`, in one transaction. The hot tables, and the
+indexes every agent and listing query reads, then only grow with recent
+activity. Queries that would otherwise read a venue's or user's whole
+history start at `hot_since()`, so results don't depend on whether a cold row
+has been moved yet. A user's listing still shows their older history:
+`archived_reservations_for_user` reads it back from the archive tables.
+
+On Postgres the archive tables are partitioned by month on `time`. Partitions
+are created on demand as rows are archived into them. An old month can be
+detached or dropped as one unit once its data has been exported. The hot
+tables are not partitioned: Postgres requires the partition key in every
+unique constraint, and participants and plan rows reference
+`reservations.id` alone. Moving cold rows out keeps them small instead.
+"""
+from datetime import datetime, timedelta
+from typing import Collection, List, Optional
+
+from sqlalchemy import insert, literal, select, text, union
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import (
+    Reservation,
+    ReservationArchive,
+    ReservationParticipant,
+    ReservationParticipantArchive,
+    ReservationStatus,
+    User,
+    Venue,
+)
+from app.schemas import Reservation as ReservationSchema
+from app.services.locks import ARCHIVE_LOCK_NAMESPACE, is_shared
+
+PARTITIONED_TABLES = (ReservationArchive.__tablename__, ReservationParticipantArchive.__tablename__)
+
+
+def hot_since(now: Optional[datetime] = None) -> Optional[datetime]:
+    """The earliest reservation time still hot, or None when nothing is archived."""
+    if settings.RESERVATION_ARCHIVE_AFTER_DAYS <= 0:
+        return None
+    return (now or datetime.utcnow()) - timedelta(days=settings.RESERVATION_ARCHIVE_AFTER_DAYS)
+
+
+def _month_bounds(time: datetime):
+    start = datetime(time.year, time.month, 1)
+    end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+
+def ensure_partitions(db: Session, times: Collection[datetime]):
+    """Create the monthly archive partitions covering `times`, if missing (Postgres only)."""
+    if not is_shared(db) or not times:
+        return
+    # Two archivers creating the same partition would race; the lock is held until commit
+    db.execute(text("SELECT pg_advisory_xact_lock(:namespace, 0)"), {"namespace": ARCHIVE_LOCK_NAMESPACE})
+    for start, end in sorted({_month_bounds(time) for time in times}):
+        for table in PARTITIONED_TABLES:
+            db.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {table}_{start:%Y_%m} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+                )
+            )
+
+
+def copy_to_archive(db: Session, reservation_ids: Collection[int]):
+    """
+    Copy reservations and their participants to the archive tables.
+
+    Runs in the caller's transaction. The caller then deletes the originals
+    with `purge_reservations` in the same transaction, which takes
+    participants and plan index rows with them, and commits.
+    """
+    if not reservation_ids:
+        return
+    reservation_ids = list(reservation_ids)
+
+    times = db.execute(select(Reservation.time).where(Reservation.id.in_(reservation_ids))).scalars().all()
+    ensure_partitions(db, times)
+
+    db.execute(
+        insert(ReservationArchive).from_select(
+            [
+                "id",
+                "time",
+                "venue_id",
+                "created_by_user_id",
+                "status",
+                "created_at",
+                "created_by_agent",
+                "archived_at",
+            ],
+            select(
+                Reservation.id,
+                Reservation.time,
+                Reservation.venue_id,
+                Reservation.created_by_user_id,
+                Reservation.status,
+                Reservation.created_at,
+                Reservation.created_by_agent,
+                literal(datetime.utcnow()),
+            ).where(Reservation.id.in_(reservation_ids)),
+        )
+    )
+    db.execute(
+        insert(ReservationParticipantArchive).from_select(
+            ["id", "time", "reservation_id", "user_id", "status"],
+            select(
+                ReservationParticipant.id,
+                Reservation.time,
+                ReservationParticipant.reservation_id,
+                ReservationParticipant.user_id,
+                ReservationParticipant.status,
+            )
+            .join(Reservation, ReservationParticipant.reservation_id == Reservation.id)
+            .where(Reservation.id.in_(reservation_ids)),
+        )
+    )
+
+
+def archived_reservations_for_user(
+    db: Session,
+    user_id: int,
+    newest_first: bool = False,
+    include_cancelled: bool = True,
+    limit: Optional[int] = None,
+) -> List[ReservationSchema]:
+    """
+    Archived reservations the user created or was invited to, in time order, as response models.
+
+    Three bulk reads after the reservations themselves: participants, their
+    users and the venues. A participant or venue deleted since archiving is
+    left out, as the archive has no foreign keys holding them.
+    """
+    invited = select(ReservationParticipantArchive.reservation_id).where(
+        ReservationParticipantArchive.user_id == user_id
+    )
+    created = select(ReservationArchive.id).where(ReservationArchive.created_by_user_id == user_id)
+    reservation_ids = union(invited, created)
+    query = select(ReservationArchive).where(ReservationArchive.id.in_(reservation_ids))
+    if not include_cancelled:
+        query = query.where(ReservationArchive.status != ReservationStatus.CANCELLED)
+    if newest_first:
+        query = query.order_by(ReservationArchive.time.desc(), ReservationArchive.id.desc())
+    else:
+        query = query.order_by(ReservationArchive.time, ReservationArchive.id)
+    if limit is not None:
+        query = query.limit(limit)
+    reservations = db.execute(query).scalars().all()
+    if not reservations:
+        return []
+
+    participants = (
+        db.execute(
+            select(ReservationParticipantArchive)
+            .where(ReservationParticipantArchive.reservation_id.in_([r.id for r in reservations]))
+            .order_by(ReservationParticipantArchive.id)
+        )
+        .scalars()
+        .all()
+    )
+    users = {
+        user.id: user
+        for user in db.execute(select(User).where(User.id.in_({p.user_id for p in participants}))).scalars()
+    }
+    venue_ids = {r.venue_id for r in reservations}
+    venues = {venue.id: venue for venue in db.execute(select(Venue).where(Venue.id.in_(venue_ids))).scalars()}
+
+    by_reservation = {}
+    for participant in participants:
+        if participant.user_id in users:
+            by_reservation.setdefault(participant.reservation_id, []).append(
+                {
+                    "id": participant.id,
+                    "user_id": participant.user_id,
+                    "status": participant.status,
+                    "user": users[participant.user_id],
+                }
+            )
+    return [
+        ReservationSchema.model_validate(
+            {
+                "id": reservation.id,
+                "venue_id": reservation.venue_id,
+                "created_by_user_id": reservation.created_by_user_id,
+                "time": reservation.time,
+                "status": reservation.status,
+                "created_at": reservation.created_at,
+                "venue": venues[reservation.venue_id],
+                "participants": by_reservation.get(reservation.id, []),
+            }
+        )
+        for reservation in reservations
+        if reservation.venue_id in venues
+    ]
@@ -0,0 +1,178 @@
+"""
+Per-venue interval index over active reservations.
+
+For every venue the index keeps the start times of non-cancelled
+reservations in a sorted list with the matching reservation ids alongside,
+so "which reservations at venue V start within [start, end]" is two bisects
+instead of a table scan. The `(venue_id, time)` index on `reservations`
+keeps `rebuild` and direct SQL window queries cheap as well.
+
+Like the other in-memory indexes this is per process: built at startup (or
+lazily) and kept current by the reservation write paths through `add` and
+`remove`. Lists are replaced, never mutated, so readers need no lock.
+"""
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Collection, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session, selectinload
+
+from app.models import Reservation, ReservationStatus
+from app.services.archive import hot_since
+from app.state import register
+
+# Reservations starting within this window of each other count as the same slot
+CONFLICT_WINDOW = timedelta(minutes=30)
+
+# (sorted start times, reservation ids in the same order) for one venue
+Slots = Tuple[List[datetime], List[int]]
+
+_EMPTY_SLOTS: Slots = ([], [])
+
+
+def _naive_utc(time: datetime) -> datetime:
+    # Reservation times are stored without a zone; compare aware inputs as UTC
+    if time.tzinfo is not None:
+        return time.astimezone(timezone.utc).replace(tzinfo=None)
+    return time
+
+
+def _hot(query):
+    # Cold reservations are history; nothing looks for conflicts with them
+    since = hot_since()
+    return query if since is None else query.filter(Reservation.time >= since)
+
+
+class AvailabilityIndex:
+    def __init__(self):
+        self._venues: Dict[int, Slots] = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def rebuild(self, db: Session):
+        """Recompute the whole index from the database."""
+        rows = (
+            _hot(db.query(Reservation.venue_id, Reservation.time, Reservation.id))
+            .filter(Reservation.status != ReservationStatus.CANCELLED)
+            .order_by(Reservation.venue_id, Reservation.time, Reservation.id)
+            .all()
+        )
+
+        venues: Dict[int, Slots] = {}
+        for venue_id, time, reservation_id in rows:
+            times, ids = venues.setdefault(venue_id, ([], []))
+            times.append(time)
+            ids.append(reservation_id)
+
+        with self._lock:
+            self._venues = venues
+            self.loaded = True
+
+    def ensure_loaded(self, db: Session) -> "AvailabilityIndex":
+        if not self.loaded:
+            with self._lock:
+                needs_build = not self.loaded
+            if needs_build:
+                self.rebuild(db)
+        return self
+
+    def add(self, venue_id: int, time: datetime, reservation_id: int):
+        """Reflect a committed reservation."""
+        time = _naive_utc(time)
+        with self._lock:
+            if not self.loaded:
+                return
+            times, ids = self._venues.get(venue_id, _EMPTY_SLOTS)
+            position = bisect_right(times, time)
+            self._venues[venue_id] = (
+                times[:position] + [time] + times[position:],
+                ids[:position] + [reservation_id] + ids[position:],
+            )
+
+    def remove(self, venue_id: int, reservation_ids: Collection[int]):
+        """Drop cancelled or deleted reservations."""
+        with self._lock:
+            if not self.loaded or venue_id not in self._venues:
+                return
+            times, ids = self._venues[venue_id]
+            keep = [i for i, reservation_id in enumerate(ids) if reservation_id not in reservation_ids]
+            if keep:
+                self._venues[venue_id] = ([times[i] for i in keep], [ids[i] for i in keep])
+            else:
+                del self._venues[venue_id]
+
+    def reload_window(self, db: Session, venue_id: int, start: datetime, end: datetime):
+        """Re-read one venue's active reservations starting within [start, end], picking up other processes' writes."""
+        start, end = _naive_utc(start), _naive_utc(end)
+        rows = (
+            _hot(db.query(Reservation.time, Reservation.id))
+            .filter(
+                Reservation.venue_id == venue_id,
+                Reservation.status != ReservationStatus.CANCELLED,
+                Reservation.time.between(start, end),
+            )
+            .order_by(Reservation.time, Reservation.id)
+            .all()
+        )
+        with self._lock:
+            if not self.loaded:
+                return
+            times, ids = self._venues.get(venue_id, _EMPTY_SLOTS)
+            lo, hi = bisect_left(times, start), bisect_right(times, end)
+            times = times[:lo] + [time for time, _ in rows] + times[hi:]
+            ids = ids[:lo] + [rid for _, rid in rows] + ids[hi:]
+            if times:
+                self._venues[venue_id] = (times, ids)
+            else:
+                self._venues.pop(venue_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._venues = {}
+            self.loaded = False
+
+    def overlapping(self, venue_id: int, start: datetime, end: datetime) -> List[int]:
+        """Ids of active reservations at a venue starting within [start, end], earliest first."""
+        times, ids = self._venues.get(venue_id, _EMPTY_SLOTS)
+        return ids[bisect_left(times, _naive_utc(start)):bisect_right(times, _naive_utc(end))]
+
+
+availability_index = register(AvailabilityIndex())
+
+
+def get_availability_index(db: Session) -> AvailabilityIndex:
+    """Return the process-wide index, building it on first use."""
+    return availability_index.ensure_loaded(db)
+
+
+def reservations_between(db: Session, venue_id: int, start: datetime, end: datetime) -> List[Reservation]:
+    """Active reservations at `venue_id` starting within [start, end], earliest first."""
+    ids = get_availability_index(db).overlapping(venue_id, start, end)
+    if not ids:
+        return []
+    rows = {
+        r.id: r
+        for r in db.query(Reservation)
+        .options(selectinload(Reservation.participants))
+        .filter(Reservation.id.in_(ids))
+    }
+    return [rows[i] for i in ids if i in rows]
+
+
+def conflicting_reservations(
+    db: Session, venue_id: int, time: datetime, window: timedelta = CONFLICT_WINDOW
+) -> List[Reservation]:
+    """Active reservations at `venue_id` within `window` of `time`, earliest first."""
+    return reservations_between(db, venue_id, time - window, time + window)
+
+
+def find_same_group(
+    db: Session, venue_id: int, time: datetime, user_ids: Collection[int]
+) -> Optional[Reservation]:
+    """An active reservation near `time` whose participants include all of `user_ids`, if any."""
+    wanted = set(user_ids)
+    for reservation in conflicting_reservations(db, venue_id, time):
+        if wanted <= {p.user_id for p in reservation.participants}:
+            return reservation
+    return None
@@ -0,0 +1,155 @@
+"""
+Shared-memory venue catalogue for parallel scoring.
+
+Venue ids and coordinates are packed into one `multiprocessing.shared_memory`
+block laid out as three parallel arrays: ids (int64), latitudes and longitudes
+(float64), all in id order. Scoring workers attach to the block by name, so a
+100k-venue catalogue is shared rather than pickled into every task.
+
+Like the other in-memory indexes this is per process. It is loaded lazily and
+reloaded when the venues table's (row count, max id) no longer matches the
+loaded block, which one aggregate query checks on each use, so venues created
+on any worker reach parallel scoring on every worker. `create_venue` also
+invalidates it directly. A reload publishes a new block; the old one is
+unlinked once no scoring call still holds it (see `acquire`), so tasks
+already dispatched with its name can still attach.
+"""
+import atexit
+import threading
+from array import array
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.models import Venue
+from app.state import register
+
+_ITEM_SIZE = 8
+
+
+class CatalogueHandle(NamedTuple):
+    """What a worker needs to attach to a published catalogue."""
+
+    name: str
+    size: int
+
+
+def pack(ids: List[int], latitudes: List[float], longitudes: List[float]) -> shared_memory.SharedMemory:
+    size = len(ids)
+    block = shared_memory.SharedMemory(create=True, size=max(1, 3 * size * _ITEM_SIZE))
+    stride = size * _ITEM_SIZE
+    block.buf[0:stride] = array("q", ids).tobytes()
+    block.buf[stride:2 * stride] = array("d", latitudes).tobytes()
+    block.buf[2 * stride:3 * stride] = array("d", longitudes).tobytes()
+    return block
+
+
+def views(block: shared_memory.SharedMemory, size: int) -> Tuple[memoryview, memoryview, memoryview]:
+    """Typed (ids, latitudes, longitudes) views over a block; release them before closing it."""
+    stride = size * _ITEM_SIZE
+    return (
+        block.buf[0:stride].cast("q"),
+        block.buf[stride:2 * stride].cast("d"),
+        block.buf[2 * stride:3 * stride].cast("d"),
+    )
+
+
+class VenueCatalogue:
+    def __init__(self):
+        self._block: Optional[shared_memory.SharedMemory] = None
+        self._size = 0
+        # (row count, max id) of the venues table when the block was packed
+        self._version: Optional[Tuple[int, Optional[int]]] = None
+        # Block name -> scoring calls holding it; replaced blocks wait in `_retired` until unheld
+        self._holders: Dict[str, int] = {}
+        self._retired: Dict[str, shared_memory.SharedMemory] = {}
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.loaded = False
+
+    def load(self, db: Session):
+        """Publish a fresh block from the venues table."""
+        rows = db.query(Venue.id, Venue.latitude, Venue.longitude).order_by(Venue.id).all()
+        block = pack([r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows])
+
+        with self._lock:
+            previous = self._block
+            self._block = block
+            self._size = len(rows)
+            self._version = (len(rows), rows[-1][0] if rows else None)
+            self.loaded = True
+            if previous is not None and self._holders.get(previous.name):
+                self._retired[previous.name] = previous
+                previous = None
+        _discard(previous)
+
+    def ensure_loaded(self, db: Session) -> "VenueCatalogue":
+        """Load, or reload if venues were added or removed since the block was packed."""
+        version = tuple(db.execute(select(func.count(Venue.id), func.max(Venue.id))).one())
+        if self.loaded and version == self._version:
+            return self
+        with self._load_lock:
+            # Another thread may have reloaded while this one waited
+            if not self.loaded or version != self._version:
+                self.load(db)
+        return self
+
+    def invalidate(self):
+        """Reload on next use, e.g. after a venue was added."""
+        with self._lock:
+            self.loaded = False
+
+    def handle(self) -> CatalogueHandle:
+        with self._lock:
+            return CatalogueHandle(self._block.name, self._size)
+
+    @contextmanager
+    def acquire(self) -> Iterator[CatalogueHandle]:
+        """Hold the current block for the block of code; a reload meanwhile leaves it linked until released."""
+        with self._lock:
+            block = self._block
+            self._holders[block.name] = self._holders.get(block.name, 0) + 1
+            handle = CatalogueHandle(block.name, self._size)
+        try:
+            yield handle
+        finally:
+            retired = None
+            with self._lock:
+                self._holders[block.name] -= 1
+                if not self._holders[block.name]:
+                    del self._holders[block.name]
+                    retired = self._retired.pop(block.name, None)
+            _discard(retired)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def clear(self):
+        with self._lock:
+            for block in self._retired.values():
+                _discard(block)
+            _discard(self._block)
+            self._block = None
+            self._retired = {}
+            self._holders = {}
+            self._size = 0
+            self._version = None
+            self.loaded = False
+
+
+def _discard(block: Optional[shared_memory.SharedMemory]):
+    if block is not None:
+        block.close()
+        block.unlink()
+
+
+venue_catalogue = register(VenueCatalogue())
+atexit.register(venue_catalogue.clear)
+
+
+def get_venue_catalogue(db: Session) -> VenueCatalogue:
+    """Return the process-wide catalogue, loading it on first use."""
+    return venue_catalogue.ensure_loaded(db)
@@ -0,0 +1,303 @@
+"""
+Push events for reservation and interest changes.
+
+Write endpoints publish a small delta after they commit (which reservation
+changed and its new status, which interest flipped) addressed to the users who
+care; `GET /events/{user_id}` streams those to the client as server-sent events
+so the web and iOS clients stop polling the reservation listing.
+
+Publishing goes through a broker so every worker sees every event:
+- `LocalBroker` hands messages straight to the buses attached in this process.
+  It is the default for a single worker, and tests attach several buses to one
+  instance to stand in for a multi-worker deployment.
+- `PostgresBroker` fans out with LISTEN/NOTIFY on the primary database. A
+  worker only starts listening once it has a subscriber. Publishing only
+  queues the message; a background thread sends queued messages with one
+  NOTIFY round trip per batch, so writers never wait on it.
+
+Delivery is best-effort: publishing never fails the write that triggered it,
+and a subscriber that falls `EVENTS_QUEUE_SIZE` events behind gets a single
+`resync` event telling it to refetch instead of the ones it missed.
+"""
+import asyncio
+import json
+import logging
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from app import metrics
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[str], None]
+
+RESYNC = {"type": "resync", "data": {}}
+
+# Most NOTIFYs the Postgres publisher sends in one round trip
+PUBLISH_BATCH_SIZE = 100
+
+
+class LocalBroker:
+    def __init__(self):
+        self._handlers: List[Handler] = []
+        self._lock = threading.Lock()
+
+    def attach(self, handler: Handler):
+        with self._lock:
+            self._handlers = self._handlers + [handler]
+
+    def start(self):
+        pass
+
+    def publish(self, message: str):
+        for handler in self._handlers:
+            handler(message)
+
+    def close(self):
+        pass
+
+
+class PostgresBroker:
+    """LISTEN/NOTIFY fan-out; NOTIFY payloads are capped at 8000 bytes, so events stay small."""
+
+    def __init__(self, url: str, channel: str = "luna_events", max_pending: int = 10000):
+        from sqlalchemy.engine import make_url
+
+        # psycopg takes a libpq URL, without SQLAlchemy's "+driver" suffix
+        self._dsn = make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self.channel = channel
+        self._handlers: List[Handler] = []
+        self._listener: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._outbox: queue.Queue = queue.Queue(max_pending)
+        self._publisher: Optional[threading.Thread] = None
+        self._draining = False
+        self.dropped = 0
+
+    def attach(self, handler: Handler):
+        with self._lock:
+            self._handlers = self._handlers + [handler]
+
+    def start(self):
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._stopped.clear()
+            self._listener = threading.Thread(target=self._listen, name="events-listener", daemon=True)
+            self._listener.start()
+
+    def publish(self, message: str):
+        """Queue `message` for the publisher thread; dropped and counted when the queue is full."""
+        with self._lock:
+            if self._publisher is None:
+                self._publisher = threading.Thread(target=self._send, name="events-publisher", daemon=True)
+                self._publisher.start()
+        try:
+            self._outbox.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+            raise
+
+    def _next_batch(self) -> Optional[List[str]]:
+        """Wait for a message, then take whatever else is queued; None once closed."""
+        message = None if self._draining else self._outbox.get()
+        if message is None:
+            return None
+        batch = [message]
+        while len(batch) < PUBLISH_BATCH_SIZE:
+            try:
+                message = self._outbox.get_nowait()
+            except queue.Empty:
+                break
+            if message is None:
+                # Closed: send this batch, then stop
+                self._draining = True
+                break
+            batch.append(message)
+        return batch
+
+    def _send(self):
+        import psycopg
+
+        connection = None
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            try:
+                if connection is None or connection.closed:
+                    connection = psycopg.connect(self._dsn, autocommit=True)
+                # One round trip per batch; NOTIFYs from one session arrive in the order sent
+                connection.execute(
+                    "SELECT pg_notify(%s, payload)"
+                    " FROM unnest(%s::text[]) WITH ORDINALITY AS m(payload, n) ORDER BY n",
+                    (self.channel, batch),
+                )
+            except Exception:
+                logger.exception("Event publisher failed; dropped %d events", len(batch))
+                self.dropped += len(batch)
+                if connection is not None:
+                    connection.close()
+                    connection = None
+                self._stopped.wait(1.0)
+        if connection is not None:
+            connection.close()
+
+    def _listen(self):
+        import psycopg
+
+        while not self._stopped.is_set():
+            try:
+                with psycopg.connect(self._dsn, autocommit=True) as connection:
+                    connection.execute(f'LISTEN "{self.channel}"')
+                    while not self._stopped.is_set():
+                        for notify in connection.notifies(timeout=1.0):
+                            for handler in self._handlers:
+                                handler(notify.payload)
+            except Exception:
+                logger.exception("Event listener lost its connection; reconnecting")
+                self._stopped.wait(1.0)
+
+    def close(self):
+        self._stopped.set()
+        with self._lock:
+            listener, self._listener = self._listener, None
+            publisher, self._publisher = self._publisher, None
+        if listener is not None:
+            listener.join(timeout=5)
+        if publisher is not None:
+            # Queued events are sent before the publisher stops
+            try:
+                self._outbox.put(None, timeout=5)
+            except queue.Full:
+                pass
+            publisher.join(timeout=5)
+
+
+class Subscription:
+    """One open stream; created and read on the event loop, fed from any thread."""
+
+    def __init__(self, user_id: int, max_queued: int):
+        self.user_id = user_id
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue(max_queued)
+        self._lost = False
+
+    def deliver(self, event: Optional[dict]):
+        try:
+            self._loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The loop has shut down; the stream is gone
+            pass
+
+    def _put(self, event: Optional[dict]):
+        if event is None:
+            # End of stream always gets through
+            while self._queue.full():
+                self._queue.get_nowait()
+            self._queue.put_nowait(None)
+            return
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self._lost = True
+            metrics.events_dropped_total.inc()
+
+    async def get(self) -> Optional[dict]:
+        """The next event, RESYNC after an overflow, or None once the stream is closed."""
+        event = await self._queue.get()
+        if self._lost and event is not None:
+            self._lost = False
+            while not self._queue.empty():
+                if self._queue.get_nowait() is None:
+                    return None
+            return RESYNC
+        return event
+
+
+class EventBus:
+    def __init__(self, broker, max_queued: int = 100):
+        self.broker = broker
+        self.max_queued = max_queued
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        broker.attach(self._receive)
+
+    def subscribe(self, user_id: int) -> Subscription:
+        """Open a stream for `user_id`; must be called from the event loop that will read it."""
+        subscription = Subscription(user_id, self.max_queued)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        self.broker.start()
+        metrics.event_subscribers.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id, set())
+            if subscription not in subscriptions:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.user_id]
+        metrics.event_subscribers.dec()
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+    def publish(self, user_ids: Iterable[int], event_type: str, data: Dict[str, Any]):
+        """Send an event to every stream of `user_ids`, in every worker; call after commit."""
+        recipients = sorted(set(user_ids))
+        if not recipients:
+            return
+        message = json.dumps({"users": recipients, "type": event_type, "data": data}, default=str)
+        try:
+            self.broker.publish(message)
+        except Exception:
+            logger.exception("Failed to publish %s event", event_type)
+            return
+        metrics.events_published_total.labels(event_type).inc()
+
+    def _receive(self, message: str):
+        payload = json.loads(message)
+        event = {"type": payload["type"], "data": payload["data"]}
+        with self._lock:
+            targets = [s for user_id in payload["users"] for s in self._subscribers.get(user_id, ())]
+        for subscription in targets:
+            subscription.deliver(event)
+
+    def close(self):
+        """End every open stream in this worker and stop listening."""
+        with self._lock:
+            targets = [s for subscriptions in self._subscribers.values() for s in subscriptions]
+        for subscription in targets:
+            subscription.deliver(None)
+        self.broker.close()
+
+
+def _make_broker():
+    if settings.EVENTS_BROKER == "postgres":
+        return PostgresBroker(settings.DATABASE_URL, max_pending=settings.EVENTS_PUBLISH_QUEUE_SIZE)
+    return LocalBroker()
+
+
+event_bus = EventBus(_make_broker(), settings.EVENTS_QUEUE_SIZE)
+
+
+def publish_reservation_event(event_type: str, reservation, **data):
+    """Tell a reservation's creator and participants about a committed change to it."""
+    recipients = {p.user_id for p in reservation.participants}
+    recipients.add(reservation.created_by_user_id)
+    event_bus.publish(
+        recipients,
+        event_type,
+        {"reservation_id": reservation.id, "status": reservation.status.value, **data},
+    )
+
+
+def format_sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
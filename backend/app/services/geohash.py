@@ -0,0 +1,44 @@
+"""
+Geohash encoding used to quantize user locations into shareable cells.
+
+Precision 7 cells are about 153 m x 153 m at the equator and precision 8
+cells about 38 m x 19 m (both narrower towards the poles). Recommendations use
+precision 8, close enough that scoring from the cell centre instead of the
+exact position moves a venue's distance score by well under a point.
+"""
+from typing import Tuple
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def encode(latitude: float, longitude: float, precision: int = 7) -> Tuple[str, Tuple[float, float]]:
+    """Return the geohash of a point and the centre of its cell."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # Bits alternate longitude, latitude, starting with longitude
+
+    while len(chars) < precision:
+        if even:
+            value, interval = longitude, lon_range
+        else:
+            value, interval = latitude, lat_range
+        mid = (interval[0] + interval[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            interval[0] = mid
+        else:
+            bits <<= 1
+            interval[1] = mid
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    centre = ((lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2)
+    return "".join(chars), centre
@@ -0,0 +1,246 @@
+"""
+Memory-resident social graph.
+
+Friendships are held as CSR-style adjacency arrays: `offsets[row]` to
+`offsets[row + 1]` slices the parallel `neighbors` (friend ids, sorted),
+`strengths` (float64) and `edge_ids` (friendship row ids) arrays. Rows written
+after the last load live in a small copy-on-write overlay that is folded back
+into the CSR arrays once it grows past `COMPACT_THRESHOLD` rows.
+
+Like the interest index this is per process: loaded in `lifespan` (or lazily)
+and updated by the friendship write endpoint. Friendships written by other API
+workers or outside the API (e.g. seed scripts) are picked up by
+`refresh_periodically`, which reloads the graph every
+`SOCIAL_GRAPH_REFRESH_SECONDS`.
+"""
+import asyncio
+import logging
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import Friendship
+from app.state import register
+
+logger = logging.getLogger(__name__)
+
+COMPACT_THRESHOLD = 1024
+
+# (neighbors, strengths, edge_ids) for one user
+Row = Tuple[array, array, array]
+
+_EMPTY_ROW: Row = (array("q"), array("d"), array("q"))
+
+
+class _GraphState:
+    """Immutable snapshot of the graph; writers swap in a new one so readers never see a torn update."""
+
+    __slots__ = ("row_of", "offsets", "neighbors", "strengths", "edge_ids", "overlay")
+
+    def __init__(self, row_of, offsets, neighbors, strengths, edge_ids, overlay):
+        self.row_of: Dict[int, int] = row_of
+        self.offsets: array = offsets
+        self.neighbors: array = neighbors
+        self.strengths: array = strengths
+        self.edge_ids: array = edge_ids
+        self.overlay: Dict[int, Row] = overlay
+
+    @classmethod
+    def build(cls, rows) -> "_GraphState":
+        """Build CSR arrays from (user_id, friend_id, strength, edge_id) sorted by user then friend."""
+        row_of: Dict[int, int] = {}
+        offsets = array("q", [0])
+        neighbors = array("q")
+        strengths = array("d")
+        edge_ids = array("q")
+        current: Optional[int] = None
+        for user_id, friend_id, strength, edge_id in rows:
+            if user_id != current:
+                if current is not None:
+                    offsets.append(len(neighbors))
+                row_of[user_id] = len(row_of)
+                current = user_id
+            neighbors.append(friend_id)
+            strengths.append(strength)
+            edge_ids.append(edge_id)
+        if current is not None:
+            offsets.append(len(neighbors))
+        return cls(row_of, offsets, neighbors, strengths, edge_ids, {})
+
+    def row(self, user_id: int) -> Row:
+        overlay = self.overlay.get(user_id)
+        if overlay is not None:
+            return overlay
+        row = self.row_of.get(user_id)
+        if row is None:
+            return _EMPTY_ROW
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return self.neighbors[start:end], self.strengths[start:end], self.edge_ids[start:end]
+
+    def all_rows(self):
+        for user_id in sorted(set(self.row_of) | set(self.overlay)):
+            neighbors, strengths, edge_ids = self.row(user_id)
+            yield from zip([user_id] * len(neighbors), neighbors, strengths, edge_ids)
+
+
+class SocialGraph:
+    def __init__(self):
+        self._state = _GraphState.build([])
+        self._lock = threading.Lock()
+        self.loaded = False
+        # Bumped by every load, so derived data (people suggestions) can tell it is out of date
+        self.version = 0
+        # Upserts applied while a load is reading rows, replayed onto its snapshot
+        self._loads = 0
+        self._pending: List[Tuple[int, int, float, int]] = []
+
+    def __getstate__(self):
+        # Picklable for batch worker processes; the lock is per process
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def load(self, db: Session):
+        """
+        Rebuild the CSR arrays from the friendships table.
+
+        Upserts applied while the rows are being read may or may not be in them,
+        so they are replayed onto the new snapshot before it is installed, as
+        the interest index does.
+        """
+        with self._lock:
+            self._loads += 1
+        try:
+            rows = (
+                db.query(Friendship.user_id, Friendship.friend_id, Friendship.strength, Friendship.id)
+                .order_by(Friendship.user_id, Friendship.friend_id)
+                .all()
+            )
+            state = _GraphState.build(rows)
+            with self._lock:
+                self._state = state
+                for upsert in self._pending:
+                    self._upsert_locked(*upsert)
+                self.loaded = True
+                self.version += 1
+        finally:
+            with self._lock:
+                self._loads -= 1
+                if not self._loads:
+                    self._pending = []
+
+    def ensure_loaded(self, db: Session) -> "SocialGraph":
+        if not self.loaded:
+            self.load(db)
+        return self
+
+    def _row(self, user_id: int) -> Row:
+        return self._state.row(user_id)
+
+    def upsert(self, user_id: int, friend_id: int, strength: float, edge_id: int):
+        """Reflect a committed friendship insert or strength update."""
+        with self._lock:
+            if self._loads:
+                self._pending.append((user_id, friend_id, strength, edge_id))
+            if self.loaded:
+                self._upsert_locked(user_id, friend_id, strength, edge_id)
+
+    def _upsert_locked(self, user_id: int, friend_id: int, strength: float, edge_id: int):
+        state = self._state
+        neighbors, strengths, edge_ids = (array(a.typecode, a) for a in state.row(user_id))
+        pos = bisect_left(neighbors, friend_id)
+        if pos < len(neighbors) and neighbors[pos] == friend_id:
+            strengths[pos] = strength
+            edge_ids[pos] = edge_id
+        else:
+            neighbors.insert(pos, friend_id)
+            strengths.insert(pos, strength)
+            edge_ids.insert(pos, edge_id)
+
+        overlay = dict(state.overlay)
+        overlay[user_id] = (neighbors, strengths, edge_ids)
+        state = _GraphState(
+            state.row_of, state.offsets, state.neighbors, state.strengths, state.edge_ids, overlay
+        )
+        if len(overlay) > COMPACT_THRESHOLD:
+            state = _GraphState.build(state.all_rows())
+        self._state = state
+
+    def user_ids(self) -> List[int]:
+        """Users with at least one friendship."""
+        state = self._state
+        return sorted(set(state.row_of) | set(state.overlay))
+
+    def clear(self):
+        with self._lock:
+            self._state = _GraphState.build([])
+            self.loaded = False
+
+    def friend_ids(self, user_id: int) -> array:
+        """Sorted ids of the user's friends."""
+        return self._row(user_id)[0]
+
+    def friends(self, user_id: int) -> List[Tuple[int, float]]:
+        """(friend_id, strength) pairs, ordered by friend id."""
+        neighbors, strengths, _ = self._row(user_id)
+        return list(zip(neighbors, strengths))
+
+    def friendships(self, user_id: int) -> List[Tuple[int, int, float]]:
+        """(friendship_id, friend_id, strength) triples, ordered by friend id."""
+        neighbors, strengths, edge_ids = self._row(user_id)
+        return list(zip(edge_ids, neighbors, strengths))
+
+    def weighted_degree(self, user_id: int) -> float:
+        return float(sum(self._row(user_id)[1]))
+
+    def mutual_friend_count(self, user_id: int, other_id: int) -> int:
+        """Size of the intersection of two sorted neighbor arrays (two-pointer merge)."""
+        a, b = self.friend_ids(user_id), self.friend_ids(other_id)
+        i = j = count = 0
+        while i < len(a) and j < len(b):
+            if a[i] == b[j]:
+                count += 1
+                i += 1
+                j += 1
+            elif a[i] < b[j]:
+                i += 1
+            else:
+                j += 1
+        return count
+
+
+social_graph = register(SocialGraph())
+
+
+def get_social_graph(db: Session) -> SocialGraph:
+    return social_graph.ensure_loaded(db)
+
+
+def _refresh():
+    db = SessionLocal()
+    try:
+        social_graph.load(db)
+    finally:
+        db.close()
+
+
+async def refresh_periodically():
+    """Reload the loaded graph every SOCIAL_GRAPH_REFRESH_SECONDS until cancelled; started from `lifespan`."""
+    while True:
+        await asyncio.sleep(settings.SOCIAL_GRAPH_REFRESH_SECONDS)
+        if not social_graph.loaded:
+            continue
+        try:
+            await run_in_threadpool(_refresh)
+        except Exception:
+            logger.exception("Social graph refresh failed")
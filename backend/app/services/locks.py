@@ -0,0 +1,72 @@
+"""
+Per-key locks for check-then-insert sections, scoped to one venue at a time.
+
+On Postgres `venue_lock` takes `pg_advisory_xact_lock(namespace, venue_id)`,
+which all API workers see and which is released when the caller's transaction
+commits or rolls back. Requests for different venues never wait on each
+other, and no table or row lock is involved.
+
+Other databases (SQLite in development and tests) run as a single process, so
+the fallback is a local lock table: one `threading.Lock` per key, released when
+the `with` block exits.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Hashable, Iterator
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import metrics
+
+# First key of the two-key advisory lock form, so ids from different lock kinds never collide
+VENUE_LOCK_NAMESPACE = 1
+ARCHIVE_LOCK_NAMESPACE = 2
+PLANS_LOCK_NAMESPACE = 3
+
+
+class LocalLockTable:
+    def __init__(self):
+        self._locks: Dict[Hashable, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def lock(self, key: Hashable) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def clear(self):
+        with self._guard:
+            self._locks = {}
+
+
+local_locks = LocalLockTable()
+
+
+def is_shared(db: Session) -> bool:
+    """Whether `venue_lock` on this session excludes other processes, not just other threads."""
+    return db.get_bind().dialect.name == "postgresql"
+
+
+@contextmanager
+def venue_lock(db: Session, venue_id: int) -> Iterator[None]:
+    """
+    Hold the venue's lock for the block.
+
+    On Postgres the lock belongs to the session's transaction and outlives the
+    block until commit or rollback; commit inside the block to release it early.
+    """
+    start = time.perf_counter()
+    if is_shared(db):
+        db.execute(
+            text("SELECT pg_advisory_xact_lock(:namespace, :key)"),
+            {"namespace": VENUE_LOCK_NAMESPACE, "key": venue_id},
+        )
+        metrics.lock_wait_seconds.labels("advisory").observe(time.perf_counter() - start)
+        yield
+        return
+
+    lock = local_locks.lock(("venue", venue_id))
+    with lock:
+        metrics.lock_wait_seconds.labels("local").observe(time.perf_counter() - start)
+        yield
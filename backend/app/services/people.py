@@ -0,0 +1,200 @@
+"""
+Friend-of-friend people suggestions.
+
+Suggestions are computed for all users in batch from two sparse matrices:
+the weighted user x user friendship matrix A (the social graph's CSR arrays)
+and the binary user x venue interest matrix B (the interest index). For a
+user u the candidate row is the u-th row of A·A with u and u's direct friends
+masked out; each candidate is then scored with its mutual-friend count, the
+summed path strength and the shared-interest count (B·Bᵀ)[u, c]. Rows are
+built with Gustavson's row-by-row sparse product, so cost is proportional to
+the number of two-hop paths, not to users².
+
+All rows are computed in batch at warm-up and by `refresh_periodically`,
+never on the request path; until the first batch has run, a request computes
+just its own row. Between batches refresh is incremental: friendship and
+interest writes on this worker mark the rows whose two-hop neighbourhood they
+touch as dirty, and dirty rows are recomputed on their next read. When the
+social graph or interest index is reloaded (picking up other workers'
+writes), every row is treated as dirty until the next batch replaces them.
+"""
+import asyncio
+import logging
+import threading
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.services.aggregates import InterestIndex, get_interest_index, interest_index
+from app.services.graph import SocialGraph, get_social_graph, social_graph
+from app.state import register
+
+logger = logging.getLogger(__name__)
+
+MAX_SUGGESTIONS_PER_USER = 50
+
+MUTUAL_FRIEND_WEIGHT = 10.0
+PATH_STRENGTH_WEIGHT = 1.0
+SHARED_INTEREST_WEIGHT = 3.0
+
+
+class PersonSuggestion(NamedTuple):
+    user_id: int
+    score: float
+    mutual_friends: int
+    shared_interests: int
+
+
+def suggestion_row(graph: SocialGraph, index: InterestIndex, user_id: int) -> List[PersonSuggestion]:
+    """Compute row `user_id` of the masked A·A product and score its candidates."""
+    direct = graph.friend_ids(user_id)
+    excluded = set(direct)
+    excluded.add(user_id)
+
+    # Sparse accumulator for (A·A)[user_id, :], plus the count of distinct paths
+    path_strength: Dict[int, float] = {}
+    mutual: Dict[int, int] = {}
+    for friend_id, strength in graph.friends(user_id):
+        for candidate_id, candidate_strength in graph.friends(friend_id):
+            if candidate_id in excluded:
+                continue
+            path_strength[candidate_id] = path_strength.get(candidate_id, 0.0) + strength * candidate_strength
+            mutual[candidate_id] = mutual.get(candidate_id, 0) + 1
+
+    user_venues = index.user_venues(user_id)
+    suggestions = []
+    for candidate_id, strength in path_strength.items():
+        shared = len(user_venues & index.user_venues(candidate_id)) if user_venues else 0
+        score = (
+            mutual[candidate_id] * MUTUAL_FRIEND_WEIGHT
+            + strength * PATH_STRENGTH_WEIGHT
+            + shared * SHARED_INTEREST_WEIGHT
+        )
+        suggestions.append(PersonSuggestion(candidate_id, score, mutual[candidate_id], shared))
+
+    suggestions.sort(key=lambda s: (-s.score, s.user_id))
+    return suggestions[:MAX_SUGGESTIONS_PER_USER]
+
+
+def _versions(graph: SocialGraph, index: InterestIndex) -> Tuple[int, int]:
+    return graph.version, index.version
+
+
+class PeopleSuggestionStore:
+    def __init__(self):
+        self._rows: Dict[int, List[PersonSuggestion]] = {}
+        # Reverse adjacency: who lists this user as a friend
+        self._followers: Dict[int, Set[int]] = {}
+        self._dirty: Set[int] = set()
+        # (graph, index) versions the batch was computed from, and rows recomputed since they changed
+        self._versions: Tuple[int, int] = (0, 0)
+        self._recomputed: Dict[int, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        self.computed = False
+
+    def compute_all(self, db: Session):
+        """Batch-compute suggestion rows for every user in the graph."""
+        graph = get_social_graph(db)
+        index = get_interest_index(db)
+        versions = _versions(graph, index)
+
+        followers: Dict[int, Set[int]] = {}
+        for user_id in graph.user_ids():
+            for friend_id in graph.friend_ids(user_id):
+                followers.setdefault(friend_id, set()).add(user_id)
+
+        rows = {user_id: suggestion_row(graph, index, user_id) for user_id in graph.user_ids()}
+
+        with self._lock:
+            self._rows = rows
+            self._followers = followers
+            self._dirty = set()
+            self._versions = versions
+            self._recomputed = {}
+            self.computed = True
+
+    def outdated(self) -> bool:
+        """Whether the graph or index was reloaded since the last batch, or no batch has run."""
+        return not self.computed or _versions(social_graph, interest_index) != self._versions
+
+    def suggestions_for(self, db: Session, user_id: int, limit: Optional[int] = None) -> List[PersonSuggestion]:
+        graph = get_social_graph(db)
+        index = get_interest_index(db)
+        versions = _versions(graph, index)
+
+        if not self.computed:
+            # The batch has not run yet; compute this row alone rather than every user's
+            row = suggestion_row(graph, index, user_id)
+            return row if limit is None else row[:limit]
+
+        with self._lock:
+            stale = user_id in self._dirty or (
+                versions != self._versions and self._recomputed.get(user_id) != versions
+            )
+        if stale:
+            row = suggestion_row(graph, index, user_id)
+            with self._lock:
+                self._rows[user_id] = row
+                self._dirty.discard(user_id)
+                if versions != self._versions:
+                    self._recomputed[user_id] = versions
+        else:
+            row = self._rows.get(user_id, [])
+
+        return row if limit is None else row[:limit]
+
+    def mark_friendship_changed(self, user_id: int, friend_id: int):
+        """user_id's friend list changed: their row and every row with a path through user_id are stale."""
+        with self._lock:
+            if not self.computed:
+                return
+            self._followers.setdefault(friend_id, set()).add(user_id)
+            self._dirty.add(user_id)
+            self._dirty.update(self._followers.get(user_id, ()))
+
+    def mark_interest_changed(self, user_id: int):
+        """user_id's interests changed: their row and rows where they are a two-hop candidate are stale."""
+        with self._lock:
+            if not self.computed:
+                return
+            self._dirty.add(user_id)
+            for follower_id in self._followers.get(user_id, ()):
+                self._dirty.update(self._followers.get(follower_id, ()))
+
+    def clear(self):
+        with self._lock:
+            self._rows = {}
+            self._followers = {}
+            self._dirty = set()
+            self._versions = (0, 0)
+            self._recomputed = {}
+            self.computed = False
+
+
+people_suggestions = register(PeopleSuggestionStore())
+
+
+def _refresh():
+    db = SessionLocal()
+    try:
+        people_suggestions.compute_all(db)
+    finally:
+        db.close()
+
+
+async def refresh_periodically():
+    """
+    Recompute every row in the background once the graph or index has been reloaded, or the
+    batch never ran; checked every PEOPLE_SUGGESTIONS_REFRESH_SECONDS until cancelled.
+    """
+    while True:
+        await asyncio.sleep(settings.PEOPLE_SUGGESTIONS_REFRESH_SECONDS)
+        if not people_suggestions.outdated():
+            continue
+        try:
+            await run_in_threadpool(_refresh)
+        except Exception:
+            logger.exception("People suggestions refresh failed")
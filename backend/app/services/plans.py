@@ -0,0 +1,108 @@
+"""
+The "my plans" index: which reservations each user is part of, in time order.
+
+Listing a user's reservations from `reservations` and `reservation_participants`
+takes an OR across creator and participant plus DISTINCT, which no index
+serves. `user_reservations` keeps one row per (user, reservation) the user
+created or was invited to, with the reservation's time and whether it is
+cancelled copied in. The upcoming and past listings are then one range read of
+ix_user_reservations_user_time.
+
+Rows are written in the same transaction as the reservation change they mirror:
+- `add_members` when a reservation is created or users join it
+- `mark_cancelled` from `cancel_reservations`
+- purged reservations take their rows with them through ON DELETE CASCADE
+
+Accepting or declining an invitation doesn't change membership. Decliners still
+see the reservation, as they did before.
+
+`rebuild` recomputes the table from the reservations: `python -m app.services.plans`.
+For databases that predate the table, `backfill_if_empty` runs it during startup
+warm-up, so existing history is listed from the first request.
+"""
+import logging
+from datetime import datetime
+from typing import Collection, Iterable, Optional
+
+from sqlalchemy import delete, insert, select, text, union, update
+from sqlalchemy.orm import Session
+
+from app.models import Reservation, ReservationParticipant, ReservationStatus, UserReservation
+from app.services.locks import PLANS_LOCK_NAMESPACE, is_shared
+
+logger = logging.getLogger(__name__)
+
+
+def add_members(db: Session, reservation_id: int, time: datetime, user_ids: Iterable[int]):
+    """Index `reservation_id` for each of `user_ids`, none of whom may be indexed for it yet."""
+    db.add_all(
+        [
+            UserReservation(user_id=user_id, reservation_id=reservation_id, time=time, cancelled=False)
+            for user_id in dict.fromkeys(user_ids)
+        ]
+    )
+
+
+def mark_cancelled(db: Session, reservation_ids: Collection[int]):
+    """Flag cancelled reservations for every member; runs in the caller's transaction."""
+    if not reservation_ids:
+        return
+    db.execute(
+        update(UserReservation)
+        .where(UserReservation.reservation_id.in_(list(reservation_ids)))
+        .values(cancelled=True)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def rebuild(db: Session) -> int:
+    """Recompute the whole table from reservations and participants, in one transaction."""
+    cancelled = Reservation.status == ReservationStatus.CANCELLED
+    members = union(
+        select(Reservation.created_by_user_id, Reservation.id, Reservation.time, cancelled),
+        select(ReservationParticipant.user_id, Reservation.id, Reservation.time, cancelled).join(
+            Reservation, ReservationParticipant.reservation_id == Reservation.id
+        ),
+    )
+    db.execute(delete(UserReservation))
+    db.execute(
+        insert(UserReservation).from_select(
+            ["user_id", "reservation_id", "time", "cancelled"], members
+        )
+    )
+    db.commit()
+    return db.query(UserReservation).count()
+
+
+def backfill_if_empty(db: Session) -> Optional[int]:
+    """Run `rebuild` if the table is empty while reservations exist; returns the row count if it ran."""
+    if is_shared(db):
+        # Workers starting together backfill once; the others find the table filled after the lock
+        db.execute(text("SELECT pg_advisory_xact_lock(:namespace, 0)"), {"namespace": PLANS_LOCK_NAMESPACE})
+    needed = (
+        db.query(UserReservation.user_id).first() is None
+        and db.query(Reservation.id).first() is not None
+    )
+    if not needed:
+        db.rollback()
+        return None
+    rows = rebuild(db)
+    logger.info("Backfilled user_reservations with %d rows", rows)
+    return rows
+
+
+def main():
+    from app.db import SessionLocal
+    from app.logging_config import setup_logging
+
+    setup_logging()
+    db = SessionLocal()
+    try:
+        rows = rebuild(db)
+    finally:
+        db.close()
+    logger.info("Rebuilt user_reservations with %d rows", rows)
+
+
+if __name__ == "__main__":
+    main()
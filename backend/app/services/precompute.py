@@ -0,0 +1,219 @@
+"""
+Offline batch precomputation of location-independent recommendations.
+
+`run` bulk-loads venues, users, the social graph and the interest index once,
+scores `get_recommendations_for_user(user_id, None)` for every user across a
+process pool, and stores the serialized responses in
+`precomputed_recommendations`. The recommendations endpoint serves those rows
+when no location is given and the row is not stale.
+
+Rows are marked stale by interest writes (the user and everyone who lists
+them as a friend), friendship writes (the user) and new venues (everyone).
+Every user gets a row before scoring starts, and every mark bumps the row's
+`version`. The batch reads the versions before it loads its snapshot and
+stores a result only where the version is unchanged, so a write that commits
+after the snapshot was taken leaves the row stale instead of being
+overwritten. No clocks are compared, so the app servers' clocks and the
+writers' commit order do not matter.
+
+Usage:
+    python -m app.services.precompute --workers 4
+"""
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import bindparam, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app import metrics
+from app.models import Friendship, PrecomputedRecommendation, User, Venue
+from app.schemas import RecommendationsResponse, User as UserSchema, Venue as VenueSchema
+from app.services.aggregates import InterestIndex, get_interest_index
+from app.services.graph import SocialGraph, get_social_graph
+from app.services.recommendation import rank_recommendations
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+class Snapshot:
+    """Everything scoring needs, detached from the database so it can be shipped to workers."""
+
+    def __init__(
+        self,
+        venues: List[VenueSchema],
+        users: Dict[int, UserSchema],
+        graph: SocialGraph,
+        index: InterestIndex,
+    ):
+        self.venues = venues
+        self.users = users
+        self.graph = graph
+        self.index = index
+
+    @classmethod
+    def load(cls, db: Session) -> "Snapshot":
+        venues = [VenueSchema.model_validate(v) for v in db.query(Venue).all()]
+        users = {u.id: UserSchema.model_validate(u) for u in db.query(User).all()}
+        return cls(venues, users, get_social_graph(db), get_interest_index(db))
+
+    def payload_for(self, user_id: int) -> dict:
+        friendship_map = dict(self.graph.friends(user_id))
+        friends = {fid: self.users[fid] for fid in friendship_map if fid in self.users}
+        recommendations = rank_recommendations(
+            self.index, user_id, None, self.venues, friendship_map, friends
+        )
+        return RecommendationsResponse(recommended_venues=recommendations).model_dump(mode="json")
+
+
+_worker_snapshot: Optional[Snapshot] = None
+
+
+def _init_worker(snapshot: Snapshot):
+    global _worker_snapshot
+    _worker_snapshot = snapshot
+
+
+def _compute_chunk(user_ids: List[int]) -> Dict[int, dict]:
+    return {user_id: _worker_snapshot.payload_for(user_id) for user_id in user_ids}
+
+
+def _chunks(items: List[int], size: int) -> Iterable[List[int]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _ensure_rows(db: Session, user_ids: List[int]) -> Dict[int, int]:
+    """
+    Insert stale placeholders for users without a row, so invalidations during the run have a target.
+
+    Returns every row's version, read after the insert commits and before the snapshot is loaded.
+    """
+    existing = {uid for (uid,) in db.query(PrecomputedRecommendation.user_id)}
+    db.add_all(
+        [
+            PrecomputedRecommendation(user_id=user_id, payload={}, stale=True)
+            for user_id in user_ids
+            if user_id not in existing
+        ]
+    )
+    db.commit()
+    versions = dict(db.query(PrecomputedRecommendation.user_id, PrecomputedRecommendation.version))
+    db.commit()
+    return versions
+
+
+_table = PrecomputedRecommendation.__table__
+
+# One parameter set per user; rows invalidated since their version was read are skipped
+_STORE = (
+    update(_table)
+    .where(_table.c.user_id == bindparam("row_user_id"), _table.c.version == bindparam("seen_version"))
+    .values(payload=bindparam("payload"), computed_at=bindparam("computed_at"), stale=False)
+)
+
+
+def _store(db: Session, payloads: Dict[int, dict], computed_at: datetime, versions: Dict[int, int]):
+    db.execute(
+        _STORE,
+        [
+            {
+                "row_user_id": user_id,
+                "seen_version": versions[user_id],
+                "payload": payload,
+                "computed_at": computed_at,
+            }
+            for user_id, payload in payloads.items()
+        ],
+    )
+    db.commit()
+
+
+def run(db: Session, workers: int = 1, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """Precompute and store recommendations for every user; returns the number of users processed."""
+    started_at = datetime.utcnow()
+    versions = _ensure_rows(db, [uid for (uid,) in db.query(User.id)])
+
+    snapshot = Snapshot.load(db)
+    # Users created after the versions were read have no row yet; the next run picks them up
+    user_ids = sorted(uid for uid in snapshot.users if uid in versions)
+    chunks = list(_chunks(user_ids, chunk_size))
+
+    if workers <= 1:
+        _init_worker(snapshot)
+        for payloads in map(_compute_chunk, chunks):
+            _store(db, payloads, started_at, versions)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(snapshot,)
+        ) as pool:
+            for payloads in pool.map(_compute_chunk, chunks):
+                _store(db, payloads, started_at, versions)
+
+    logger.info("Precomputed recommendations for %d users", len(user_ids))
+    return len(user_ids)
+
+
+def mark_stale(db: Session, user_ids: Optional[List[int]] = None, include_followers: bool = False):
+    """
+    Flag precomputed rows as stale inside the caller's transaction.
+
+    With no `user_ids` every row is marked. With `include_followers`, users who
+    list any of `user_ids` as a friend are marked too, since friend interests
+    feed their scores.
+    """
+    statement = update(PrecomputedRecommendation).values(
+        stale=True,
+        invalidated_at=func.now(),
+        version=PrecomputedRecommendation.version + 1,
+    )
+    if user_ids is not None:
+        condition = PrecomputedRecommendation.user_id.in_(user_ids)
+        if include_followers:
+            followers = select(Friendship.user_id).where(Friendship.friend_id.in_(user_ids))
+            condition = or_(condition, PrecomputedRecommendation.user_id.in_(followers))
+        statement = statement.where(condition)
+    db.execute(statement)
+
+
+def get_precomputed(db: Session, user_id: int, limit: Optional[int] = None) -> Optional[List[dict]]:
+    """Return the stored recommendation list for a user if a fresh one exists."""
+    row = (
+        db.query(PrecomputedRecommendation.payload)
+        .filter(PrecomputedRecommendation.user_id == user_id, PrecomputedRecommendation.stale.is_(False))
+        .first()
+    )
+    if row is None:
+        metrics.recommendation_cache_misses_total.labels("precomputed").inc()
+        return None
+
+    metrics.recommendation_cache_hits_total.labels("precomputed").inc()
+    recommendations = row.payload["recommended_venues"]
+    return recommendations if limit is None else recommendations[:limit]
+
+
+def main():
+    import argparse
+
+    from app.db import SessionLocal
+    from app.logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Precompute location-independent recommendations")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (default 1)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Users per task")
+    args = parser.parse_args()
+
+    setup_logging()
+    db = SessionLocal()
+    try:
+        run(db, workers=args.workers, chunk_size=args.chunk_size)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,19 @@
+import heapq
 import math
-from typing import List, Optional, Tuple
+import threading
+from array import array
+from collections import Counter, OrderedDict
+from itertools import islice
+from typing import Collection, Dict, FrozenSet, List, Optional, Sequence, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
-from app.models import User, Venue, UserInterest, Friendship, InterestStatus
+from app.config import settings
+from app.models import User, Venue
+from app.services.aggregates import InterestIndex, get_interest_index
+from app.services import geohash
+from app.services.catalogue import CatalogueHandle, VenueCatalogue, get_venue_catalogue, views
+from app.services.graph import get_social_graph
+from app import metrics
+from app.state import register
 
 
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -24,64 +35,207 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     return distance
 
 
-def calculate_venue_score(
-    db: Session,
+def distance_score(user_location: Tuple[float, float], latitude: float, longitude: float) -> float:
+    """Exponential decay: 0-1km=50pts, 1-5km=30-10pts, 5-10km=5-1pts, >10km=<1pt."""
+    distance = haversine_distance(user_location[0], user_location[1], latitude, longitude)
+    return 50 * math.exp(-distance / 2.0)
+
+
+# Placeholder for venues a cell has not scored yet
+_UNSCORED = array("d", [math.nan])
+
+
+class VenuePositions:
+    """
+    Dense positions for venue ids, shared by every cell's score vector.
+
+    Venues get the next position the first time any cell scores them, so a
+    vector's length follows the number of distinct venues scored rather than
+    the largest venue id.
+    """
+
+    def __init__(self):
+        self._positions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def of(self, venue_id: int) -> int:
+        position = self._positions.get(venue_id)
+        if position is None:
+            with self._lock:
+                position = self._positions.setdefault(venue_id, len(self._positions))
+        return position
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+
+class CellDistances:
+    """
+    Distance scores from one location, filled in per venue on first use.
+
+    Scores are kept in a float64 array indexed by the venue's dense position
+    (see `VenuePositions`), NaN until scored: 8 bytes a venue rather than a
+    boxed dict entry.
+    """
+
+    __slots__ = ("centre", "_positions", "_scores")
+
+    def __init__(self, centre: Tuple[float, float], positions: Optional[VenuePositions] = None):
+        self.centre = centre
+        self._positions = positions if positions is not None else VenuePositions()
+        self._scores = array("d")
+
+    def score(self, venue_id: int, latitude: float, longitude: float) -> float:
+        position = self._positions.of(venue_id)
+        scores = self._scores
+        if position < len(scores):
+            score = scores[position]
+            if score == score:
+                return score
+        score = distance_score(self.centre, latitude, longitude)
+        missing = position + 1 - len(scores)
+        if missing > 0:
+            # Concurrent scorers may both grow the array; a few extra unscored slots are harmless
+            scores.extend(_UNSCORED * missing)
+        scores[position] = score
+        return score
+
+    def __len__(self) -> int:
+        """Slots allocated, which is what the vector costs in memory."""
+        return len(self._scores)
+
+
+class DistanceScoreCache:
+    """
+    LRU of distance-score vectors keyed by geohash cell.
+
+    Users are scored from the centre of their cell, so everyone in the same
+    cell (precision 8 by default, about 38 m x 19 m) shares one vector and the
+    trigonometry runs once per venue per cell. Venue coordinates never change
+    after creation, so entries need no invalidation; new venues are filled in
+    on first lookup.
+
+    The LRU holds at most RECOMMENDATION_DISTANCE_CACHE_CELLS cells and, checked
+    on each lookup, at most RECOMMENDATION_DISTANCE_CACHE_ENTRIES slots across
+    them. Vectors share dense venue positions, so a cell's slots are bounded by
+    the venues scored, and a cell that alone exceeds the budget is dropped too.
+    """
+
+    def __init__(self):
+        self._cells: "OrderedDict[str, CellDistances]" = OrderedDict()
+        self._positions = VenuePositions()
+        self._lock = threading.Lock()
+
+    def for_location(self, location: Tuple[float, float]) -> CellDistances:
+        max_cells = settings.RECOMMENDATION_DISTANCE_CACHE_CELLS
+        if max_cells <= 0:
+            # Caching disabled: score from the exact location
+            return CellDistances(location)
+
+        cell, centre = geohash.encode(location[0], location[1], settings.RECOMMENDATION_GEOHASH_PRECISION)
+        budget = settings.RECOMMENDATION_DISTANCE_CACHE_ENTRIES
+        with self._lock:
+            entry = self._cells.pop(cell, None)
+            hit = entry is not None
+            if entry is None:
+                entry = CellDistances(centre, self._positions)
+            # Vectors grow as they are used, so the budgets are enforced here rather than on insert
+            entries = len(entry) + sum(len(cached) for cached in self._cells.values())
+            while self._cells and (len(self._cells) >= max_cells or entries > budget):
+                _, evicted = self._cells.popitem(last=False)
+                entries -= len(evicted)
+            # A cell over the budget on its own still serves this request but is not kept
+            if len(entry) <= budget:
+                self._cells[cell] = entry
+
+        if hit:
+            metrics.recommendation_cache_hits_total.labels("distance").inc()
+        else:
+            metrics.recommendation_cache_misses_total.labels("distance").inc()
+        return entry
+
+    def cell_key(self, location: Optional[Tuple[float, float]]):
+        """Key under which two locations get identical distance scores."""
+        if location is None or settings.RECOMMENDATION_DISTANCE_CACHE_CELLS <= 0:
+            return location
+        return geohash.encode(location[0], location[1], settings.RECOMMENDATION_GEOHASH_PRECISION)[0]
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            # Vectors still in use keep the positions they were filled with
+            self._positions = VenuePositions()
+
+
+distance_cache = register(DistanceScoreCache())
+
+
+def venue_score(
+    index: InterestIndex,
     user_id: int,
     venue: Venue,
     user_location: Optional[Tuple[float, float]],
-    friend_ids: List[int],
+    friend_ids: Collection[int],
+    distances: Optional[CellDistances] = None,
 ) -> float:
     """
     Calculate score for a venue based on:
     - Distance from user location (if provided)
     - User's previous interest
     - Popularity among friends
+
+    Pass `friend_ids` as a set to keep the friend intersection
+    O(min(friends, interested users)). With `distances` the distance term is
+    read from that (cell-quantized) vector instead of `user_location`.
     """
     score = 0.0
 
     # Distance component (closer is better, max score 50 for very close venues)
     if user_location:
-        distance = haversine_distance(
-            user_location[0], user_location[1], venue.latitude, venue.longitude
-        )
-        # Exponential decay: closer venues get much higher scores
-        # Distance in km: 0-1km=50pts, 1-5km=30-10pts, 5-10km=5-1pts, >10km=<1pt
-        distance_score = 50 * math.exp(-distance / 2.0)
-        score += distance_score
+        if distances is not None:
+            score += distances.score(venue.id, venue.latitude, venue.longitude)
+        else:
+            score += distance_score(user_location, venue.latitude, venue.longitude)
 
     # User's previous interest component (10 points if previously interested)
-    user_interest = (
-        db.query(UserInterest)
-        .filter(
-            and_(
-                UserInterest.user_id == user_id,
-                UserInterest.venue_id == venue.id,
-                UserInterest.status.in_([InterestStatus.INTERESTED, InterestStatus.CONFIRMED]),
-            )
-        )
-        .first()
-    )
-    if user_interest:
+    if index.is_interested(user_id, venue.id):
         score += 10.0
 
     # Popularity among friends component (5 points per interested friend)
     if friend_ids:
-        interested_friends_count = (
-            db.query(func.count(UserInterest.id))
-            .filter(
-                and_(
-                    UserInterest.venue_id == venue.id,
-                    UserInterest.user_id.in_(friend_ids),
-                    UserInterest.status.in_([InterestStatus.INTERESTED, InterestStatus.CONFIRMED]),
-                )
-            )
-            .scalar()
-        )
+        interested_friends_count = index.count_interested_among(venue.id, friend_ids)
         score += interested_friends_count * 5.0
 
     return score
 
 
+def calculate_venue_score(
+    db: Session,
+    user_id: int,
+    venue: Venue,
+    user_location: Optional[Tuple[float, float]],
+    friend_ids: Collection[int],
+) -> float:
+    """Score a venue for a user using the in-memory interest index (see `venue_score`)."""
+    return venue_score(get_interest_index(db), user_id, venue, user_location, friend_ids)
+
+
+def _base_compatibility(
+    index: InterestIndex, user_id: int, candidate_id: int, friendship_strength: float
+) -> float:
+    """Venue-independent part of person compatibility."""
+    # Friendship strength component (0-50 points based on strength)
+    score = friendship_strength * 10.0
+
+    # Shared interests component (count venues both users are interested in)
+    score += index.shared_venue_count(user_id, candidate_id) * 3.0
+
+    return score
+
+
 def calculate_person_compatibility(
     db: Session, user_id: int, candidate_id: int, venue_id: int, friendship_strength: float
 ) -> float:
@@ -90,115 +244,287 @@ def calculate_person_compatibility(
     - Friendship strength
     - Shared interested venues
     """
-    score = 0.0
+    index = get_interest_index(db)
+    score = _base_compatibility(index, user_id, candidate_id, friendship_strength)
 
-    # Friendship strength component (0-50 points based on strength)
-    score += friendship_strength * 10.0
+    # Bonus if candidate is interested in this specific venue
+    if index.is_interested(candidate_id, venue_id):
+        score += 20.0
 
-    # Shared interests component (count venues both users are interested in)
-    user_interested_venues = (
-        db.query(UserInterest.venue_id)
-        .filter(
-            and_(
-                UserInterest.user_id == user_id,
-                UserInterest.status.in_([InterestStatus.INTERESTED, InterestStatus.CONFIRMED]),
-            )
-        )
-        .subquery()
-    )
+    return score
 
-    candidate_interested_venues = (
-        db.query(UserInterest.venue_id)
-        .filter(
-            and_(
-                UserInterest.user_id == candidate_id,
-                UserInterest.status.in_([InterestStatus.INTERESTED, InterestStatus.CONFIRMED]),
-            )
-        )
-        .subquery()
-    )
 
-    shared_venues_count = (
-        db.query(func.count())
-        .select_from(user_interested_venues)
-        .join(
-            candidate_interested_venues,
-            user_interested_venues.c.venue_id == candidate_interested_venues.c.venue_id,
-        )
-        .scalar()
-    )
+def _friend_base_scores(
+    index: InterestIndex, user_id: int, friendship_map: Dict[int, float], friends: Dict[int, object]
+) -> Dict[int, float]:
+    # Precompute the venue-independent part of each friend's compatibility
+    return {
+        friend_id: _base_compatibility(index, user_id, friend_id, strength)
+        for friend_id, strength in friendship_map.items()
+        if friend_id in friends
+    }
 
-    score += shared_venues_count * 3.0
 
-    # Bonus if candidate is interested in this specific venue
-    candidate_interested_in_venue = (
-        db.query(UserInterest)
-        .filter(
-            and_(
-                UserInterest.user_id == candidate_id,
-                UserInterest.venue_id == venue_id,
-                UserInterest.status.in_([InterestStatus.INTERESTED, InterestStatus.CONFIRMED]),
-            )
+def _recommendation(
+    index: InterestIndex, venue, score: float, base_scores: Dict[int, float], friends: Dict[int, object]
+) -> dict:
+    """One ranked venue with its top 5 recommended people."""
+    recommended_people = []
+
+    for friend_id, base_score in base_scores.items():
+        compatibility_score = base_score
+        if index.is_interested(friend_id, venue.id):
+            compatibility_score += 20.0
+
+        recommended_people.append(
+            {"user": friends[friend_id], "compatibility_score": compatibility_score}
         )
-        .first()
-    )
-    if candidate_interested_in_venue:
-        score += 20.0
 
-    return score
+    # Sort recommended people by compatibility score descending
+    recommended_people.sort(key=lambda x: x["compatibility_score"], reverse=True)
 
+    return {
+        "venue": venue,
+        "score": score,
+        "recommended_people": recommended_people[:5],  # Top 5 people
+    }
 
-def get_recommendations_for_user(
-    db: Session, user_id: int, user_location: Optional[Tuple[float, float]] = None
+
+def _record_metrics(venues_scored: int, friends_considered: int):
+    metrics.recommendation_requests_total.inc()
+    metrics.recommendation_venues_scored_total.inc(venues_scored)
+    metrics.recommendation_friends_considered_total.inc(friends_considered)
+
+
+def rank_recommendations(
+    index: InterestIndex,
+    user_id: int,
+    user_location: Optional[Tuple[float, float]],
+    venues: Sequence,
+    friendship_map: Dict[int, float],
+    friends: Dict[int, object],
+    limit: Optional[int] = None,
 ):
     """
-    Generate venue and people recommendations for a user.
+    Score and rank venues for a user from preloaded data, without touching the database.
 
-    Returns a list of venues with scores and recommended people for each venue.
+    `venues` and `friends` may be ORM rows or any objects with the same attributes,
+    which lets batch jobs run this in worker processes. Distance scores come
+    from the shared per-cell cache.
     """
-    # Get user's friends
-    friendships = db.query(Friendship).filter(Friendship.user_id == user_id).all()
-    friend_ids = [f.friend_id for f in friendships]
-    friendship_map = {f.friend_id: f.strength for f in friendships}
+    friend_set = frozenset(friendship_map)
+    base_scores = _friend_base_scores(index, user_id, friendship_map, friends)
+    distances = distance_cache.for_location(user_location) if user_location else None
+
+    recommendations = [
+        _recommendation(
+            index,
+            venue,
+            venue_score(index, user_id, venue, user_location, friend_set, distances),
+            base_scores,
+            friends,
+        )
+        for venue in venues
+    ]
 
-    # Get all venues
-    venues = db.query(Venue).all()
+    # Sort venues by score descending
+    recommendations.sort(key=lambda x: x["score"], reverse=True)
 
-    recommendations = []
+    _record_metrics(len(venues), len(base_scores) * len(venues))
 
-    for venue in venues:
-        # Calculate venue score
-        venue_score = calculate_venue_score(db, user_id, venue, user_location, friend_ids)
+    if limit is not None:
+        return recommendations[:limit]
+    return recommendations
 
-        # Get recommended people for this venue
-        recommended_people = []
 
-        for friend_id in friend_ids:
-            friend = db.query(User).filter(User.id == friend_id).first()
-            if not friend:
-                continue
+# Parallel scoring: the venue catalogue lives in shared memory and is scored in
+# shards by a process pool. Only per-request interest data (the user's venues and
+# per-venue interested-friend counts, both sparse) is sent with each task; people
+# are ranked afterwards, for the merged top-K venues only.
+
+# Process-pool machinery is imported on first use so deployments without
+# RECOMMENDATION_WORKERS don't pay for it at startup.
+_pool = None
+_pool_lock = threading.Lock()
+
+# Worker-process state: catalogue name -> (block, typed views)
+_attached: Dict[str, tuple] = {}
 
-            friendship_strength = friendship_map.get(friend_id, 1.0)
-            compatibility_score = calculate_person_compatibility(
-                db, user_id, friend_id, venue.id, friendship_strength
-            )
 
-            recommended_people.append(
-                {"user": friend, "compatibility_score": compatibility_score}
+def _scoring_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # spawn, not fork: the API process is multi-threaded
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.RECOMMENDATION_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
             )
+        return _pool
+
+
+def _ready() -> bool:
+    return True
+
 
-        # Sort recommended people by compatibility score descending
-        recommended_people.sort(key=lambda x: x["compatibility_score"], reverse=True)
+def start_scoring_pool():
+    """Spawn every worker now (and import this module in each) instead of on the first large request."""
+    pool = _scoring_pool()
+    for future in [pool.submit(_ready) for _ in range(settings.RECOMMENDATION_WORKERS)]:
+        future.result()
 
-        recommendations.append(
-            {
-                "venue": venue,
-                "score": venue_score,
-                "recommended_people": recommended_people[:5],  # Top 5 people
-            }
+
+def shutdown_scoring_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+def _attach(handle: CatalogueHandle):
+    entry = _attached.get(handle.name)
+    if entry is None:
+        # A new name means the catalogue was reloaded; drop the old mapping
+        for block, arrays in _attached.values():
+            for view in arrays:
+                view.release()
+            block.close()
+        _attached.clear()
+        from multiprocessing import shared_memory
+
+        block = shared_memory.SharedMemory(name=handle.name)
+        entry = _attached[handle.name] = (block, views(block, handle.size))
+    return entry[1]
+
+
+def _score_shard(
+    handle: CatalogueHandle,
+    start: int,
+    stop: int,
+    user_location: Optional[Tuple[float, float]],
+    own_venues: FrozenSet[int],
+    friend_counts: Dict[int, int],
+    k: int,
+) -> List[Tuple[float, int]]:
+    """Top-k (score, venue_id) for catalogue positions [start, stop); same arithmetic as `venue_score`."""
+    ids, latitudes, longitudes = _attach(handle)
+    scored = []
+    for position in range(start, stop):
+        venue_id = ids[position]
+        score = 0.0
+        if user_location:
+            score += distance_score(user_location, latitudes[position], longitudes[position])
+        if venue_id in own_venues:
+            score += 10.0
+        if friend_counts:
+            score += friend_counts.get(venue_id, 0) * 5.0
+        scored.append((score, -venue_id))
+    # Ties go to the lower venue id, matching the id-ordered sequential path
+    return [(score, -negated_id) for score, negated_id in heapq.nlargest(k, scored)]
+
+
+def score_catalogue(
+    handle: CatalogueHandle,
+    user_location: Optional[Tuple[float, float]],
+    own_venues: FrozenSet[int],
+    friend_counts: Dict[int, int],
+    limit: Optional[int] = None,
+) -> List[Tuple[float, int]]:
+    """Score every catalogue venue across the pool and merge the per-shard top-K lists."""
+    k = handle.size if limit is None else limit
+    shard_size = -(-handle.size // settings.RECOMMENDATION_WORKERS)
+    pool = _scoring_pool()
+    futures = [
+        pool.submit(
+            _score_shard,
+            handle,
+            start,
+            min(start + shard_size, handle.size),
+            user_location,
+            own_venues,
+            friend_counts,
+            k,
         )
+        for start in range(0, handle.size, shard_size)
+    ]
+    merged = heapq.merge(*(f.result() for f in futures), key=lambda item: (-item[0], item[1]))
+    return list(islice(merged, k))
 
-    # Sort venues by score descending
-    recommendations.sort(key=lambda x: x["score"], reverse=True)
 
+def _rank_parallel(
+    db: Session,
+    index: InterestIndex,
+    catalogue: VenueCatalogue,
+    user_id: int,
+    user_location: Optional[Tuple[float, float]],
+    friendship_map: Dict[int, float],
+    friends: Dict[int, object],
+    limit: Optional[int],
+):
+    friend_counts = Counter()
+    for friend_id in friendship_map:
+        friend_counts.update(index.user_venues(friend_id))
+
+    # Score from the cell centre so results match the cached sequential path
+    if user_location:
+        user_location = distance_cache.for_location(user_location).centre
+
+    with catalogue.acquire() as handle:
+        top = score_catalogue(handle, user_location, index.user_venues(user_id), dict(friend_counts), limit)
+
+    # Only the winning venues are loaded as ORM rows
+    query = db.query(Venue)
+    if limit is not None:
+        query = query.filter(Venue.id.in_([venue_id for _, venue_id in top]))
+    venues = {v.id: v for v in query}
+
+    base_scores = _friend_base_scores(index, user_id, friendship_map, friends)
+    recommendations = [
+        _recommendation(index, venues[venue_id], score, base_scores, friends)
+        for score, venue_id in top
+        if venue_id in venues
+    ]
+
+    _record_metrics(len(catalogue), len(base_scores) * len(recommendations))
     return recommendations
+
+
+def get_recommendations_for_user(
+    db: Session,
+    user_id: int,
+    user_location: Optional[Tuple[float, float]] = None,
+    limit: Optional[int] = None,
+):
+    """
+    Generate venue and people recommendations for a user.
+
+    Returns a list of venues with scores and recommended people for each venue,
+    truncated to the top `limit` venues when a limit is given. Catalogues of at
+    least RECOMMENDATION_PARALLEL_THRESHOLD venues are scored across a process
+    pool when RECOMMENDATION_WORKERS is set.
+    """
+    index = get_interest_index(db)
+
+    # Get user's friends from the in-memory social graph
+    friendship_map = dict(get_social_graph(db).friends(user_id))
+
+    # Load all friends at once
+    friends = {}
+    if friendship_map:
+        friends = {u.id: u for u in db.query(User).filter(User.id.in_(list(friendship_map)))}
+
+    if settings.RECOMMENDATION_WORKERS > 0:
+        catalogue = get_venue_catalogue(db)
+        if len(catalogue) and len(catalogue) >= settings.RECOMMENDATION_PARALLEL_THRESHOLD:
+            return _rank_parallel(
+                db, index, catalogue, user_id, user_location, friendship_map, friends, limit
+            )
+
+    # Get all venues
+    venues = db.query(Venue).order_by(Venue.id).all()
+
+    return rank_recommendations(index, user_id, user_location, venues, friendship_map, friends, limit)
@@ -0,0 +1,89 @@
+"""
+Request coalescing for identical concurrent calls.
+
+The first caller for a key runs the function; callers that arrive while it is
+in flight wait for and share its result (or exception) instead of recomputing.
+Nothing is cached once the call finishes, so a later request always sees
+fresh data.
+
+`SingleFlight` is for sync endpoints running in the threadpool;
+`AsyncSingleFlight` is for async handlers and keeps waiters on the event loop.
+Results are handed to every caller, so they must not be mutated.
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from app import metrics
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            metrics.coalesced_requests_total.labels(self.name).inc()
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        # Only touched from the event loop thread, so no lock is needed
+        future = self._calls.get(key)
+        if future is not None:
+            metrics.coalesced_requests_total.labels(self.name).inc()
+            # shield: a cancelled follower must not cancel the leader's computation
+            return await asyncio.shield(future)
+
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Mark retrieved so an exception nobody else awaited isn't logged as lost
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
@@ -0,0 +1,291 @@
+"""
+Capacity-aware time-slot allocation for venues.
+
+Each venue has a grid of bookable slots: `SLOT_MINUTES` long, from
+`SLOT_DAY_START_HOUR` to `SLOT_DAY_END_HOUR` on each of the next
+`SLOT_HORIZON_DAYS` days. A slot holds up to the venue's `capacity` seats
+(`VENUE_DEFAULT_CAPACITY` when unset), and a reservation takes one seat per
+participant who has not declined, in the slot its time falls in.
+Reservations outside the grid are not tracked.
+
+Free seats per slot live in a max segment tree, so "earliest slot at or after
+T with room for n people" is a single O(log slots) descent rather than a scan
+of the venue's reservations.
+
+Like the other in-memory indexes this is per process: a venue's grid is built
+from the database on first use (and again when the UTC day rolls over), then
+kept current by the reservation write paths through `book`, `release` and
+`shrink` (declines). All are keyed by reservation id, so repeating them is
+harmless. Writes by other processes are picked up slot by slot with
+`refresh`, which booking paths call under the venue's lock for just the slots
+they are about to book into.
+"""
+import math
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import (
+    ParticipantStatus,
+    Reservation,
+    ReservationParticipant,
+    ReservationStatus,
+    Venue,
+)
+from app.services.availability import _naive_utc
+from app.state import register
+
+
+def today() -> datetime:
+    """Midnight UTC today, the first day of every venue's grid; reservation times are naive UTC."""
+    return datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def horizon_end() -> datetime:
+    """The end of the days slots are booked into."""
+    return today() + timedelta(days=settings.SLOT_HORIZON_DAYS)
+
+
+class SlotTree:
+    """Max segment tree over free seats per slot."""
+
+    def __init__(self, free: List[int]):
+        self.n = len(free)
+        self.size = 1
+        while self.size < max(self.n, 1):
+            self.size *= 2
+        # Padding leaves can never fit a group
+        self.tree = [-1] * (2 * self.size)
+        self.tree[self.size:self.size + self.n] = free
+        for node in range(self.size - 1, 0, -1):
+            self.tree[node] = max(self.tree[2 * node], self.tree[2 * node + 1])
+
+    def free(self, index: int) -> int:
+        return self.tree[self.size + index]
+
+    def add(self, index: int, delta: int):
+        node = self.size + index
+        self.tree[node] += delta
+        node //= 2
+        while node:
+            self.tree[node] = max(self.tree[2 * node], self.tree[2 * node + 1])
+            node //= 2
+
+    def first_fit(self, start: int, seats: int) -> Optional[int]:
+        """Lowest slot index >= start with at least `seats` free, if any."""
+        if start >= self.n:
+            return None
+        return self._first_fit(1, 0, self.size, start, seats)
+
+    def _first_fit(self, node: int, lo: int, hi: int, start: int, seats: int) -> Optional[int]:
+        if hi <= start or self.tree[node] < seats:
+            return None
+        if hi - lo == 1:
+            return lo
+        mid = (lo + hi) // 2
+        found = self._first_fit(2 * node, lo, mid, start, seats)
+        if found is None:
+            found = self._first_fit(2 * node + 1, mid, hi, start, seats)
+        return found
+
+
+class SlotGrid:
+    """Maps times to slot indexes for the grid starting on `day`."""
+
+    def __init__(self, day: datetime):
+        self.day = day.replace(hour=0, minute=0, second=0, microsecond=0)
+        self.minutes = settings.SLOT_MINUTES
+        self.start_hour = settings.SLOT_DAY_START_HOUR
+        self.per_day = (settings.SLOT_DAY_END_HOUR - settings.SLOT_DAY_START_HOUR) * 60 // self.minutes
+        self.days = settings.SLOT_HORIZON_DAYS
+
+    def __len__(self) -> int:
+        return self.per_day * self.days
+
+    @property
+    def end(self) -> datetime:
+        return self.day + timedelta(days=self.days)
+
+    def time_of(self, index: int) -> datetime:
+        day, slot = divmod(index, self.per_day)
+        return self.day + timedelta(days=day, hours=self.start_hour, minutes=slot * self.minutes)
+
+    def _position(self, time: datetime) -> Tuple[int, float]:
+        # (day within the grid, minutes since that day's first slot)
+        day = (time.date() - self.day.date()).days
+        day_start = self.day + timedelta(days=day, hours=self.start_hour)
+        return day, (time - day_start).total_seconds() / 60
+
+    def index_of(self, time: datetime) -> Optional[int]:
+        """The slot containing `time`, or None outside the grid."""
+        day, minutes = self._position(time)
+        slot = int(minutes // self.minutes)
+        if not 0 <= day < self.days or not 0 <= slot < self.per_day:
+            return None
+        return day * self.per_day + slot
+
+    def first_index_from(self, time: datetime) -> int:
+        """The first slot starting at or after `time`; len(self) if none is left in the grid."""
+        if time <= self.day:
+            return 0
+        day, minutes = self._position(time)
+        if day >= self.days:
+            return len(self)
+        slot = max(0, math.ceil(minutes / self.minutes))
+        # Past the last slot of the day means the first slot of the next day
+        return min(day * self.per_day + min(slot, self.per_day), len(self))
+
+
+class VenueSlots:
+    def __init__(self, grid: SlotGrid, capacity: int, bookings: Dict[int, Tuple[int, int]]):
+        self.grid = grid
+        self.capacity = capacity
+        # reservation id -> (slot index, seats held)
+        self.bookings = bookings
+        free = [capacity] * len(grid)
+        for index, seats in bookings.values():
+            free[index] -= seats
+        self.tree = SlotTree(free)
+
+
+class SlotAllocator:
+    def __init__(self):
+        self._venues: Dict[int, VenueSlots] = {}
+        self._lock = threading.Lock()
+
+    def _held(
+        self, db: Session, venue_id: int, grid: SlotGrid, start: datetime, end: datetime
+    ) -> Dict[int, Tuple[int, int]]:
+        # reservation id -> (slot index, seats held) for reservations in the grid starting within [start, end)
+        rows = (
+            db.query(Reservation.id, Reservation.time, func.count(ReservationParticipant.id))
+            .join(ReservationParticipant)
+            .filter(
+                Reservation.venue_id == venue_id,
+                Reservation.status != ReservationStatus.CANCELLED,
+                Reservation.time >= start,
+                Reservation.time < end,
+                ReservationParticipant.status != ParticipantStatus.DECLINED,
+            )
+            .group_by(Reservation.id, Reservation.time)
+            .all()
+        )
+        held = {}
+        for reservation_id, time, seats in rows:
+            index = grid.index_of(time)
+            if index is not None:
+                held[reservation_id] = (index, seats)
+        return held
+
+    def _load(self, db: Session, venue_id: int, grid: SlotGrid) -> VenueSlots:
+        capacity = db.query(Venue.capacity).filter(Venue.id == venue_id).scalar()
+        bookings = self._held(db, venue_id, grid, grid.day, grid.end)
+        return VenueSlots(grid, capacity or settings.VENUE_DEFAULT_CAPACITY, bookings)
+
+    def _venue(self, db: Session, venue_id: int) -> VenueSlots:
+        day = today()
+        slots = self._venues.get(venue_id)
+        if slots is None or slots.grid.day != day:
+            loaded = self._load(db, venue_id, SlotGrid(day))
+            with self._lock:
+                slots = self._venues.get(venue_id)
+                if slots is None or slots.grid.day != day:
+                    slots = self._venues[venue_id] = loaded
+        return slots
+
+    def find(self, db: Session, venue_id: int, seats: int, not_before: datetime) -> Optional[datetime]:
+        """Start of the earliest slot at or after `not_before` with `seats` free; nothing is held."""
+        slots = self._venue(db, venue_id)
+        start = slots.grid.first_index_from(_naive_utc(not_before))
+        index = slots.tree.first_fit(start, seats)
+        return None if index is None else slots.grid.time_of(index)
+
+    def book(self, db: Session, venue_id: int, reservation_id: int, time: datetime, seats: int) -> bool:
+        """
+        Hold `seats` seats in the slot containing `time` for a reservation.
+
+        Re-booking a reservation adjusts its hold to the new count. Returns False,
+        changing nothing, if the slot lacks room; times outside the grid always fit.
+        """
+        slots = self._venue(db, venue_id)
+        index = slots.grid.index_of(_naive_utc(time))
+        if index is None:
+            return True
+        with self._lock:
+            previous = slots.bookings.get(reservation_id)
+            held = previous[1] if previous is not None and previous[0] == index else 0
+            if slots.tree.free(index) < seats - held:
+                return False
+            if previous is not None and previous[0] != index:
+                slots.tree.add(previous[0], previous[1])
+            slots.tree.add(index, held - seats)
+            slots.bookings[reservation_id] = (index, seats)
+        return True
+
+    def release(self, venue_id: int, reservation_id: int):
+        """Give back a cancelled or deleted reservation's seats."""
+        with self._lock:
+            slots = self._venues.get(venue_id)
+            if slots is None or reservation_id not in slots.bookings:
+                return
+            index, seats = slots.bookings.pop(reservation_id)
+            slots.tree.add(index, seats)
+
+    def shrink(self, venue_id: int, reservation_id: int, seats: int):
+        """Cut a reservation's hold to `seats` (e.g. after declines), giving the rest back; never grows it."""
+        with self._lock:
+            slots = self._venues.get(venue_id)
+            if slots is None or reservation_id not in slots.bookings:
+                return
+            index, held = slots.bookings[reservation_id]
+            if seats < held:
+                slots.tree.add(index, held - seats)
+                slots.bookings[reservation_id] = (index, seats)
+
+    def refresh(self, db: Session, venue_id: int, start: datetime, end: datetime):
+        """
+        Re-read the seats held in the slots covering [start, end], picking up other processes' writes.
+
+        Only those slots are queried and adjusted; the rest of the venue's grid
+        is left as it is.
+        """
+        slots = self._venue(db, venue_id)
+        grid = slots.grid
+        first = grid.index_of(_naive_utc(start))
+        if first is None:
+            first = grid.first_index_from(_naive_utc(start))
+        last = grid.index_of(_naive_utc(end))
+        if last is None:
+            last = grid.first_index_from(_naive_utc(end)) - 1
+        if first > last:
+            return
+        held = self._held(
+            db, venue_id, grid, grid.time_of(first), grid.time_of(last) + timedelta(minutes=grid.minutes)
+        )
+        with self._lock:
+            for reservation_id, (index, seats) in list(slots.bookings.items()):
+                if first <= index <= last and reservation_id not in held:
+                    del slots.bookings[reservation_id]
+                    slots.tree.add(index, seats)
+            for reservation_id, (index, seats) in held.items():
+                previous = slots.bookings.get(reservation_id)
+                if previous is not None:
+                    slots.tree.add(previous[0], previous[1])
+                slots.tree.add(index, -seats)
+                slots.bookings[reservation_id] = (index, seats)
+
+    def invalidate(self, venue_id: int):
+        """Drop a venue's grid (e.g. after a capacity change) so it is rebuilt on next use."""
+        with self._lock:
+            self._venues.pop(venue_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._venues = {}
+
+
+slot_allocator = register(SlotAllocator())
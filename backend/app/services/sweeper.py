@@ -0,0 +1,186 @@
+"""
+Periodic cleanup of reservations nobody will act on again.
+
+Each run works through three actions, each in bounded batches of
+`SWEEPER_BATCH_SIZE` rows, one short transaction per batch:
+- expire: PENDING reservations whose time has passed, or that were created
+  more than `PENDING_RESERVATION_TTL_HOURS` ago, are cancelled
+- invitations: INVITED participants of cancelled or past reservations are
+  marked DECLINED
+- purge: with `SWEEPER_PURGE_CANCELLED_AFTER_DAYS` set, cancelled reservations
+  older than that are deleted (participants go through ON DELETE CASCADE)
+- archive: with `RESERVATION_ARCHIVE_AFTER_DAYS` set, reservations older than
+  that move to the archive tables (see app.services.archive)
+
+Each batch is a single `UPDATE/DELETE ... WHERE id IN (SELECT id ... LIMIT n)`.
+On Postgres the inner SELECT uses FOR UPDATE SKIP LOCKED, so a batch skips
+rows that requests are writing instead of waiting for them. Several workers can
+sweep at once without duplicating work. An action stops after
+`SWEEPER_MAX_BATCHES` batches per run and sleeps `SWEEPER_BATCH_PAUSE_SECONDS`
+between batches, so a large backlog is worked off over several runs rather
+than in one long burst.
+
+`run_periodically` is started from `lifespan`; `sweep` can also be run by hand
+with `python -m app.services.sweeper`.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+
+from app import metrics
+from app.config import settings
+from app.db import SessionLocal
+from app.models import ParticipantStatus, Reservation, ReservationParticipant, ReservationStatus
+from app.services.agent import after_cancel, cancel_reservations, purge_reservations
+from app.services.archive import copy_to_archive, hot_since
+from app.services.availability import availability_index
+from app.services.slots import slot_allocator
+
+logger = logging.getLogger(__name__)
+
+
+def _batch(query, size: int):
+    # SQLite has no FOR UPDATE and leaves it out of the compiled SQL
+    return query.order_by(Reservation.id).limit(size).with_for_update(skip_locked=True)
+
+
+def expire_pending(db: Session, now: datetime, size: int) -> int:
+    cutoff = now - timedelta(hours=settings.PENDING_RESERVATION_TTL_HOURS)
+    stale = _batch(
+        select(Reservation.id).where(
+            Reservation.status == ReservationStatus.PENDING,
+            or_(Reservation.time < now, Reservation.created_at < cutoff),
+        ),
+        size,
+    )
+    cancelled = cancel_reservations(db, stale)
+    db.commit()
+    after_cancel(cancelled)
+    return len(cancelled)
+
+
+def expire_invitations(db: Session, now: datetime, size: int) -> int:
+    dead = (
+        select(ReservationParticipant.id)
+        .join(Reservation)
+        .where(
+            ReservationParticipant.status == ParticipantStatus.INVITED,
+            or_(Reservation.status == ReservationStatus.CANCELLED, Reservation.time < now),
+        )
+        .order_by(ReservationParticipant.id)
+        .limit(size)
+        .with_for_update(of=ReservationParticipant, skip_locked=True)
+    )
+    declined = db.execute(
+        update(ReservationParticipant)
+        .where(ReservationParticipant.id.in_(dead))
+        .values(status=ParticipantStatus.DECLINED)
+        .returning(ReservationParticipant.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    return len(declined)
+
+
+def purge_cancelled(db: Session, now: datetime, size: int) -> int:
+    if settings.SWEEPER_PURGE_CANCELLED_AFTER_DAYS <= 0:
+        return 0
+    cutoff = now - timedelta(days=settings.SWEEPER_PURGE_CANCELLED_AFTER_DAYS)
+    old = _batch(
+        select(Reservation.id).where(
+            Reservation.status == ReservationStatus.CANCELLED, Reservation.time < cutoff
+        ),
+        size,
+    )
+    purged = purge_reservations(db, old)
+    db.commit()
+    _forget(purged)
+    return len(purged)
+
+
+def archive_old(db: Session, now: datetime, size: int) -> int:
+    cutoff = hot_since(now)
+    if cutoff is None:
+        return 0
+    # Fetched first, so the same ids are copied and then deleted
+    old = db.execute(_batch(select(Reservation.id).where(Reservation.time < cutoff), size)).scalars().all()
+    copy_to_archive(db, old)
+    archived = purge_reservations(db, old)
+    db.commit()
+    _forget(archived)
+    return len(archived)
+
+
+def _forget(deleted: List[Tuple[int, int]]):
+    """Drop deleted (id, venue_id) reservations from the in-memory indexes."""
+    by_venue: Dict[int, set] = {}
+    for reservation_id, venue_id in deleted:
+        by_venue.setdefault(venue_id, set()).add(reservation_id)
+        slot_allocator.release(venue_id, reservation_id)
+    for venue_id, reservation_ids in by_venue.items():
+        availability_index.remove(venue_id, reservation_ids)
+
+
+ACTIONS: List[Tuple[str, Callable[[Session, datetime, int], int]]] = [
+    ("expire", expire_pending),
+    ("invitations", expire_invitations),
+    ("purge", purge_cancelled),
+    ("archive", archive_old),
+]
+
+
+def _drain(action: str, step: Callable[[Session, datetime, int], int], now: datetime) -> int:
+    total = 0
+    size = settings.SWEEPER_BATCH_SIZE
+    for batch in range(settings.SWEEPER_MAX_BATCHES):
+        if batch:
+            time.sleep(settings.SWEEPER_BATCH_PAUSE_SECONDS)
+        db = SessionLocal()
+        try:
+            count = step(db, now, size)
+        finally:
+            db.close()
+        metrics.sweeper_batches_total.labels(action).inc()
+        metrics.sweeper_rows_total.labels(action).inc(count)
+        total += count
+        if count < size:
+            break
+    return total
+
+
+def sweep(now: Optional[datetime] = None) -> Dict[str, int]:
+    """Run every action once and return how many rows each touched."""
+    now = now or datetime.utcnow()
+    start = time.perf_counter()
+    counts = {action: _drain(action, step, now) for action, step in ACTIONS}
+    metrics.sweeper_run_seconds.observe(time.perf_counter() - start)
+    if any(counts.values()):
+        logger.info("Sweeper run: %s", counts, extra={"reservation_count": counts["expire"]})
+    return counts
+
+
+async def run_periodically():
+    """Sweep every SWEEPER_INTERVAL_SECONDS until cancelled; started as a task from `lifespan`."""
+    while True:
+        try:
+            await run_in_threadpool(sweep)
+        except Exception:
+            logger.exception("Sweeper run failed")
+        await asyncio.sleep(settings.SWEEPER_INTERVAL_SECONDS)
+
+
+def main():
+    from app.logging_config import setup_logging
+
+    setup_logging()
+    sweep()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+Per-process in-memory state kept beside the database: indexes, caches and pins.
+
+Every such singleton is created through `register`, so `clear_all` empties
+all of them without a hand-kept list. Tests call it around each test, since
+each test starts from a fresh database.
+"""
+import threading
+from typing import List, TypeVar
+
+T = TypeVar("T")
+
+_registered: List = []
+_lock = threading.Lock()
+
+
+def register(state: T) -> T:
+    """Add `state` (anything with a `clear()` method) to the registry and return it."""
+    with _lock:
+        _registered.append(state)
+    return state
+
+
+def clear_all():
+    """Clear every registered piece of state."""
+    with _lock:
+        registered = list(_registered)
+    for state in registered:
+        state.clear()
@@ -0,0 +1,115 @@
+"""
+Startup warm-up, run from `lifespan` before the app reports ready.
+
+Work that would otherwise land on the first requests after a cold start is
+done here instead: SQLAlchemy mapper configuration, compiling the hot query
+shapes into the statement cache, opening pool connections to the primary and
+replicas, backfilling the user_reservations index on a database that predates
+it, and (optionally) loading the in-memory indexes and people suggestions. Every step is
+best-effort; a failure is logged and the work happens lazily later.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+from sqlalchemy.orm import configure_mappers
+
+from app.config import settings
+from app.db import SessionLocal, engine, read_replicas
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def _step(name: str, timings: Dict[str, float]):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        logger.exception("Warm-up step %s failed", name)
+    finally:
+        timings[name] = round((time.perf_counter() - start) * 1000, 2)
+
+
+def _open_connections(target_engine, count: int):
+    # Check out `count` connections at once so the pool keeps that many open
+    connections = [target_engine.connect() for _ in range(count)]
+    for connection in connections:
+        connection.close()
+
+
+def _compile_hot_statements():
+    """Run each hot query shape once against a missing id so its SQL is compiled and cached."""
+    from app.models import User, UserInterest, Venue
+    from app.routers.reservations import user_reservations_query
+
+    db = SessionLocal()
+    try:
+        db.query(User).filter(User.id == 0).first()
+        db.query(Venue).filter(Venue.id == 0).first()
+        db.query(UserInterest).filter(UserInterest.user_id == 0).all()
+        user_reservations_query(db, 0, include_cancelled=False).all()
+    finally:
+        db.close()
+
+
+def _backfill_plans():
+    """Fill user_reservations if it is empty, so existing reservations are listed from the first request."""
+    from app.services.plans import backfill_if_empty
+
+    db = SessionLocal()
+    try:
+        backfill_if_empty(db)
+    finally:
+        db.close()
+
+
+def preload_indexes():
+    """Build in-memory indexes up front; on failure they are built lazily on first use."""
+    from app.services.aggregates import interest_index
+    from app.services.availability import availability_index
+    from app.services.graph import social_graph
+    from app.services.people import people_suggestions
+
+    db = SessionLocal()
+    try:
+        interest_index.rebuild(db)
+        social_graph.load(db)
+        people_suggestions.compute_all(db)
+        availability_index.rebuild(db)
+        if settings.RECOMMENDATION_WORKERS > 0:
+            from app.services.catalogue import venue_catalogue
+            from app.services.recommendation import start_scoring_pool
+
+            venue_catalogue.load(db)
+            if len(venue_catalogue) >= settings.RECOMMENDATION_PARALLEL_THRESHOLD:
+                start_scoring_pool()
+    finally:
+        db.close()
+
+
+def warm_up() -> Dict[str, float]:
+    """Run every warm-up step and return per-step durations in milliseconds."""
+    timings: Dict[str, float] = {}
+
+    with _step("mappers", timings):
+        configure_mappers()
+
+    with _step("pool", timings):
+        _open_connections(engine, settings.WARMUP_POOL_CONNECTIONS)
+        for replica in read_replicas.engines:
+            _open_connections(replica, settings.WARMUP_POOL_CONNECTIONS)
+
+    with _step("plans", timings):
+        _backfill_plans()
+
+    with _step("statements", timings):
+        _compile_hot_statements()
+
+    if settings.WARMUP_PRELOAD_CACHES:
+        with _step("caches", timings):
+            preload_indexes()
+
+    logger.info("Warm-up finished in %.1f ms", sum(timings.values()), extra={"warmup_ms": timings})
+    return timings
@@ -0,0 +1,69 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import state
+from app.db import Base, get_db
+from app.main import app
+
+MEMORY_URL = "sqlite:///:memory:"
+
+
+@pytest.fixture(autouse=True)
+def reset_in_memory_state():
+    """Each test builds a fresh database, so per-process indexes must start empty too."""
+    state.clear_all()
+    yield
+    state.clear_all()
+
+
+@pytest.fixture
+def database_url():
+    """In-memory by default; modules that need a connection per thread override it with a file URL."""
+    return MEMORY_URL
+
+
+@pytest.fixture
+def engine(database_url):
+    """A fresh SQLite database with every table."""
+    if database_url == MEMORY_URL:
+        # One connection shared by all threads, or each would see its own empty database
+        engine = create_engine(database_url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    else:
+        engine = create_engine(database_url, connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db(session_factory):
+    """A session on the test database; modules seed it by overriding this fixture."""
+    db = session_factory()
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def client(session_factory):
+    """A TestClient whose requests use the test database."""
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    previous = dict(app.dependency_overrides)
+    app.dependency_overrides[get_db] = override_get_db
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+    app.dependency_overrides.update(previous)
@@ -0,0 +1,97 @@
+import pytest
+from app.models import User, Venue, UserInterest, InterestStatus
+from app.services.aggregates import InterestIndex
+
+
+@pytest.fixture
+def db(db):
+    """Create a fresh database with a few interests."""
+    db.add_all([User(id=i, name=f"User {i}") for i in range(1, 5)])
+    db.add_all(
+        [
+            Venue(id=v, name=f"Venue {v}", category="cafe", address="x", latitude=0.0, longitude=0.0)
+            for v in (1, 2)
+        ]
+    )
+    db.flush()
+    db.add_all(
+        [
+            UserInterest(user_id=3, venue_id=1, status=InterestStatus.INTERESTED),
+            UserInterest(user_id=1, venue_id=1, status=InterestStatus.CONFIRMED),
+            UserInterest(user_id=2, venue_id=1, status=InterestStatus.NOT_INTERESTED),
+            UserInterest(user_id=2, venue_id=2, status=InterestStatus.INTERESTED),
+            UserInterest(user_id=1, venue_id=2, status=InterestStatus.INTERESTED),
+        ]
+    )
+    db.commit()
+    return db
+
+
+def test_rebuild_counts_only_active_interests(db):
+    """Test that NOT_INTERESTED rows are excluded and venue arrays are sorted."""
+    index = InterestIndex()
+    index.rebuild(db)
+
+    assert list(index.interested_users(1)) == [1, 3]
+    assert index.popularity(2) == 2
+    assert index.user_venues(1) == {1, 2}
+    assert index.most_popular(1)[0][1] == 2
+    assert index.count_interested_among(1, {2, 3, 4}) == 1
+    assert index.shared_venue_count(1, 2) == 1
+
+
+def test_apply_keeps_index_in_sync(db):
+    """Test incremental updates match a full rebuild."""
+    index = InterestIndex()
+    index.rebuild(db)
+
+    index.apply(2, 1, InterestStatus.CONFIRMED)
+    index.apply(3, 1, InterestStatus.NOT_INTERESTED)
+    index.apply(4, 2, InterestStatus.INTERESTED)
+
+    assert list(index.interested_users(1)) == [1, 2]
+    assert list(index.interested_users(2)) == [1, 2, 4]
+    assert not index.is_interested(3, 1)
+    assert index.count_interested_among(1, [2, 3]) == 1
+
+
+def test_apply_is_ignored_until_loaded():
+    """Test that writes before the first load don't create a partial index."""
+    index = InterestIndex()
+    index.apply(1, 1, InterestStatus.INTERESTED)
+    assert index.popularity(1) == 0
+    assert not index.loaded
+
+
+def test_writes_during_rebuild_are_kept(db, monkeypatch):
+    """Test that writes applied while a lazy rebuild reads rows survive into the installed snapshot."""
+    index = InterestIndex()
+    real_query = db.query
+
+    class WritesAfterRead:
+        # Stands in for requests that commit and apply after the rebuild's SELECT ran
+        def __init__(self, query):
+            self._query = query
+
+        def filter(self, *criteria):
+            return WritesAfterRead(self._query.filter(*criteria))
+
+        def order_by(self, *clauses):
+            return WritesAfterRead(self._query.order_by(*clauses))
+
+        def all(self):
+            rows = self._query.all()
+            index.apply(4, 1, InterestStatus.CONFIRMED)
+            index.apply(1, 2, InterestStatus.NOT_INTERESTED)
+            return rows
+
+    monkeypatch.setattr(db, "query", lambda *entities: WritesAfterRead(real_query(*entities)))
+    index.ensure_loaded(db)
+
+    assert list(index.interested_users(1)) == [1, 3, 4]
+    assert list(index.interested_users(2)) == [2]
+    assert index.user_venues(1) == {1}
+
+    # Once the rebuild is done, writes are no longer buffered
+    index.apply(2, 1, InterestStatus.INTERESTED)
+    assert index._pending == []
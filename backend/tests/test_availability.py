@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+
+import pytest
+from app.models import (
+    User,
+    Venue,
+    Reservation,
+    ReservationParticipant,
+    ReservationStatus,
+    ParticipantStatus,
+)
+from app.services.availability import (
+    AvailabilityIndex,
+    availability_index,
+    conflicting_reservations,
+    find_same_group,
+)
+
+SEVEN_PM = datetime(2030, 1, 1, 19, 0)
+
+
+@pytest.fixture
+def db(db):
+    """Venue 1 has reservations at 18:00, 19:00 (cancelled), 19:20 and 21:00; venue 2 one at 19:00."""
+    db.add_all([User(id=i, name=f"User {i}") for i in (1, 2, 3)])
+    db.add_all(
+        [
+            Venue(id=v, name=f"Venue {v}", category="bar", address="x", latitude=0.0, longitude=0.0)
+            for v in (1, 2)
+        ]
+    )
+    db.flush()
+    slots = [
+        (1, 1, SEVEN_PM - timedelta(hours=1), ReservationStatus.PENDING, [1]),
+        (2, 1, SEVEN_PM, ReservationStatus.CANCELLED, [1, 2]),
+        (3, 1, SEVEN_PM + timedelta(minutes=20), ReservationStatus.CONFIRMED, [1, 2, 3]),
+        (4, 1, SEVEN_PM + timedelta(hours=2), ReservationStatus.PENDING, [2]),
+        (5, 2, SEVEN_PM, ReservationStatus.PENDING, [1, 2]),
+    ]
+    for reservation_id, venue_id, time, status, user_ids in slots:
+        db.add(
+            Reservation(
+                id=reservation_id, venue_id=venue_id, created_by_user_id=user_ids[0], time=time, status=status
+            )
+        )
+        db.add_all(
+            [
+                ReservationParticipant(
+                    reservation_id=reservation_id, user_id=u, status=ParticipantStatus.INVITED
+                )
+                for u in user_ids
+            ]
+        )
+    db.commit()
+    return db
+
+
+def test_window_lookup_skips_cancelled_and_other_venues(db):
+    """Test that overlap queries return active reservations of the venue within the window only."""
+    assert [r.id for r in conflicting_reservations(db, 1, SEVEN_PM)] == [3]
+    assert [r.id for r in conflicting_reservations(db, 1, SEVEN_PM, timedelta(hours=1))] == [1, 3]
+    assert conflicting_reservations(db, 1, SEVEN_PM + timedelta(hours=4)) == []
+    assert [r.id for r in conflicting_reservations(db, 2, SEVEN_PM)] == [5]
+
+
+def test_same_group_requires_all_participants(db):
+    """Test that only reservations already including the whole group count as duplicates."""
+    assert find_same_group(db, 1, SEVEN_PM, [1, 3]).id == 3
+    assert find_same_group(db, 1, SEVEN_PM - timedelta(hours=1), [1, 2]) is None
+
+
+def test_incremental_updates_match_rebuild(db):
+    """Test that add/remove keep the index identical to a fresh rebuild."""
+    availability_index.ensure_loaded(db)
+
+    db.add(Reservation(id=6, venue_id=1, created_by_user_id=1, time=SEVEN_PM - timedelta(minutes=10)))
+    db.query(Reservation).filter(Reservation.id == 3).update({"status": ReservationStatus.CANCELLED})
+    db.commit()
+    availability_index.add(1, SEVEN_PM - timedelta(minutes=10), 6)
+    availability_index.remove(1, {3})
+
+    fresh = AvailabilityIndex()
+    fresh.rebuild(db)
+    window = (SEVEN_PM - timedelta(hours=3), SEVEN_PM + timedelta(hours=3))
+    for venue_id in (1, 2):
+        assert availability_index.overlapping(venue_id, *window) == fresh.overlapping(venue_id, *window)
+    assert availability_index.overlapping(1, *window) == [1, 6, 4]
+
+
+def test_reload_window_reads_only_the_window(db):
+    """Test that reload_window picks up other processes' writes inside the window and nothing else."""
+    availability_index.ensure_loaded(db)
+
+    # Written by another worker: one booking near 19:00, one late in the evening, one cancellation
+    db.add(Reservation(id=6, venue_id=1, created_by_user_id=1, time=SEVEN_PM + timedelta(minutes=10)))
+    db.add(Reservation(id=7, venue_id=1, created_by_user_id=1, time=SEVEN_PM + timedelta(hours=3)))
+    db.query(Reservation).filter(Reservation.id == 3).update({"status": ReservationStatus.CANCELLED})
+    db.commit()
+
+    availability_index.reload_window(db, 1, SEVEN_PM - timedelta(minutes=30), SEVEN_PM + timedelta(minutes=30))
+    window = (SEVEN_PM - timedelta(hours=3), SEVEN_PM + timedelta(hours=4))
+    assert availability_index.overlapping(1, *window) == [1, 6, 4]
+    assert availability_index.overlapping(2, *window) == [5]
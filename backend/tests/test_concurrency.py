@@ -0,0 +1,72 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from app.models import Reservation, ReservationStatus
+from app.services.locks import is_shared, venue_lock
+
+USERS = 16
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    # A file database, so every thread gets its own connection as it would against Postgres
+    return f"sqlite:///{tmp_path / 'stress.db'}"
+
+
+def test_local_lock_table_serializes_per_key(session_factory):
+    """Test that the fallback lock excludes holders of the same venue but not of other venues."""
+    db = session_factory()
+    assert not is_shared(db)
+    inside = []
+    overlaps = []
+
+    def hold(venue_id):
+        with venue_lock(db, venue_id):
+            inside.append(venue_id)
+            overlaps.append(inside.count(venue_id))
+            time.sleep(0.01)
+            inside.remove(venue_id)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(hold, [1, 1, 1, 1, 2, 2, 2, 2]))
+    db.close()
+
+    assert max(overlaps) == 1
+
+
+def test_concurrent_confirmations_book_one_reservation(client, session_factory):
+    """Stress: many users confirm one venue at once; the group ends up with exactly one reservation."""
+    user_ids = [client.post("/users", json={"name": f"User {i}"}).json()["id"] for i in range(USERS)]
+    venue_id = client.post(
+        "/venues",
+        json={"name": "Bar", "category": "bar", "address": "1 Main St", "latitude": 0.0, "longitude": 0.0},
+    ).json()["id"]
+
+    barrier = threading.Barrier(USERS)
+
+    def confirm(user_id):
+        barrier.wait()
+        return client.post(
+            f"/users/{user_id}/interests", json={"venue_id": venue_id, "status": "CONFIRMED"}
+        ).status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=USERS) as pool:
+        statuses = list(pool.map(confirm, user_ids))
+    elapsed = time.perf_counter() - start
+    print(f"{USERS} concurrent confirmations in {elapsed:.3f}s ({USERS / elapsed:.1f}/s)")
+
+    assert statuses == [201] * USERS
+    db = session_factory()
+    try:
+        reservations = (
+            db.query(Reservation)
+            .filter(Reservation.venue_id == venue_id, Reservation.status != ReservationStatus.CANCELLED)
+            .all()
+        )
+        assert len(reservations) == 1
+        assert {p.user_id for p in reservations[0].participants} == set(user_ids)
+    finally:
+        db.close()
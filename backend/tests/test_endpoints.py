@@ -1,37 +1,6 @@
-import pytest
-from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 from datetime import datetime, timedelta
 
-from app.main import app
-from app.db import Base, get_db
-from app.models import InterestStatus
-
-# Use in-memory SQLite for testing
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-
-def override_get_db():
-    db = TestingSessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-app.dependency_overrides[get_db] = override_get_db
-
-
-@pytest.fixture
-def client():
-    """Create a fresh database and test client for each test."""
-    Base.metadata.create_all(bind=engine)
-    client = TestClient(app)
-    yield client
-    Base.metadata.drop_all(bind=engine)
+from app.models import InterestStatus, Friendship
 
 
 def test_root_endpoint(client):
@@ -311,6 +280,35 @@ def test_create_reservation(client):
     assert len(data["participants"]) == 2
 
 
+def test_create_duplicate_reservation_conflicts(client):
+    """Test that the same group cannot book the same venue twice within 30 minutes."""
+    alice_id = client.post("/users", json={"name": "Alice"}).json()["id"]
+    bob_id = client.post("/users", json={"name": "Bob"}).json()["id"]
+    venue_id = client.post(
+        "/venues",
+        json={
+            "name": "Coffee Shop",
+            "category": "cafe",
+            "address": "123 Main St",
+            "latitude": 40.7589,
+            "longitude": -73.9851,
+        },
+    ).json()["id"]
+
+    reservation_time = datetime.utcnow() + timedelta(hours=2)
+
+    def book(time, participants):
+        return client.post(
+            "/reservations",
+            json={"venue_id": venue_id, "time": time.isoformat(), "participant_user_ids": participants},
+        )
+
+    assert book(reservation_time, [alice_id, bob_id]).status_code == 201
+    assert book(reservation_time + timedelta(minutes=15), [bob_id, alice_id]).status_code == 409
+    assert book(reservation_time + timedelta(minutes=15), [alice_id]).status_code == 409
+    assert book(reservation_time + timedelta(hours=1), [alice_id, bob_id]).status_code == 201
+
+
 def test_accept_reservation(client):
     """Test accepting a reservation invitation."""
     # Create users
@@ -356,6 +354,118 @@ def test_accept_reservation(client):
     assert "reservation" in data
 
 
+def test_accept_confirms_when_everyone_accepted(client):
+    """Test the accept flow end to end: waiting, confirmed, and the 404 cases."""
+    from app import metrics
+
+    alice_id = client.post("/users", json={"name": "Alice"}).json()["id"]
+    bob_id = client.post("/users", json={"name": "Bob"}).json()["id"]
+    carol_id = client.post("/users", json={"name": "Carol"}).json()["id"]
+    venue_id = client.post(
+        "/venues",
+        json={
+            "name": "Coffee Shop",
+            "category": "cafe",
+            "address": "123 Main St",
+            "latitude": 40.7589,
+            "longitude": -73.9851,
+        },
+    ).json()["id"]
+    reservation_id = client.post(
+        "/reservations",
+        json={
+            "venue_id": venue_id,
+            "time": (datetime.utcnow() + timedelta(hours=2)).isoformat(),
+            "participant_user_ids": [alice_id, bob_id],
+        },
+    ).json()["id"]
+
+    def accept(user_id, rid=reservation_id):
+        return client.post("/reservations/accept", json={"reservation_id": rid, "user_id": user_id})
+
+    data = accept(alice_id).json()
+    assert data["message"] == "Reservation accepted, waiting for other participants"
+    assert data["reservation"]["status"] == "PENDING"
+
+    queries_before = metrics.db_queries_total.value()
+    data = accept(bob_id).json()
+    # UPDATE participant, UPDATE reservation, SELECT reservation + venue, SELECT participants + users
+    assert metrics.db_queries_total.value() - queries_before <= 4
+    assert data["message"] == "Reservation accepted and confirmed"
+    assert data["reservation"]["status"] == "CONFIRMED"
+    assert {p["status"] for p in data["reservation"]["participants"]} == {"ACCEPTED"}
+
+    assert accept(bob_id).json()["message"] == "Reservation accepted and confirmed"
+    assert accept(alice_id, rid=999).json()["detail"] == "Reservation not found"
+    assert accept(999).json()["detail"] == "User not found"
+    assert accept(carol_id).json()["detail"] == "User is not a participant in this reservation"
+
+
+def test_respond_to_invitations_in_batch(client):
+    """Test accepting and declining several invitations in one request."""
+    alice_id = client.post("/users", json={"name": "Alice"}).json()["id"]
+    bob_id = client.post("/users", json={"name": "Bob"}).json()["id"]
+    carol_id = client.post("/users", json={"name": "Carol"}).json()["id"]
+    venue_id = client.post(
+        "/venues",
+        json={
+            "name": "Coffee Shop",
+            "category": "cafe",
+            "address": "123 Main St",
+            "latitude": 40.7589,
+            "longitude": -73.9851,
+        },
+    ).json()["id"]
+
+    def reserve(hours, user_ids):
+        return client.post(
+            "/reservations",
+            json={
+                "venue_id": venue_id,
+                "time": (datetime.utcnow() + timedelta(hours=hours)).isoformat(),
+                "participant_user_ids": user_ids,
+            },
+        ).json()["id"]
+
+    with_bob = reserve(2, [alice_id, bob_id])
+    with_carol = reserve(5, [alice_id, carol_id])
+    client.post("/reservations/accept", json={"reservation_id": with_bob, "user_id": bob_id})
+
+    def respond(user_id, *responses):
+        return client.post(
+            "/reservations/respond",
+            json={
+                "user_id": user_id,
+                "responses": [{"reservation_id": rid, "status": status} for rid, status in responses],
+            },
+        )
+
+    response = respond(alice_id, (with_bob, "ACCEPTED"), (with_carol, "DECLINED"))
+    assert response.status_code == 200
+    data = {r["id"]: r for r in response.json()}
+    assert data[with_bob]["status"] == "CONFIRMED"
+    # Carol has not answered yet, so Alice declining does not confirm hers
+    assert data[with_carol]["status"] == "PENDING"
+
+    # Once Carol accepts, the group without the decliner is confirmed
+    data = respond(carol_id, (with_carol, "ACCEPTED")).json()
+    assert data[0]["status"] == "CONFIRMED"
+    assert {p["user_id"]: p["status"] for p in data[0]["participants"]} == {
+        alice_id: "DECLINED",
+        carol_id: "ACCEPTED",
+    }
+
+    # All or nothing: a reservation Bob is not part of rejects the whole batch
+    assert respond(bob_id, (with_bob, "DECLINED"), (with_carol, "ACCEPTED")).status_code == 404
+    bob_status = client.get(f"/reservations/{bob_id}").json()[0]["participants"]
+    assert {p["status"] for p in bob_status if p["user_id"] == bob_id} == {"ACCEPTED"}
+
+    assert respond(999, (with_bob, "ACCEPTED")).status_code == 404
+    assert respond(bob_id, (with_bob, "ACCEPTED"), (with_bob, "DECLINED")).status_code == 422
+    assert respond(bob_id, (with_bob, "INVITED")).status_code == 422
+    assert respond(bob_id).status_code == 422
+
+
 def test_get_user_reservations(client):
     """Test getting reservations for a user."""
     # Create user
@@ -391,3 +501,333 @@ def test_get_user_reservations(client):
     assert response.status_code == 200
     data = response.json()
     assert len(data) >= 1
+
+
+def test_cancel_reservations(client, session_factory):
+    """Test soft cancel, bulk cancel and purge of reservations."""
+    from app.models import ReservationParticipant
+
+    alice_id = client.post("/users", json={"name": "Alice"}).json()["id"]
+    bob_id = client.post("/users", json={"name": "Bob"}).json()["id"]
+    venue_id = client.post(
+        "/venues",
+        json={
+            "name": "Coffee Shop",
+            "category": "cafe",
+            "address": "123 Main St",
+            "latitude": 40.7589,
+            "longitude": -73.9851,
+        },
+    ).json()["id"]
+
+    def reserve(hours):
+        return client.post(
+            "/reservations",
+            json={
+                "venue_id": venue_id,
+                "time": (datetime.utcnow() + timedelta(hours=hours)).isoformat(),
+                "participant_user_ids": [alice_id, bob_id],
+            },
+        ).json()["id"]
+
+    first, second, third, fourth = reserve(2), reserve(4), reserve(6), reserve(8)
+
+    response = client.delete(f"/reservations/{first}")
+    assert response.json() == {"success": True, "message": "Reservation cancelled"}
+    assert client.delete(f"/reservations/{first}").json()["message"] == "Reservation already cancelled"
+    assert client.delete("/reservations/999").status_code == 404
+
+    # A cancelled reservation can no longer be accepted or responded to
+    response = client.post("/reservations/accept", json={"reservation_id": first, "user_id": bob_id})
+    assert response.status_code == 409
+    response = client.post(
+        "/reservations/respond",
+        json={
+            "user_id": bob_id,
+            "responses": [
+                {"reservation_id": second, "status": "ACCEPTED"},
+                {"reservation_id": first, "status": "ACCEPTED"},
+            ],
+        },
+    )
+    assert response.status_code == 409
+    assert str(first) in response.json()["detail"]
+    statuses = {
+        r["id"]: {p["user_id"]: p["status"] for p in r["participants"]}
+        for r in client.get(f"/reservations/{bob_id}", params={"include_cancelled": True}).json()
+    }
+    assert statuses[first][bob_id] == "INVITED"
+    assert statuses[second][bob_id] == "INVITED"
+
+    # Cancelled reservations stay as history but drop out of the default listing
+    listed = {r["id"] for r in client.get(f"/reservations/{alice_id}").json()}
+    assert listed == {second, third, fourth}
+    history = client.get(f"/reservations/{alice_id}", params={"include_cancelled": True}).json()
+    assert {r["id"]: r["status"] for r in history}[first] == "CANCELLED"
+
+    # The slot is free again once its reservation is cancelled
+    assert reserve(2) is not None
+
+    response = client.post("/reservations/cancel", json={"reservation_ids": [second, third, first, 999]})
+    assert response.json() == {"cancelled": sorted([second, third]), "skipped": sorted([first, 999])}
+
+    # Purging deletes the row; the database cascades to its participants
+    assert client.delete(f"/reservations/{fourth}", params={"purge": True}).status_code == 200
+    assert client.delete(f"/reservations/{fourth}", params={"purge": True}).status_code == 404
+    history = client.get(f"/reservations/{alice_id}", params={"include_cancelled": True}).json()
+    assert fourth not in {r["id"] for r in history}
+    db = session_factory()
+    try:
+        assert db.query(ReservationParticipant).filter_by(reservation_id=fourth).count() == 0
+        assert db.query(ReservationParticipant).filter_by(reservation_id=first).count() == 2
+    finally:
+        db.close()
+
+
+def test_list_upcoming_and_past_plans(client, session_factory):
+    """Test the upcoming/past slices and limit of a user's listing, and the index rebuild."""
+    from app.models import UserReservation
+    from app.services.plans import rebuild
+
+    alice_id = client.post("/users", json={"name": "Alice"}).json()["id"]
+    bob_id = client.post("/users", json={"name": "Bob"}).json()["id"]
+    carol_id = client.post("/users", json={"name": "Carol"}).json()["id"]
+    venue_id = client.post(
+        "/venues",
+        json={"name": "Bar", "category": "bar", "address": "1 Main St", "latitude": 0.0, "longitude": 0.0},
+    ).json()["id"]
+
+    def reserve(hours, user_ids):
+        return client.post(
+            "/reservations",
+            json={
+                "venue_id": venue_id,
+                "time": (datetime.utcnow() + timedelta(hours=hours)).isoformat(),
+                "participant_user_ids": user_ids,
+            },
+        ).json()["id"]
+
+    old = reserve(-48, [alice_id, bob_id])
+    recent = reserve(-24, [bob_id, alice_id])
+    soon = reserve(4, [alice_id])
+    later = reserve(2, [carol_id])
+    latest = reserve(6, [bob_id, alice_id])
+    client.delete(f"/reservations/{soon}")
+
+    def listed(**params):
+        response = client.get(f"/reservations/{alice_id}", params=params)
+        assert response.status_code == 200
+        return [r["id"] for r in response.json()]
+
+    assert listed() == [old, recent, latest]
+    assert listed(when="upcoming") == [latest]
+    assert listed(when="upcoming", include_cancelled=True) == [soon, latest]
+    assert listed(when="past") == [recent, old]
+    assert listed(when="past", limit=1) == [recent]
+    assert later not in listed(include_cancelled=True)
+    assert client.get(f"/reservations/{alice_id}", params={"when": "soon"}).status_code == 422
+    assert client.get(f"/reservations/{alice_id}", params={"limit": 0}).status_code == 422
+
+    db = session_factory()
+    try:
+        def index_rows():
+            return sorted(
+                (row.user_id, row.reservation_id, row.cancelled) for row in db.query(UserReservation)
+            )
+
+        maintained = index_rows()
+        assert rebuild(db) == len(maintained)
+        assert index_rows() == maintained
+    finally:
+        db.close()
+
+
+def test_get_user_profile_page(client):
+    """Test the profile page endpoint returns user, friends and interests together."""
+    user_id = client.post("/users", json={"name": "Alice"}).json()["id"]
+    venue_response = client.post(
+        "/venues",
+        json={
+            "name": "Coffee Shop",
+            "category": "cafe",
+            "address": "123 Main St",
+            "latitude": 40.7589,
+            "longitude": -73.9851,
+        },
+    )
+    venue_id = venue_response.json()["id"]
+    client.post(
+        f"/users/{user_id}/interests",
+        json={"venue_id": venue_id, "status": "INTERESTED"},
+    )
+
+    response = client.get(f"/users/{user_id}/profile")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["user"]["name"] == "Alice"
+    assert data["friends"] == []
+    assert len(data["interests"]) == 1
+    assert data["interests"][0]["venue_id"] == venue_id
+
+    assert client.get("/users/999/profile").status_code == 404
+
+
+def test_get_user_home_page(client):
+    """Test the home page endpoint returns recommendations and pending reservations."""
+    user_id = client.post("/users", json={"name": "Alice"}).json()["id"]
+    venue_ids = []
+    for i in range(3):
+        venue_response = client.post(
+            "/venues",
+            json={
+                "name": f"Venue {i}",
+                "category": "cafe",
+                "address": "123 Main St",
+                "latitude": 40.7589,
+                "longitude": -73.9851,
+            },
+        )
+        venue_ids.append(venue_response.json()["id"])
+
+    reservation_time = (datetime.utcnow() + timedelta(hours=2)).isoformat()
+    client.post(
+        "/reservations",
+        json={
+            "venue_id": venue_ids[0],
+            "time": reservation_time,
+            "participant_user_ids": [user_id],
+        },
+    )
+
+    response = client.get(f"/users/{user_id}/home?limit=2")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["user"]["id"] == user_id
+    assert len(data["recommended_venues"]) == 2
+    assert len(data["pending_reservations"]) == 1
+    assert data["pending_reservations"][0]["status"] == "PENDING"
+
+    # Without a limit the page lists every recommendation, like /recommendations
+    assert len(client.get(f"/users/{user_id}/home").json()["recommended_venues"]) == 3
+
+
+def test_metrics_endpoint(client):
+    """Test that metrics are exposed per route template, not per raw path."""
+    user_id = client.post("/users", json={"name": "Alice"}).json()["id"]
+    client.get(f"/users/{user_id}")
+    client.get("/users/999")
+    client.get(f"/recommendations/{user_id}")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/users/{user_id}",status="200"}' in body
+    assert 'http_requests_total{method="GET",route="/users/{user_id}",status="404"}' in body
+    assert f'route="/users/{user_id}"' not in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/recommendations/{user_id}",le="+Inf"}' in body
+    assert "http_requests_in_flight" in body
+    assert "db_queries_total" in body
+    assert "recommendation_requests_total" in body
+
+
+def test_interest_update_reflected_in_friend_scores(client, session_factory):
+    """Test that interest writes update the aggregates used for scoring without a rebuild."""
+    alice_id = client.post("/users", json={"name": "Alice"}).json()["id"]
+    bob_id = client.post("/users", json={"name": "Bob"}).json()["id"]
+    venue_id = client.post(
+        "/venues",
+        json={
+            "name": "Coffee Shop",
+            "category": "cafe",
+            "address": "123 Main St",
+            "latitude": 40.7589,
+            "longitude": -73.9851,
+        },
+    ).json()["id"]
+
+    db = session_factory()
+    db.add(Friendship(user_id=alice_id, friend_id=bob_id, strength=2.0))
+    db.commit()
+    db.close()
+
+    before = client.get(f"/recommendations/{alice_id}").json()["recommended_venues"][0]["score"]
+    client.post(f"/users/{bob_id}/interests", json={"venue_id": venue_id, "status": "INTERESTED"})
+    after = client.get(f"/recommendations/{alice_id}").json()["recommended_venues"][0]["score"]
+    assert after == before + 5.0
+
+    client.post(f"/users/{bob_id}/interests", json={"venue_id": venue_id, "status": "NOT_INTERESTED"})
+    reverted = client.get(f"/recommendations/{alice_id}").json()["recommended_venues"][0]["score"]
+    assert reverted == before
+
+
+def test_create_friendship_updates_friend_list(client):
+    """Test adding and updating a friendship through the API."""
+    alice_id = client.post("/users", json={"name": "Alice"}).json()["id"]
+    bob_id = client.post("/users", json={"name": "Bob"}).json()["id"]
+
+    # Load the graph before the write so the in-memory update path is exercised
+    assert client.get(f"/users/{alice_id}/friends").json() == []
+
+    response = client.post(f"/users/{alice_id}/friends", json={"friend_id": bob_id, "strength": 3.0})
+    assert response.status_code == 201
+    assert response.json()["friend"]["name"] == "Bob"
+
+    client.post(f"/users/{alice_id}/friends", json={"friend_id": bob_id, "strength": 4.7})
+    friends = client.get(f"/users/{alice_id}/friends").json()
+    assert len(friends) == 1
+    assert friends[0]["friend_id"] == bob_id
+    assert friends[0]["strength"] == 4.7
+
+    assert client.post(f"/users/{alice_id}/friends", json={"friend_id": 999}).status_code == 404
+    assert client.post(f"/users/{alice_id}/friends", json={"friend_id": alice_id}).status_code == 422
+
+
+def test_recommendations_with_people_suggestions(client):
+    """Test the friends-of-friends option on the recommendations endpoint."""
+    alice_id = client.post("/users", json={"name": "Alice"}).json()["id"]
+    bob_id = client.post("/users", json={"name": "Bob"}).json()["id"]
+    charlie_id = client.post("/users", json={"name": "Charlie"}).json()["id"]
+    client.post(f"/users/{alice_id}/friends", json={"friend_id": bob_id})
+    client.post(f"/users/{bob_id}/friends", json={"friend_id": charlie_id})
+
+    response = client.get(f"/recommendations/{alice_id}")
+    assert response.json()["suggested_people"] == []
+
+    response = client.get(f"/recommendations/{alice_id}?include_people_suggestions=true")
+    assert response.status_code == 200
+    suggested = response.json()["suggested_people"]
+    assert [p["user"]["name"] for p in suggested] == ["Charlie"]
+    assert suggested[0]["mutual_friends"] == 1
+
+
+def test_recommendations_served_from_precomputed_batch(client, session_factory):
+    """Test that a batch run is served until an interest write marks the row stale."""
+    from app.services import precompute
+
+    alice_id = client.post("/users", json={"name": "Alice"}).json()["id"]
+    bob_id = client.post("/users", json={"name": "Bob"}).json()["id"]
+    venue_id = client.post(
+        "/venues",
+        json={
+            "name": "Coffee Shop",
+            "category": "cafe",
+            "address": "123 Main St",
+            "latitude": 40.7589,
+            "longitude": -73.9851,
+        },
+    ).json()["id"]
+    client.post(f"/users/{alice_id}/friends", json={"friend_id": bob_id, "strength": 2.0})
+
+    db = session_factory()
+    precompute.run(db)
+    db.close()
+
+    batch = client.get(f"/recommendations/{alice_id}").json()
+    assert batch["recommended_venues"][0]["venue"]["id"] == venue_id
+    assert 'cache="precomputed"' in client.get("/metrics").text
+
+    # Bob's interest feeds Alice's score, so her precomputed row must not be served
+    client.post(f"/users/{bob_id}/interests", json={"venue_id": venue_id, "status": "INTERESTED"})
+    after = client.get(f"/recommendations/{alice_id}").json()
+    assert after["recommended_venues"][0]["score"] == batch["recommended_venues"][0]["score"] + 5.0
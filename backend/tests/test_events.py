@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app.services.events import RESYNC, EventBus, LocalBroker, PostgresBroker, event_bus
+
+
+def make_pair(client):
+    alice_id = client.post("/users", json={"name": "Alice"}).json()["id"]
+    bob_id = client.post("/users", json={"name": "Bob"}).json()["id"]
+    venue_id = client.post(
+        "/venues",
+        json={"name": "Cafe", "category": "cafe", "address": "1 Main St", "latitude": 0.0, "longitude": 0.0},
+    ).json()["id"]
+    return alice_id, bob_id, venue_id
+
+
+def test_events_fan_out_across_workers():
+    """Test that buses sharing a broker (one per worker) each deliver to their own subscribers."""
+    broker = LocalBroker()
+    worker_a, worker_b = EventBus(broker), EventBus(broker)
+
+    async def main():
+        alice_a = worker_a.subscribe(1)
+        alice_b = worker_b.subscribe(1)
+        bob_b = worker_b.subscribe(2)
+
+        # Published from a request thread on worker A
+        await asyncio.to_thread(worker_a.publish, [1], "interest.updated", {"venue_id": 7})
+
+        received = [await asyncio.wait_for(s.get(), 1) for s in (alice_a, alice_b)]
+        assert received == [{"type": "interest.updated", "data": {"venue_id": 7}}] * 2
+        assert bob_b._queue.empty()
+
+        worker_b.unsubscribe(bob_b)
+        assert worker_b.subscriber_count() == 1
+        worker_b.close()
+        assert await asyncio.wait_for(alice_b.get(), 1) is None
+
+    asyncio.run(main())
+
+
+def test_slow_subscriber_is_told_to_resync():
+    """Test that a subscriber whose queue overflows gets one resync instead of a gap."""
+    bus = EventBus(LocalBroker(), max_queued=2)
+
+    async def main():
+        subscription = bus.subscribe(1)
+        for venue_id in range(5):
+            bus.publish([1], "interest.updated", {"venue_id": venue_id})
+        await asyncio.sleep(0)
+
+        assert await subscription.get() == RESYNC
+        bus.publish([1], "interest.updated", {"venue_id": 5})
+        assert (await asyncio.wait_for(subscription.get(), 1))["data"] == {"venue_id": 5}
+
+    asyncio.run(main())
+
+
+def test_write_endpoints_publish_to_participants(client):
+    """Test that creating, accepting and cancelling a reservation notify its participants."""
+    alice_id, bob_id, venue_id = make_pair(client)
+
+    async def main():
+        subscription = event_bus.subscribe(bob_id)
+        try:
+            response = await asyncio.to_thread(
+                client.post,
+                "/reservations",
+                json={
+                    "venue_id": venue_id,
+                    "time": (datetime.utcnow() + timedelta(hours=2)).isoformat(),
+                    "participant_user_ids": [alice_id, bob_id],
+                },
+            )
+            reservation_id = response.json()["id"]
+            for user_id in (alice_id, bob_id):
+                await asyncio.to_thread(
+                    client.post,
+                    "/reservations/accept",
+                    json={"reservation_id": reservation_id, "user_id": user_id},
+                )
+            await asyncio.to_thread(client.delete, f"/reservations/{reservation_id}")
+
+            return [await asyncio.wait_for(subscription.get(), 1) for _ in range(4)]
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    created, alice_accepted, bob_accepted, cancelled = asyncio.run(main())
+    assert created["type"] == "reservation.created"
+    assert created["data"]["status"] == "PENDING"
+    assert alice_accepted["type"] == "reservation.updated"
+    assert alice_accepted["data"]["user_id"] == alice_id
+    assert alice_accepted["data"]["status"] == "PENDING"
+    assert bob_accepted["data"]["status"] == "CONFIRMED"
+    assert cancelled == {"type": "reservation.cancelled", "data": {"reservation_id": created["data"]["reservation_id"]}}
+
+
+def test_event_stream_endpoint(client):
+    """Test the SSE endpoint streams a friend's interest change and ends when the bus closes."""
+    alice_id, bob_id, venue_id = make_pair(client)
+    client.post(f"/users/{bob_id}/friends", json={"friend_id": alice_id, "strength": 0.5})
+    assert client.get("/events/999").status_code == 404
+
+    result = {}
+    stream = threading.Thread(target=lambda: result.update(response=client.get(f"/events/{bob_id}")))
+    stream.start()
+    deadline = time.monotonic() + 5
+    while event_bus.subscriber_count() == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    client.post(f"/users/{alice_id}/interests", json={"venue_id": venue_id, "status": "INTERESTED"})
+    event_bus.close()
+    stream.join(5)
+
+    response = result["response"]
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "event: interest.updated\n" in response.text
+    assert f'"user_id": {alice_id}, "venue_id": {venue_id}, "status": "INTERESTED"' in response.text
+    assert event_bus.subscriber_count() == 0
+
+
+def test_postgres_broker_publishes_off_the_caller(monkeypatch):
+    """Test that publishing only queues, and that queued events go out in order, in batches, before close."""
+    sending, release = threading.Event(), threading.Event()
+    sent = []
+
+    class Connection:
+        closed = False
+
+        def execute(self, query, params):
+            sending.set()
+            release.wait(5)
+            sent.append(list(params[1]))
+
+        def close(self):
+            self.closed = True
+
+    monkeypatch.setattr("psycopg.connect", lambda *args, **kwargs: Connection())
+    broker = PostgresBroker("postgresql+psycopg://luna@db/luna")
+
+    # The first NOTIFY is stuck on the database; publishers do not wait for it
+    broker.publish("event 0")
+    assert sending.wait(5)
+    start = time.monotonic()
+    for i in range(1, 5):
+        broker.publish(f"event {i}")
+    assert time.monotonic() - start < 1
+    assert sent == []
+
+    release.set()
+    broker.close()
+    assert sent[0] == ["event 0"]
+    assert sent[1] == ["event 1", "event 2", "event 3", "event 4"]
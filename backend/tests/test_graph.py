@@ -0,0 +1,85 @@
+import pytest
+from app.models import User, Friendship
+from app.services import graph as graph_module
+from app.services.graph import SocialGraph
+
+
+@pytest.fixture
+def db(db):
+    """Create a fresh database with a small friendship graph."""
+    db.add_all([User(id=i, name=f"User {i}") for i in range(1, 6)])
+    db.flush()
+    db.add_all(
+        [
+            Friendship(user_id=1, friend_id=3, strength=4.0),
+            Friendship(user_id=1, friend_id=2, strength=5.0),
+            Friendship(user_id=1, friend_id=4, strength=1.5),
+            Friendship(user_id=2, friend_id=3, strength=2.0),
+            Friendship(user_id=2, friend_id=4, strength=3.0),
+        ]
+    )
+    db.commit()
+    return db
+
+
+def test_load_builds_sorted_adjacency(db):
+    """Test friend lists, weighted degree and mutual friend counts from the CSR arrays."""
+    graph = SocialGraph()
+    graph.load(db)
+
+    assert graph.friends(1) == [(2, 5.0), (3, 4.0), (4, 1.5)]
+    assert list(graph.friend_ids(2)) == [3, 4]
+    assert graph.friends(5) == []
+    assert graph.weighted_degree(1) == 10.5
+    assert graph.mutual_friend_count(1, 2) == 2
+    assert graph.mutual_friend_count(1, 5) == 0
+
+
+def test_upsert_matches_reload_after_compaction(db, monkeypatch):
+    """Test that overlay writes and compaction give the same graph as a reload."""
+    monkeypatch.setattr(graph_module, "COMPACT_THRESHOLD", 1)
+    graph = SocialGraph()
+    graph.load(db)
+
+    graph.upsert(5, 1, 2.5, 100)
+    assert graph.friends(5) == [(1, 2.5)]
+    graph.upsert(1, 3, 0.5, 2)
+    graph.upsert(2, 1, 1.0, 101)  # triggers compaction
+
+    assert graph.friends(1) == [(2, 5.0), (3, 0.5), (4, 1.5)]
+    assert graph.friends(2) == [(1, 1.0), (3, 2.0), (4, 3.0)]
+    assert graph.friendships(5) == [(100, 1, 2.5)]
+    assert graph.user_ids() == [1, 2, 5]
+
+
+def test_reload_keeps_upserts_made_while_loading(db, monkeypatch):
+    """Test that a reload picks up rows written elsewhere and keeps upserts applied while it reads."""
+    graph = SocialGraph()
+    graph.load(db)
+
+    # Written by another worker after this one loaded
+    db.add(Friendship(user_id=3, friend_id=5, strength=2.5))
+    db.commit()
+    assert graph.friends(3) == []
+
+    real_query = db.query
+
+    class UpsertAfterRead:
+        # Stands in for a friendship request on this worker that commits after the reload's SELECT ran
+        def __init__(self, query):
+            self._query = query
+
+        def order_by(self, *clauses):
+            return UpsertAfterRead(self._query.order_by(*clauses))
+
+        def all(self):
+            rows = self._query.all()
+            graph.upsert(4, 5, 3.5, 99)
+            return rows
+
+    monkeypatch.setattr(db, "query", lambda *entities: UpsertAfterRead(real_query(*entities)))
+    graph.load(db)
+
+    assert graph.friends(3) == [(5, 2.5)]
+    assert graph.friends(4) == [(5, 3.5)]
+    assert graph._pending == []
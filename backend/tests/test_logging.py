@@ -0,0 +1,39 @@
+import json
+import logging
+import queue
+
+from app.logging_config import AccessLogSampler, JSONFormatter, NonBlockingQueueHandler
+
+
+def test_sampler_longest_prefix_wins():
+    """Test that the most specific configured prefix decides the sample rate."""
+    sampler = AccessLogSampler.from_setting("/health=0, /recommendations=0.25,/recommendations/1=1")
+
+    assert sampler.rate_for("/health") == 0.0
+    assert sampler.rate_for("/recommendations/2") == 0.25
+    assert sampler.rate_for("/recommendations/1") == 1.0
+    assert sampler.rate_for("/users") == 1.0
+    assert not sampler.should_log("/health")
+    assert sampler.should_log("/users")
+
+
+def test_queue_handler_defers_json_encoding():
+    """Test that queued records carry the interpolated message and format to JSON later."""
+    log_queue = queue.Queue(maxsize=1)
+    handler = NonBlockingQueueHandler(log_queue)
+    logger = logging.getLogger("test_queue_handler")
+    logger.propagate = False
+    logger.addHandler(handler)
+
+    logger.info("Created user %s", 42, extra={"user_id": 42, "duration_ms": 1.5})
+    # Queue is full: the second record is dropped rather than blocking
+    logger.info("Dropped")
+
+    record = log_queue.get_nowait()
+    assert record.args is None
+    assert handler.dropped == 1
+
+    data = json.loads(JSONFormatter().format(record))
+    assert data["message"] == "Created user 42"
+    assert data["user_id"] == 42
+    assert data["duration_ms"] == 1.5
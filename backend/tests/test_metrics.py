@@ -0,0 +1,37 @@
+import threading
+
+from app.metrics import Registry
+
+
+def test_counter_sums_per_thread_cells():
+    """Test that increments from many threads are all counted."""
+    registry = Registry()
+    counter = registry.counter("jobs_total", "Jobs.", ("kind",))
+
+    def work():
+        for _ in range(1000):
+            counter.labels("a").inc()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert counter.labels("a").value() == 8000
+    assert 'jobs_total{kind="a"} 8000' in registry.render()
+
+
+def test_histogram_renders_cumulative_buckets():
+    """Test histogram exposition format."""
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value)
+
+    body = registry.render()
+    assert 'latency_seconds_bucket{le="0.1"} 1' in body
+    assert 'latency_seconds_bucket{le="1"} 2' in body
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in body
+    assert "latency_seconds_sum 5.55" in body
+    assert "latency_seconds_count 3" in body
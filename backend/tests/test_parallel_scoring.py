@@ -0,0 +1,133 @@
+from multiprocessing import shared_memory
+
+import pytest
+from app.config import settings
+from app.models import User, Venue, UserInterest, Friendship, InterestStatus
+from app.services.catalogue import venue_catalogue
+from app.services.recommendation import get_recommendations_for_user, shutdown_scoring_pool
+
+
+@pytest.fixture(scope="module", autouse=True)
+def scoring_pool():
+    yield
+    shutdown_scoring_pool()
+
+
+@pytest.fixture
+def db(db):
+    """A grid of 60 venues, some sharing coordinates so scores tie, with friends' interests sprinkled in."""
+    db.add_all([User(id=i, name=f"User {i}") for i in range(1, 5)])
+    db.add_all(
+        [
+            Venue(
+                id=i,
+                name=f"Venue {i}",
+                category="cafe",
+                address="x",
+                latitude=40.0 + (i % 12) * 0.01,
+                longitude=-74.0 + (i // 12) * 0.01,
+            )
+            for i in range(1, 61)
+        ]
+    )
+    db.flush()
+    db.add_all(
+        [
+            Friendship(user_id=1, friend_id=2, strength=4.0),
+            Friendship(user_id=1, friend_id=3, strength=1.5),
+            Friendship(user_id=1, friend_id=4, strength=2.5),
+        ]
+    )
+    db.add_all(
+        [
+            UserInterest(user_id=1, venue_id=7, status=InterestStatus.INTERESTED),
+            UserInterest(user_id=2, venue_id=7, status=InterestStatus.CONFIRMED),
+            UserInterest(user_id=2, venue_id=33, status=InterestStatus.INTERESTED),
+            UserInterest(user_id=3, venue_id=33, status=InterestStatus.INTERESTED),
+            UserInterest(user_id=4, venue_id=50, status=InterestStatus.NOT_INTERESTED),
+        ]
+    )
+    db.commit()
+    return db
+
+
+def summarize(recommendations):
+    return [
+        (
+            r["venue"].id,
+            r["score"],
+            [(p["user"].id, p["compatibility_score"]) for p in r["recommended_people"]],
+        )
+        for r in recommendations
+    ]
+
+
+@pytest.mark.parametrize("location", [None, (40.05, -73.98)])
+@pytest.mark.parametrize("limit", [None, 10])
+def test_parallel_ranking_matches_sequential(db, monkeypatch, location, limit):
+    """Test that sharded process-pool scoring returns exactly the single-process ranking."""
+    sequential = summarize(get_recommendations_for_user(db, 1, location, limit=limit))
+
+    monkeypatch.setattr(settings, "RECOMMENDATION_WORKERS", 2)
+    monkeypatch.setattr(settings, "RECOMMENDATION_PARALLEL_THRESHOLD", 50)
+    parallel = summarize(get_recommendations_for_user(db, 1, location, limit=limit))
+
+    assert len(venue_catalogue) == 60
+    assert parallel == sequential
+
+
+def test_below_threshold_stays_single_process(db, monkeypatch):
+    """Test that small catalogues never reach the pool."""
+    monkeypatch.setattr(settings, "RECOMMENDATION_WORKERS", 2)
+    monkeypatch.setattr(settings, "RECOMMENDATION_PARALLEL_THRESHOLD", 61)
+    monkeypatch.setattr(
+        "app.services.recommendation._scoring_pool",
+        lambda: pytest.fail("pool used below threshold"),
+    )
+
+    assert len(get_recommendations_for_user(db, 1, limit=5)) == 5
+
+
+def test_catalogue_reload_after_new_venue(db, monkeypatch):
+    """Test that an invalidated catalogue is republished and workers pick up the new block."""
+    monkeypatch.setattr(settings, "RECOMMENDATION_WORKERS", 2)
+    monkeypatch.setattr(settings, "RECOMMENDATION_PARALLEL_THRESHOLD", 50)
+    get_recommendations_for_user(db, 1, limit=1)
+    first_name = venue_catalogue.handle().name
+
+    db.add(Venue(id=61, name="Next door", category="bar", address="y", latitude=40.5, longitude=-73.5))
+    db.commit()
+    venue_catalogue.invalidate()
+
+    top = get_recommendations_for_user(db, 1, (40.5, -73.5), limit=1)
+    assert venue_catalogue.handle().name != first_name
+    assert top[0]["venue"].id == 61
+
+
+def test_catalogue_picks_up_venues_from_other_workers(db, monkeypatch):
+    """Test that a venue inserted without this process invalidating the catalogue still reaches the pool."""
+    monkeypatch.setattr(settings, "RECOMMENDATION_WORKERS", 2)
+    monkeypatch.setattr(settings, "RECOMMENDATION_PARALLEL_THRESHOLD", 50)
+    get_recommendations_for_user(db, 1, limit=1)
+
+    # As if created through another worker: no invalidate here
+    db.add(Venue(id=61, name="Next door", category="bar", address="y", latitude=40.5, longitude=-73.5))
+    db.commit()
+
+    top = get_recommendations_for_user(db, 1, (40.5, -73.5), limit=1)
+    assert len(venue_catalogue) == 61
+    assert top[0]["venue"].id == 61
+
+
+def test_held_block_survives_reloads(db):
+    """Test that a block held by an in-flight scoring call stays attachable across several reloads."""
+    venue_catalogue.load(db)
+    with venue_catalogue.acquire() as handle:
+        venue_catalogue.load(db)
+        venue_catalogue.load(db)
+        attached = shared_memory.SharedMemory(name=handle.name)
+        attached.close()
+
+    # Released with no reload pending: unlinked
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=handle.name)
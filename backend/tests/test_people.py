@@ -0,0 +1,90 @@
+import pytest
+from app.models import User, Venue, UserInterest, Friendship, InterestStatus
+from app.services.aggregates import interest_index
+from app.services.graph import social_graph
+from app.services.people import PeopleSuggestionStore
+
+
+@pytest.fixture
+def db(db):
+    """Alice -> Bob, Charlie; Bob -> Diana, Ethan; Charlie -> Diana."""
+    db.add_all([User(id=i, name=name) for i, name in enumerate(["Alice", "Bob", "Charlie", "Diana", "Ethan"], 1)])
+    db.add(Venue(id=1, name="Cafe", category="cafe", address="x", latitude=0.0, longitude=0.0))
+    db.flush()
+    db.add_all(
+        [
+            Friendship(user_id=1, friend_id=2, strength=5.0),
+            Friendship(user_id=1, friend_id=3, strength=2.0),
+            Friendship(user_id=2, friend_id=4, strength=1.0),
+            Friendship(user_id=2, friend_id=5, strength=1.0),
+            Friendship(user_id=3, friend_id=4, strength=1.0),
+        ]
+    )
+    db.add_all(
+        [
+            UserInterest(user_id=1, venue_id=1, status=InterestStatus.INTERESTED),
+            UserInterest(user_id=5, venue_id=1, status=InterestStatus.CONFIRMED),
+        ]
+    )
+    db.commit()
+    return db
+
+
+def test_friends_of_friends_ranked_by_paths_and_interests(db):
+    """Test candidates exclude direct friends and are scored by mutual friends and shared interests."""
+    store = PeopleSuggestionStore()
+    suggestions = store.suggestions_for(db, 1)
+
+    assert [s.user_id for s in suggestions] == [4, 5]
+    diana, ethan = suggestions
+    assert diana.mutual_friends == 2
+    assert diana.shared_interests == 0
+    assert ethan.mutual_friends == 1
+    assert ethan.shared_interests == 1
+    assert store.suggestions_for(db, 1, limit=1) == [diana]
+
+
+def test_incremental_refresh_matches_full_recompute(db):
+    """Test that dirty rows are recomputed after friendship and interest writes."""
+    store = PeopleSuggestionStore()
+    store.compute_all(db)
+
+    # Diana befriends Ethan; Alice's two-hop paths via Bob/Charlie are unchanged,
+    # but Charlie now reaches Ethan through Diana
+    db.add(Friendship(id=100, user_id=4, friend_id=5, strength=3.0))
+    db.add(UserInterest(user_id=4, venue_id=1, status=InterestStatus.INTERESTED))
+    db.commit()
+    social_graph.upsert(4, 5, 3.0, 100)
+    store.mark_friendship_changed(4, 5)
+    interest_index.apply(4, 1, InterestStatus.INTERESTED)
+    store.mark_interest_changed(4)
+
+    fresh = PeopleSuggestionStore()
+    fresh.compute_all(db)
+    for user_id in range(1, 6):
+        assert store.suggestions_for(db, user_id) == fresh.suggestions_for(db, user_id)
+    assert [s.user_id for s in store.suggestions_for(db, 3)] == [5]
+    assert store.suggestions_for(db, 1)[0].shared_interests == 1
+
+
+def test_reloads_mark_every_row_stale(db):
+    """Test that rows are recomputed after the indexes reload other workers' writes, until the next batch."""
+    store = PeopleSuggestionStore()
+    assert store.suggestions_for(db, 1)[1].shared_interests == 1
+    # A request never runs the whole batch
+    assert not store.computed
+
+    store.compute_all(db)
+    assert not store.outdated()
+
+    # Written by another worker; this one only sees it once its indexes reload
+    db.add(UserInterest(user_id=4, venue_id=1, status=InterestStatus.INTERESTED))
+    db.commit()
+    assert store.suggestions_for(db, 1)[0].shared_interests == 0
+    interest_index.rebuild(db)
+
+    assert store.outdated()
+    assert store.suggestions_for(db, 1)[0].shared_interests == 1
+    store.compute_all(db)
+    assert not store.outdated()
+    assert store.suggestions_for(db, 1)[0].shared_interests == 1
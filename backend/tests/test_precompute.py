@@ -0,0 +1,104 @@
+import pytest
+from app.models import (
+    User,
+    Venue,
+    UserInterest,
+    Friendship,
+    InterestStatus,
+    PrecomputedRecommendation,
+)
+from app.schemas import RecommendedVenue
+from app.services import precompute
+from app.services.recommendation import get_recommendations_for_user
+
+
+@pytest.fixture
+def db(db):
+    """Alice -> Bob, Charlie; Bob -> Alice; two venues with mixed interests."""
+    db.add_all([User(id=i, name=name) for i, name in enumerate(["Alice", "Bob", "Charlie"], 1)])
+    db.add_all(
+        [
+            Venue(id=1, name="Cafe", category="cafe", address="x", latitude=0.0, longitude=0.0),
+            Venue(id=2, name="Bar", category="bar", address="y", latitude=1.0, longitude=1.0),
+        ]
+    )
+    db.flush()
+    db.add_all(
+        [
+            Friendship(user_id=1, friend_id=2, strength=5.0),
+            Friendship(user_id=1, friend_id=3, strength=2.0),
+            Friendship(user_id=2, friend_id=1, strength=5.0),
+        ]
+    )
+    db.add_all(
+        [
+            UserInterest(user_id=2, venue_id=1, status=InterestStatus.CONFIRMED),
+            UserInterest(user_id=3, venue_id=2, status=InterestStatus.INTERESTED),
+        ]
+    )
+    db.commit()
+    return db
+
+
+def live_payload(db, user_id):
+    recommendations = get_recommendations_for_user(db, user_id, None)
+    return [RecommendedVenue.model_validate(r).model_dump(mode="json") for r in recommendations]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch_matches_live_scoring(db, workers):
+    """Test that stored payloads equal what the live endpoint would compute."""
+    assert precompute.run(db, workers=workers, chunk_size=2) == 3
+
+    for user_id in (1, 2, 3):
+        assert precompute.get_precomputed(db, user_id) == live_payload(db, user_id)
+    assert len(precompute.get_precomputed(db, 1, limit=1)) == 1
+
+
+def test_mark_stale_reaches_followers(db):
+    """Test that an interest change invalidates the user and everyone who counts them as a friend."""
+    precompute.run(db)
+
+    precompute.mark_stale(db, [2], include_followers=True)
+    db.commit()
+
+    assert precompute.get_precomputed(db, 2) is None
+    assert precompute.get_precomputed(db, 1) is None
+    assert precompute.get_precomputed(db, 3) is not None
+
+
+def test_invalidation_during_run_survives_batch(db, monkeypatch):
+    """Test that a write landing mid-run leaves the row stale rather than overwritten."""
+    store = precompute._store
+
+    def store_then_invalidate(session, payloads, computed_at, versions):
+        store(session, payloads, computed_at, versions)
+        if 1 in payloads:
+            precompute.mark_stale(session, [1])
+            session.commit()
+
+    monkeypatch.setattr(precompute, "_store", store_then_invalidate)
+    precompute.run(db, chunk_size=1)
+
+    assert precompute.get_precomputed(db, 1) is None
+    assert precompute.get_precomputed(db, 2) is not None
+    row = db.query(PrecomputedRecommendation).filter_by(user_id=1).one()
+    assert row.stale and row.version == 1
+
+
+def test_write_committed_after_snapshot_is_not_overwritten(db, monkeypatch):
+    """Test that a write the snapshot missed keeps its row stale, whatever time it was stamped with."""
+    load = precompute.Snapshot.load
+
+    def load_then_write(session):
+        snapshot = load(session)
+        # Committed after the snapshot was read, as by a writer that started before the batch
+        precompute.mark_stale(session, [2])
+        session.commit()
+        return snapshot
+
+    monkeypatch.setattr(precompute.Snapshot, "load", load_then_write)
+    precompute.run(db)
+
+    assert precompute.get_precomputed(db, 2) is None
+    assert precompute.get_precomputed(db, 1) is not None
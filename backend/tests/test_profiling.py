@@ -0,0 +1,80 @@
+import json
+import threading
+import time
+
+from sqlalchemy import text
+
+from app import profiling
+
+
+def busy_work(seconds):
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(100))
+    return total
+
+
+def other_request_work(seconds):
+    return busy_work(seconds)
+
+
+def test_request_profile_writes_collapsed_stacks_and_db_breakdown(engine, tmp_path):
+    """Test that a profiled block produces flamegraph stacks of its own thread and per-statement DB timings."""
+    profiling.install_db_timing()
+
+    # A concurrent request on another thread must stay out of the profile
+    other = threading.Thread(target=other_request_work, args=(0.1,))
+    other.start()
+
+    profile = profiling.RequestProfile(interval=0.001)
+    token = profiling.activate(profile)
+    profiling.track_thread()
+    profile.start()
+    try:
+        busy_work(0.05)
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 1"))
+    finally:
+        profile.stop()
+        profiling.deactivate(token)
+    other.join()
+
+    collapsed_path = profile.write(str(tmp_path), {"method": "GET", "path": "/test"})
+
+    lines = open(collapsed_path).read().splitlines()
+    assert lines
+    assert any("busy_work (test_profiling.py" in line for line in lines)
+    assert not any("other_request_work" in line for line in lines)
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+
+    summary = json.load(open(tmp_path / f"{profile.id}.db.json"))
+    assert summary["path"] == "/test"
+    assert summary["db_query_count"] == 2
+    assert summary["statements"][0]["statement"] == "SELECT 1"
+    assert summary["statements"][0]["count"] == 2
+
+
+def test_profiling_requested_flags():
+    """Test header and query flag parsing."""
+    assert profiling.profiling_requested({"x-profile": "1"}, {})
+    assert profiling.profiling_requested({}, {"profile": "true"})
+    assert not profiling.profiling_requested({}, {})
+    assert not profiling.profiling_requested({"x-profile": "0"}, {})
+
+
+def test_write_keeps_only_the_newest_profiles(tmp_path):
+    """Test that writing a profile prunes the oldest ones past the cap."""
+    written = []
+    for _ in range(4):
+        profile = profiling.RequestProfile(interval=0.001)
+        profile.write(str(tmp_path), {"method": "GET", "path": "/test"}, keep=2)
+        written.append(profile.id)
+        time.sleep(0.01)
+
+    kept = sorted(p.name for p in tmp_path.iterdir())
+    assert kept == sorted(
+        name for profile_id in written[-2:] for name in (f"{profile_id}.collapsed.txt", f"{profile_id}.db.json")
+    )
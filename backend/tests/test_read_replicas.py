@@ -0,0 +1,113 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db import Base, LAST_WRITE_HEADER, ReplicaSet, primary_pins
+from app.models import User, Venue
+
+# SQLite files stand in for a primary and two replicas that have drifted apart,
+# so the venue name tells which database served a request
+
+
+def seed(db, venue_name):
+    db.add(User(id=1, name="Alice"))
+    db.add(Venue(id=1, name=venue_name, category="cafe", address="x", latitude=0.0, longitude=0.0))
+    db.commit()
+    db.close()
+
+
+def make_database(path, venue_name):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    seed(sessionmaker(bind=engine)(), venue_name)
+    engine.dispose()
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'primary.db'}"
+
+
+@pytest.fixture
+def databases(tmp_path, session_factory, monkeypatch):
+    seed(session_factory(), "primary")
+    make_database(tmp_path / "replica_a.db", "replica_a")
+    make_database(tmp_path / "replica_b.db", "replica_b")
+
+    def use_replicas(*names):
+        urls = [f"sqlite:///{tmp_path / name}" for name in names]
+        replicas = ReplicaSet(urls, check_interval=60)
+        replicas.check_all()
+        monkeypatch.setattr("app.db.read_replicas", replicas)
+        return replicas
+
+    return use_replicas
+
+
+def venue_name(client, **headers):
+    return client.get("/venues/1", headers=headers).json()["name"]
+
+
+def test_reads_round_robin_across_replicas(databases, client):
+    """Test that GET endpoints alternate between healthy replicas."""
+    databases("replica_a.db", "replica_b.db")
+
+    assert [venue_name(client) for _ in range(4)] == ["replica_a", "replica_b", "replica_a", "replica_b"]
+
+
+def test_strong_consistency_header_reads_primary(databases, client):
+    """Test that X-Read-Consistency: strong bypasses the replicas."""
+    databases("replica_a.db")
+
+    assert venue_name(client, **{"X-Read-Consistency": "strong"}) == "primary"
+    assert venue_name(client) == "replica_a"
+
+
+def test_writer_reads_own_writes_from_primary(databases, client):
+    """Test that a user who just wrote is pinned to the primary while others read replicas."""
+    databases("replica_a.db")
+
+    user_id = client.post("/users", json={"name": "Bob"}).json()["id"]
+    assert client.get(f"/users/{user_id}").status_code == 200
+
+    # Alice has not written, so her read goes to the replica, which lacks Bob
+    assert client.get("/users/1").status_code == 200
+    names = [u["name"] for u in client.get("/users").json()]
+    assert names == ["Alice"]
+
+
+def test_write_token_reads_primary_on_any_worker(databases, client):
+    """Test that the token returned by a write sends the client's next reads to the primary."""
+    databases("replica_a.db")
+
+    response = client.post("/users", json={"name": "Bob"})
+    token = response.headers[LAST_WRITE_HEADER]
+    user_id = response.json()["id"]
+    assert LAST_WRITE_HEADER not in client.get("/users/1").headers
+
+    # A worker that never saw the write has no pin for Bob; the token alone routes to the primary
+    primary_pins.clear()
+    assert client.get(f"/users/{user_id}").status_code == 404
+    assert client.get(f"/users/{user_id}", headers={LAST_WRITE_HEADER: token}).status_code == 200
+    assert venue_name(client, **{LAST_WRITE_HEADER: token}) == "primary"
+    assert venue_name(client, **{LAST_WRITE_HEADER: "0"}) == "replica_a"
+
+
+def test_unhealthy_replicas_are_skipped(databases, client):
+    """Test that replicas failing their health check are left out, falling back to the primary."""
+    databases("missing/replica.db", "replica_b.db")
+    assert {venue_name(client) for _ in range(3)} == {"replica_b"}
+
+    databases("missing/replica.db")
+    assert venue_name(client) == "primary"
+
+
+def test_requests_never_probe_replicas(databases, client, monkeypatch):
+    """Test that picking a replica only reads the last background check."""
+    replicas = databases("replica_a.db")
+
+    def probe(position):
+        raise AssertionError("probed on the request path")
+
+    monkeypatch.setattr(replicas, "_probe", probe)
+    assert venue_name(client) == "replica_a"
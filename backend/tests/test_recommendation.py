@@ -1,30 +1,16 @@
 import pytest
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from app.db import Base
+from app.config import settings
 from app.models import User, Venue, UserInterest, Friendship, InterestStatus
+from app.services.geohash import encode
 from app.services.recommendation import (
+    distance_cache,
+    distance_score,
     get_recommendations_for_user,
     haversine_distance,
     calculate_venue_score,
     calculate_person_compatibility,
 )
 
-# Use in-memory SQLite for testing
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-
-@pytest.fixture
-def db():
-    """Create a fresh database for each test."""
-    Base.metadata.create_all(bind=engine)
-    db = TestingSessionLocal()
-    yield db
-    db.close()
-    Base.metadata.drop_all(bind=engine)
-
 
 @pytest.fixture
 def seed_data(db):
@@ -178,3 +164,61 @@ def test_recommendations_include_people_for_each_venue(db, seed_data):
             assert "user" in person
             assert "compatibility_score" in person
             assert isinstance(person["compatibility_score"], float)
+
+
+def test_geohash_cells():
+    """Test geohash encoding and that nearby points share a ~150 m cell."""
+    assert encode(57.64911, 10.40744, 11)[0] == "u4pruydqqvj"
+    cell, centre = encode(40.7589, -73.9851)
+    assert cell == "dr5ru7v"
+    assert haversine_distance(40.7589, -73.9851, *centre) < 0.1
+    assert encode(40.7590, -73.9850)[0] == cell
+
+
+def test_distance_scores_shared_within_cell(db, seed_data):
+    """Test that users in the same cell reuse one distance vector and get identical venue scores."""
+    first = get_recommendations_for_user(db, user_id=1, user_location=(40.7589, -73.9851))
+    second = get_recommendations_for_user(db, user_id=1, user_location=(40.75886, -73.98515))
+
+    assert len(distance_cache) == 1
+    assert [(r["venue"].id, r["score"]) for r in first] == [(r["venue"].id, r["score"]) for r in second]
+
+    # Scores are taken from the cell centre, which is within a fraction of a point of the exact location
+    venue = first[-1]["venue"]
+    centre = distance_cache.for_location((40.7589, -73.9851)).centre
+    assert distance_cache.for_location((40.7589, -73.9851)).score(
+        venue.id, venue.latitude, venue.longitude
+    ) == distance_score(centre, venue.latitude, venue.longitude)
+    assert abs(
+        distance_score(centre, venue.latitude, venue.longitude)
+        - distance_score((40.7589, -73.9851), venue.latitude, venue.longitude)
+    ) < 1.0
+
+    get_recommendations_for_user(db, user_id=1, user_location=(40.7829, -73.9654))
+    assert len(distance_cache) == 2
+
+
+def test_distance_cache_bounded_by_total_scores(monkeypatch):
+    """Test that vectors grow with venues scored, not venue ids, and that cells are evicted past the budget."""
+    monkeypatch.setattr(settings, "RECOMMENDATION_DISTANCE_CACHE_ENTRIES", 150)
+    first = distance_cache.for_location((40.7589, -73.9851))
+    for venue_id in range(100_000, 100_100):
+        assert first.score(venue_id, 40.76, -73.98) == first.score(venue_id, 40.76, -73.98)
+    assert len(first) == 100
+
+    second = distance_cache.for_location((40.7829, -73.9654))
+    for venue_id in range(100_000, 100_100):
+        second.score(venue_id, 40.76, -73.98)
+    assert len(second) == 100
+    assert len(distance_cache) == 2
+
+    # 200 cached scores is over budget, so the next lookup evicts the least recently used cell
+    distance_cache.for_location((40.7829, -73.9654))
+    assert len(distance_cache) == 1
+    assert distance_cache.for_location((40.7829, -73.9654)) is second
+
+    # A cell over the budget on its own serves its request but is not kept
+    for venue_id in range(200_000, 200_100):
+        second.score(venue_id, 40.76, -73.98)
+    assert distance_cache.for_location((40.7829, -73.9654)) is second
+    assert len(distance_cache) == 0
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import metrics
+from app.services.singleflight import AsyncSingleFlight, SingleFlight
+
+
+def test_concurrent_calls_share_one_computation():
+    """Test that callers arriving while a key is in flight get the leader's result."""
+    flight = SingleFlight("test-shared")
+    coalesced = metrics.coalesced_requests_total.labels("test-shared")
+    calls = []
+
+    def compute():
+        calls.append(1)
+        # Hold the leader until the three followers are waiting on it
+        deadline = time.monotonic() + 5
+        while coalesced.value() < 3 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        return ["result"]
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(flight.do, ("user", 1), compute) for _ in range(4)]
+        results = [f.result(5) for f in futures]
+
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+
+    # Finished calls are not cached
+    assert flight.do(("user", 1), lambda: ["fresh"]) == ["fresh"]
+
+
+def test_errors_propagate_to_waiters():
+    """Test that a failed leader call raises in every coalesced caller."""
+    flight = SingleFlight("test-errors")
+    coalesced = metrics.coalesced_requests_total.labels("test-errors")
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        deadline = time.monotonic() + 5
+        while coalesced.value() < 1 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        raise ValueError("boom")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, "key", fail)
+        started.wait(5)
+        follower = pool.submit(flight.do, "key", lambda: "unused")
+        with pytest.raises(ValueError):
+            leader.result(5)
+        with pytest.raises(ValueError):
+            follower.result(5)
+
+
+def test_async_single_flight():
+    """Test coalescing on the event loop, with distinct keys computed separately."""
+    flight = AsyncSingleFlight("test-async")
+    calls = []
+
+    async def compute(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value
+
+    async def main():
+        return await asyncio.gather(
+            flight.do("a", lambda: compute("a")),
+            flight.do("a", lambda: compute("a")),
+            flight.do("b", lambda: compute("b")),
+        )
+
+    assert asyncio.run(main()) == ["a", "a", "b"]
+    assert sorted(calls) == ["a", "b"]
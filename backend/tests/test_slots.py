@@ -0,0 +1,234 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from app.models import (
+    User,
+    UserInterest,
+    Venue,
+    Reservation,
+    ReservationParticipant,
+    UserReservation,
+    InterestStatus,
+    ParticipantStatus,
+    ReservationStatus,
+)
+from app.services.agent import auto_create_reservation_if_ready
+from app.services.slots import SlotGrid, SlotTree, slot_allocator
+
+TOMORROW_7PM = (datetime.utcnow() + timedelta(days=1)).replace(hour=19, minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture
+def db(db):
+    """Users 1-6; venue 1 seats 3 per slot, venue 2 uses the default capacity."""
+    db.add_all([User(id=i, name=f"User {i}") for i in range(1, 7)])
+    db.add(Venue(id=1, name="Small", category="bar", address="x", latitude=0.0, longitude=0.0, capacity=3))
+    db.add(Venue(id=2, name="Large", category="bar", address="x", latitude=0.0, longitude=0.0))
+    db.commit()
+    return db
+
+
+def confirm(db, venue_id, user_ids):
+    db.add_all(
+        [UserInterest(user_id=u, venue_id=venue_id, status=InterestStatus.CONFIRMED) for u in user_ids]
+    )
+    db.commit()
+
+
+def test_first_fit_matches_linear_scan():
+    """Test the segment tree against a scan over random updates and queries."""
+    rng = random.Random(7)
+    free = [rng.randint(0, 6) for _ in range(37)]
+    tree = SlotTree(free)
+
+    for _ in range(500):
+        index = rng.randrange(len(free))
+        delta = rng.randint(-3, 3)
+        free[index] += delta
+        tree.add(index, delta)
+
+        start, seats = rng.randrange(len(free) + 2), rng.randint(1, 6)
+        expected = next((i for i in range(start, len(free)) if free[i] >= seats), None)
+        assert tree.first_fit(start, seats) == expected
+
+
+def test_grid_maps_times_to_slots():
+    """Test slot lookup at and between slot boundaries (default grid: hourly, 17:00-23:00)."""
+    grid = SlotGrid(datetime(2030, 1, 1))
+    day = datetime(2030, 1, 1)
+
+    assert grid.time_of(2) == day.replace(hour=19)
+    assert grid.index_of(day.replace(hour=19, minute=30)) == 2
+    assert grid.index_of(day.replace(hour=16)) is None
+    assert grid.index_of(day.replace(hour=23)) is None
+
+    assert grid.first_index_from(day.replace(hour=19)) == 2
+    assert grid.first_index_from(day.replace(hour=19, minute=1)) == 3
+    assert grid.first_index_from(day.replace(hour=9)) == 0
+    # After the last slot of the day comes the first slot of the next day
+    assert grid.first_index_from(day.replace(hour=22, minute=30)) == grid.per_day
+    assert grid.first_index_from(day + timedelta(days=grid.days)) == len(grid)
+
+
+def test_allocator_books_earliest_slot_with_room(db):
+    """Test that full slots are skipped, and that book and release are idempotent."""
+    assert slot_allocator.find(db, 1, 2, TOMORROW_7PM) == TOMORROW_7PM
+    assert slot_allocator.book(db, 1, 101, TOMORROW_7PM, 2)
+    assert slot_allocator.book(db, 1, 101, TOMORROW_7PM, 2)
+
+    # One seat left at 19:00, so a pair goes to 20:00 and a single still fits
+    assert slot_allocator.find(db, 1, 2, TOMORROW_7PM) == TOMORROW_7PM + timedelta(hours=1)
+    assert slot_allocator.find(db, 1, 1, TOMORROW_7PM) == TOMORROW_7PM
+    assert not slot_allocator.book(db, 1, 102, TOMORROW_7PM, 2)
+    assert slot_allocator.find(db, 1, 4, TOMORROW_7PM) is None
+
+    # Times outside the grid are not tracked
+    assert slot_allocator.book(db, 1, 103, TOMORROW_7PM.replace(hour=12), 50)
+
+    slot_allocator.release(1, 101)
+    slot_allocator.release(1, 101)
+    assert slot_allocator.find(db, 1, 3, TOMORROW_7PM) == TOMORROW_7PM
+
+
+def test_allocator_rebuilds_from_reservations(db):
+    """Test that a venue's grid counts seats of existing reservations, skipping decliners."""
+    db.add(Reservation(id=1, venue_id=1, created_by_user_id=1, time=TOMORROW_7PM))
+    db.add_all(
+        [
+            ReservationParticipant(reservation_id=1, user_id=1, status=ParticipantStatus.ACCEPTED),
+            ReservationParticipant(reservation_id=1, user_id=2, status=ParticipantStatus.INVITED),
+            ReservationParticipant(reservation_id=1, user_id=3, status=ParticipantStatus.DECLINED),
+        ]
+    )
+    db.commit()
+
+    assert slot_allocator.find(db, 1, 1, TOMORROW_7PM) == TOMORROW_7PM
+    assert slot_allocator.find(db, 1, 2, TOMORROW_7PM) == TOMORROW_7PM + timedelta(hours=1)
+
+
+def test_agent_spreads_groups_over_slots(db):
+    """Test that the agent books past a full slot, and that newcomers join the group's reservation."""
+    db.add(Reservation(id=1, venue_id=1, created_by_user_id=5, time=TOMORROW_7PM))
+    db.add_all(
+        [ReservationParticipant(reservation_id=1, user_id=u, status=ParticipantStatus.ACCEPTED) for u in (5, 6)]
+    )
+    db.commit()
+    confirm(db, 1, [1, 2, 3])
+
+    result = auto_create_reservation_if_ready(db, 1, [1, 2], TOMORROW_7PM, creator_user_id=1)
+    assert result["message"] == "Reservation created successfully"
+    assert result["reservation"].time == TOMORROW_7PM + timedelta(hours=1)
+
+    result = auto_create_reservation_if_ready(db, 1, [1, 2, 3], TOMORROW_7PM, creator_user_id=3)
+    assert result["message"] == "Joined existing reservation"
+    assert {p.user_id for p in result["reservation"].participants} == {1, 2, 3}
+    assert db.query(Reservation).count() == 2
+    plans = db.query(UserReservation).filter_by(reservation_id=result["reservation"].id)
+    assert {row.user_id for row in plans} == {1, 2, 3}
+
+    # The 20:00 slot is now full
+    confirm(db, 1, [4])
+    result = auto_create_reservation_if_ready(db, 1, [1, 2, 3, 4], TOMORROW_7PM, creator_user_id=4)
+    assert not result["success"]
+    assert slot_allocator.find(db, 1, 1, TOMORROW_7PM + timedelta(hours=1)) == TOMORROW_7PM + timedelta(hours=2)
+
+
+def test_agent_leaves_user_plans_alone(db):
+    """Test that the agent never adds confirmed users to reservations it did not book, or past its horizon."""
+    # User 1's own plans: one tonight at the requested slot, one ten days out
+    db.add(Reservation(id=1, venue_id=2, created_by_user_id=1, time=TOMORROW_7PM))
+    db.add(Reservation(id=2, venue_id=2, created_by_user_id=1, time=TOMORROW_7PM + timedelta(days=10)))
+    # An agent booking for user 1 beyond the slot horizon
+    db.add(
+        Reservation(
+            id=3,
+            venue_id=2,
+            created_by_user_id=1,
+            time=TOMORROW_7PM + timedelta(days=20),
+            status=ReservationStatus.CONFIRMED,
+            created_by_agent=True,
+        )
+    )
+    db.add_all(
+        [ReservationParticipant(reservation_id=r, user_id=1, status=ParticipantStatus.ACCEPTED) for r in (1, 2, 3)]
+    )
+    db.commit()
+    confirm(db, 2, [1, 2])
+
+    result = auto_create_reservation_if_ready(db, 2, [1, 2], TOMORROW_7PM, creator_user_id=2)
+    assert result["message"] == "Reservation created successfully"
+    assert result["reservation"].id not in (1, 2, 3)
+    for reservation_id in (1, 2, 3):
+        assert db.query(ReservationParticipant).filter_by(reservation_id=reservation_id).count() == 1
+
+    # The agent's own booking for the evening is joined by later confirmations
+    confirm(db, 2, [3])
+    joined = auto_create_reservation_if_ready(db, 2, [1, 2, 3], TOMORROW_7PM, creator_user_id=3)
+    assert joined["message"] == "Joined existing reservation"
+    assert joined["reservation"].id == result["reservation"].id
+
+
+def test_agent_finds_group_moved_to_a_later_day(db):
+    """Test that a newcomer joins the group's booking after the agent moved it past a full evening."""
+    # Every slot from 19:00 tomorrow is full at venue 1 (3 seats)
+    for hour in range(19, 23):
+        reservation_id = hour
+        db.add(
+            Reservation(id=reservation_id, venue_id=1, created_by_user_id=4, time=TOMORROW_7PM.replace(hour=hour))
+        )
+        db.add_all(
+            [
+                ReservationParticipant(reservation_id=reservation_id, user_id=u, status=ParticipantStatus.ACCEPTED)
+                for u in (4, 5, 6)
+            ]
+        )
+    db.commit()
+    confirm(db, 1, [1, 2])
+
+    booked = auto_create_reservation_if_ready(db, 1, [1, 2], TOMORROW_7PM, creator_user_id=1)
+    assert booked["reservation"].time == TOMORROW_7PM.replace(hour=17) + timedelta(days=1)
+
+    confirm(db, 1, [3])
+    joined = auto_create_reservation_if_ready(db, 1, [1, 2, 3], TOMORROW_7PM, creator_user_id=3)
+    assert joined["message"] == "Joined existing reservation"
+    assert joined["reservation"].id == booked["reservation"].id
+
+
+def test_shrink_returns_declined_seats(db):
+    """Test that shrinking a hold frees seats at once, and that it never grows one."""
+    assert slot_allocator.book(db, 1, 101, TOMORROW_7PM, 3)
+    assert slot_allocator.find(db, 1, 1, TOMORROW_7PM) == TOMORROW_7PM + timedelta(hours=1)
+
+    slot_allocator.shrink(1, 101, 1)
+    slot_allocator.shrink(1, 101, 3)
+    assert slot_allocator.find(db, 1, 2, TOMORROW_7PM) == TOMORROW_7PM
+    assert slot_allocator.find(db, 1, 3, TOMORROW_7PM) == TOMORROW_7PM + timedelta(hours=1)
+
+
+def test_refresh_rereads_only_the_given_slots(db):
+    """Test that refresh picks up seats booked elsewhere in its slots and leaves other slots alone."""
+    assert slot_allocator.find(db, 1, 3, TOMORROW_7PM) == TOMORROW_7PM
+
+    # Booked by another worker at 19:00 and 20:00
+    for reservation_id, time in ((1, TOMORROW_7PM), (2, TOMORROW_7PM + timedelta(hours=1))):
+        db.add(Reservation(id=reservation_id, venue_id=1, created_by_user_id=1, time=time))
+        db.add_all(
+            [
+                ReservationParticipant(reservation_id=reservation_id, user_id=u, status=ParticipantStatus.ACCEPTED)
+                for u in (1, 2)
+            ]
+        )
+    db.commit()
+
+    slot_allocator.refresh(db, 1, TOMORROW_7PM, TOMORROW_7PM + timedelta(minutes=30))
+    assert slot_allocator.find(db, 1, 2, TOMORROW_7PM) == TOMORROW_7PM + timedelta(hours=1)
+
+    slot_allocator.refresh(db, 1, TOMORROW_7PM + timedelta(hours=1), TOMORROW_7PM + timedelta(hours=1))
+    assert slot_allocator.find(db, 1, 2, TOMORROW_7PM) == TOMORROW_7PM + timedelta(hours=2)
+
+    # A cancellation elsewhere hands the seats back on the next refresh
+    db.query(Reservation).filter(Reservation.id == 1).update({"status": ReservationStatus.CANCELLED})
+    db.commit()
+    slot_allocator.refresh(db, 1, TOMORROW_7PM, TOMORROW_7PM)
+    assert slot_allocator.find(db, 1, 3, TOMORROW_7PM) == TOMORROW_7PM
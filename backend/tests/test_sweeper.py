@@ -0,0 +1,187 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import metrics
+from app.config import settings
+from app.models import (
+    ReservationArchive,
+    ReservationParticipantArchive,
+    User,
+    Venue,
+    Reservation,
+    ReservationParticipant,
+    ReservationStatus,
+    ParticipantStatus,
+)
+from app.routers.reservations import get_user_reservations
+from app.services import plans, sweeper
+from app.services.availability import availability_index
+
+NOW = datetime(2030, 1, 10, 12, 0)
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'sweeper.db'}"
+
+
+@pytest.fixture
+def session_factory(session_factory, monkeypatch):
+    monkeypatch.setattr(sweeper, "SessionLocal", session_factory)
+    monkeypatch.setattr(settings, "SWEEPER_BATCH_PAUSE_SECONDS", 0)
+
+    db = session_factory()
+    db.add_all([User(id=i, name=f"User {i}") for i in range(1, 4)])
+    db.add(Venue(id=1, name="Bar", category="bar", address="x", latitude=0.0, longitude=0.0))
+    db.commit()
+    db.close()
+    return session_factory
+
+
+def add_reservation(db, reservation_id, time, status=ReservationStatus.PENDING, created_at=NOW, invited=(2,)):
+    db.add(
+        Reservation(
+            id=reservation_id, venue_id=1, created_by_user_id=1, time=time, status=status, created_at=created_at
+        )
+    )
+    db.add(ReservationParticipant(reservation_id=reservation_id, user_id=1, status=ParticipantStatus.ACCEPTED))
+    db.add_all(
+        [
+            ReservationParticipant(reservation_id=reservation_id, user_id=u, status=ParticipantStatus.INVITED)
+            for u in invited
+        ]
+    )
+
+
+def statuses(db):
+    return {r.id: r.status for r in db.query(Reservation).all()}
+
+
+def test_sweep_expires_stale_pending_and_dead_invitations(session_factory):
+    """Test that past or old PENDING reservations are cancelled and their open invitations declined."""
+    db = session_factory()
+    add_reservation(db, 1, NOW - timedelta(hours=1))
+    add_reservation(db, 2, NOW + timedelta(days=1), created_at=NOW - timedelta(hours=200))
+    add_reservation(db, 3, NOW + timedelta(days=1))
+    add_reservation(db, 4, NOW - timedelta(days=1), status=ReservationStatus.CONFIRMED)
+    add_reservation(db, 5, NOW + timedelta(days=1), status=ReservationStatus.CANCELLED)
+    db.commit()
+    db.close()
+
+    expired_before = metrics.sweeper_rows_total.labels("expire").value()
+    counts = sweeper.sweep(NOW)
+
+    assert counts == {"expire": 2, "invitations": 4, "purge": 0, "archive": 0}
+    assert metrics.sweeper_rows_total.labels("expire").value() == expired_before + 2
+    db = session_factory()
+    assert statuses(db) == {
+        1: ReservationStatus.CANCELLED,
+        2: ReservationStatus.CANCELLED,
+        3: ReservationStatus.PENDING,
+        # Past confirmed reservations stay as history
+        4: ReservationStatus.CONFIRMED,
+        5: ReservationStatus.CANCELLED,
+    }
+    invited = {
+        p.reservation_id
+        for p in db.query(ReservationParticipant).filter(ReservationParticipant.status == ParticipantStatus.INVITED)
+    }
+    assert invited == {3}
+    db.close()
+
+    assert sweeper.sweep(NOW) == {"expire": 0, "invitations": 0, "purge": 0, "archive": 0}
+
+
+def test_sweep_stops_after_max_batches(session_factory, monkeypatch):
+    """Test that a run handles at most SWEEPER_MAX_BATCHES batches and the next run picks up the rest."""
+    monkeypatch.setattr(settings, "SWEEPER_BATCH_SIZE", 2)
+    monkeypatch.setattr(settings, "SWEEPER_MAX_BATCHES", 2)
+    db = session_factory()
+    for reservation_id in range(1, 8):
+        add_reservation(db, reservation_id, NOW - timedelta(hours=1), invited=())
+    db.commit()
+    db.close()
+
+    batches_before = metrics.sweeper_batches_total.labels("expire").value()
+    assert sweeper.sweep(NOW)["expire"] == 4
+    assert metrics.sweeper_batches_total.labels("expire").value() == batches_before + 2
+    assert sweeper.sweep(NOW)["expire"] == 3
+
+    db = session_factory()
+    assert set(statuses(db).values()) == {ReservationStatus.CANCELLED}
+    db.close()
+
+
+def test_sweep_purges_old_cancelled_reservations(session_factory, monkeypatch):
+    """Test that purging is off by default and removes only old cancelled reservations when enabled."""
+    db = session_factory()
+    add_reservation(db, 1, NOW - timedelta(days=40), status=ReservationStatus.CANCELLED)
+    add_reservation(db, 2, NOW - timedelta(days=5), status=ReservationStatus.CANCELLED)
+    add_reservation(db, 3, NOW - timedelta(days=40), status=ReservationStatus.CONFIRMED)
+    db.commit()
+    db.close()
+
+    assert sweeper.sweep(NOW)["purge"] == 0
+
+    monkeypatch.setattr(settings, "SWEEPER_PURGE_CANCELLED_AFTER_DAYS", 30)
+    assert sweeper.sweep(NOW)["purge"] == 1
+
+    db = session_factory()
+    assert set(statuses(db)) == {2, 3}
+    assert db.query(ReservationParticipant).filter(ReservationParticipant.reservation_id == 1).count() == 0
+    db.close()
+
+
+def test_sweep_archives_cold_reservations(session_factory, monkeypatch):
+    """Test that reservations past the hot horizon move to the archive tables with their participants."""
+    db = session_factory()
+    add_reservation(db, 1, NOW - timedelta(days=40), status=ReservationStatus.CONFIRMED)
+    add_reservation(db, 2, NOW - timedelta(days=70), status=ReservationStatus.CANCELLED)
+    add_reservation(db, 3, NOW - timedelta(days=5), status=ReservationStatus.CONFIRMED)
+    db.commit()
+    plans.rebuild(db)
+    db.commit()
+
+    assert sweeper.sweep(NOW)["archive"] == 0
+
+    monkeypatch.setattr(settings, "RESERVATION_ARCHIVE_AFTER_DAYS", 30)
+    assert sweeper.sweep(NOW)["archive"] == 2
+
+    assert set(statuses(db)) == {3}
+    assert db.query(ReservationParticipant).filter(ReservationParticipant.reservation_id != 3).count() == 0
+    archived = {r.id: (r.time, r.status) for r in db.query(ReservationArchive)}
+    assert archived == {
+        1: (NOW - timedelta(days=40), ReservationStatus.CONFIRMED),
+        2: (NOW - timedelta(days=70), ReservationStatus.CANCELLED),
+    }
+    participants = {(p.reservation_id, p.user_id, p.status) for p in db.query(ReservationParticipantArchive)}
+    assert participants == {
+        (1, 1, ParticipantStatus.ACCEPTED),
+        (1, 2, ParticipantStatus.DECLINED),
+        (2, 1, ParticipantStatus.ACCEPTED),
+        (2, 2, ParticipantStatus.DECLINED),
+    }
+
+    # The users' listings still show the archived history, oldest first or newest first
+    listing = get_user_reservations(2, True, None, None, db=db)
+    assert [r.id for r in listing] == [2, 1, 3]
+    assert {p.user_id: p.status for p in listing[1].participants} == {
+        1: ParticipantStatus.ACCEPTED,
+        2: ParticipantStatus.DECLINED,
+    }
+    assert listing[1].venue.name == "Bar"
+    def listed(user_id, include_cancelled=True, when=None, limit=None):
+        return [r.id for r in get_user_reservations(user_id, include_cancelled, when, limit, db=db)]
+
+    assert listed(1, include_cancelled=False) == [1, 3]
+    assert listed(1, limit=2) == [2, 1]
+    # "past" is relative to the real clock, which NOW (2030) is ahead of
+    assert listed(1, when="past") == [1, 2]
+
+    # Only hot reservations are loaded into the availability index
+    add_reservation(db, 4, datetime.utcnow() - timedelta(days=40), status=ReservationStatus.CONFIRMED, invited=())
+    db.commit()
+    availability_index.rebuild(db)
+    assert availability_index.overlapping(1, datetime(2000, 1, 1), datetime(2100, 1, 1)) == [3]
+    db.close()
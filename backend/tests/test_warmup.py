@@ -0,0 +1,66 @@
+from datetime import datetime
+
+from app import warmup
+from app.models import (
+    User,
+    Venue,
+    UserInterest,
+    InterestStatus,
+    Reservation,
+    ReservationParticipant,
+    UserReservation,
+)
+from app.services.aggregates import interest_index
+from app.services.graph import social_graph
+from app.services.people import people_suggestions
+from app.services.plans import backfill_if_empty
+
+
+def test_warm_up_runs_every_step(engine, session_factory, monkeypatch):
+    """Test that warm-up opens connections, compiles hot queries, loads the indexes and computes suggestions."""
+    db = session_factory()
+    db.add(User(id=1, name="Alice"))
+    db.add(Venue(id=1, name="Cafe", category="cafe", address="x", latitude=0.0, longitude=0.0))
+    db.add(UserInterest(user_id=1, venue_id=1, status=InterestStatus.INTERESTED))
+    db.commit()
+    db.close()
+
+    monkeypatch.setattr(warmup, "engine", engine)
+    monkeypatch.setattr(warmup, "SessionLocal", session_factory)
+    timings = warmup.warm_up()
+
+    assert list(timings) == ["mappers", "pool", "plans", "statements", "caches"]
+    assert interest_index.loaded and social_graph.loaded
+    assert people_suggestions.computed
+    assert interest_index.popularity(1) == 1
+
+
+def test_warm_up_failures_are_not_fatal(monkeypatch):
+    """Test that a failing step is logged and the remaining steps still run."""
+
+    def unavailable():
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(warmup, "_open_connections", lambda *args: unavailable())
+    monkeypatch.setattr(warmup, "_compile_hot_statements", unavailable)
+    monkeypatch.setattr(warmup, "preload_indexes", unavailable)
+    monkeypatch.setattr(warmup, "_backfill_plans", unavailable)
+
+    assert set(warmup.warm_up()) == {"mappers", "pool", "plans", "statements", "caches"}
+
+
+def test_warm_up_backfills_plans_index(engine, session_factory, db, monkeypatch):
+    """Test that existing reservations are indexed per user on the first start after the table was added."""
+    db.add_all([User(id=1, name="Alice"), User(id=2, name="Bob")])
+    db.add(Venue(id=1, name="Cafe", category="cafe", address="x", latitude=0.0, longitude=0.0))
+    db.add(Reservation(id=1, venue_id=1, created_by_user_id=1, time=datetime(2030, 1, 1, 19)))
+    db.add(ReservationParticipant(reservation_id=1, user_id=2))
+    db.commit()
+
+    monkeypatch.setattr(warmup, "engine", engine)
+    monkeypatch.setattr(warmup, "SessionLocal", session_factory)
+    warmup.warm_up()
+
+    assert {(row.user_id, row.reservation_id) for row in db.query(UserReservation)} == {(1, 1), (2, 1)}
+    # Once filled, later starts leave the table alone
+    assert backfill_if_empty(db) is None
@@ -0,0 +1,28 @@
+-- Schema upgrade for databases created before the reservation slot, agent, archive and precompute changes
+-- `init_db()` creates missing tables but never alters existing ones, so run this once after it:
+--   docker-compose exec -T db psql -U luna -d luna -f /upgrade_schema.sql
+-- Every statement is idempotent, so running it on an up-to-date database changes nothing.
+
+-- Seats per reservation slot; NULL uses VENUE_DEFAULT_CAPACITY
+ALTER TABLE venues ADD COLUMN IF NOT EXISTS capacity INTEGER;
+
+-- Reservations booked by the agent; only these take in more confirmed users
+ALTER TABLE reservations ADD COLUMN IF NOT EXISTS created_by_agent BOOLEAN NOT NULL DEFAULT false;
+ALTER TABLE reservations_archive ADD COLUMN IF NOT EXISTS created_by_agent BOOLEAN NOT NULL DEFAULT false;
+
+-- Per-venue time-window lookups
+CREATE INDEX IF NOT EXISTS ix_reservations_venue_time ON reservations (venue_id, time);
+
+-- Participants go with their reservation when it is purged or archived
+ALTER TABLE reservation_participants
+    DROP CONSTRAINT IF EXISTS reservation_participants_reservation_id_fkey,
+    ADD CONSTRAINT reservation_participants_reservation_id_fkey
+        FOREIGN KEY (reservation_id) REFERENCES reservations (id) ON DELETE CASCADE;
+
+-- A user's archived history, read back by the reservation listing
+CREATE INDEX IF NOT EXISTS ix_reservations_archive_creator_time ON reservations_archive (created_by_user_id, time);
+CREATE INDEX IF NOT EXISTS ix_reservation_participants_archive_user_time
+    ON reservation_participants_archive (user_id, time);
+
+-- Invalidation counter compared by the precompute batch
+ALTER TABLE precomputed_recommendations ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 0;
@@ -1,6 +1,12 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, has_request_context
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import requests
 import os
+import threading
+import time
 from datetime import datetime
 
 app = Flask(__name__)
@@ -8,21 +14,187 @@ app.secret_key = 'luna-dev-secret-key-change-in-production'
 
 # Backend API configuration
 API_BASE_URL = os.getenv('API_BASE_URL', 'http://api:8000')
+API_TIMEOUT = float(os.getenv('API_TIMEOUT', '5'))
+API_RETRIES = int(os.getenv('API_RETRIES', '2'))
+API_RETRY_BACKOFF = float(os.getenv('API_RETRY_BACKOFF', '0.2'))
+API_POOL_SIZE = int(os.getenv('API_POOL_SIZE', '20'))
+API_FANOUT_WORKERS = int(os.getenv('API_FANOUT_WORKERS', '8'))
+API_CACHE_TTL = float(os.getenv('API_CACHE_TTL', '30'))
+API_CACHE_MAX_ENTRIES = int(os.getenv('API_CACHE_MAX_ENTRIES', '512'))
+
+
+def create_api_session():
+    """Build a keep-alive session with a bounded connection pool and retries.
+
+    Only idempotent methods are retried; POST/DELETE failures surface immediately.
+    """
+    retry = Retry(
+        total=API_RETRIES,
+        backoff_factor=API_RETRY_BACKOFF,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=API_POOL_SIZE, pool_maxsize=API_POOL_SIZE, max_retries=retry)
+    http = requests.Session()
+    http.mount('http://', adapter)
+    http.mount('https://', adapter)
+    return http
+
+
+class ResponseCache:
+    """TTL and size bounded LRU cache for GET responses, keyed by (endpoint, user).
+
+    Entries keep the backend ETag so expired entries can be revalidated with
+    If-None-Match instead of downloaded again.
+    """
+
+    def __init__(self, default_ttl, max_entries):
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (data, etag, fresh) for a cached entry, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            data, etag, expires_at = entry
+            return data, etag, time.monotonic() < expires_at
+
+    def set(self, key, data, etag, ttl):
+        with self._lock:
+            self._entries[key] = (data, etag, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def touch(self, key, ttl):
+        """Extend an entry's lifetime after a 304 Not Modified."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], entry[1], time.monotonic() + ttl)
+
+    def invalidate(self, *prefixes):
+        """Drop entries whose endpoint starts with any prefix, for every user."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0].startswith(prefixes)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def cache_policy(response):
+    """Return (cacheable, ttl) from the backend's Cache-Control header."""
+    directives = {}
+    for part in response.headers.get('Cache-Control', '').split(','):
+        name, _, value = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = value
+    if 'no-store' in directives:
+        return False, 0
+    if 'no-cache' in directives:
+        return True, 0
+    if 'max-age' in directives:
+        try:
+            return True, max(0, int(directives['max-age']))
+        except ValueError:
+            pass
+    return True, API_CACHE_TTL
+
+
+def current_cache_user():
+    """Session user used to scope cache entries (None outside a request)."""
+    if has_request_context():
+        return session.get('user_id')
+    return None
+
+
+def current_write_token():
+    """Read-your-writes token from this session's last API write (None outside a request)."""
+    if has_request_context():
+        return session.get('last_write')
+    return None
+
+
+def remember_write(response):
+    """Keep the API's read-your-writes token so this user's next reads go to the primary."""
+    token = response.headers.get('X-Last-Write')
+    if token and has_request_context():
+        session['last_write'] = token
+
+
+# Shared across requests (and fan-out threads) so connections are reused
+api_session = create_api_session()
+api_executor = ThreadPoolExecutor(max_workers=API_FANOUT_WORKERS, thread_name_prefix='api-fanout')
+api_cache = ResponseCache(API_CACHE_TTL, API_CACHE_MAX_ENTRIES)
+
+_NO_USER = object()
+
 
 # Helper function to make API calls
-def api_get(endpoint):
+def api_get(endpoint, cache_user=_NO_USER, write_token=_NO_USER):
+    if cache_user is _NO_USER:
+        cache_user = current_cache_user()
+    if write_token is _NO_USER:
+        write_token = current_write_token()
+    key = (endpoint, cache_user)
+
+    cached = api_cache.get(key)
+    if cached and cached[2]:
+        return cached[0]
+
+    headers = {}
+    if cached and cached[1]:
+        headers['If-None-Match'] = cached[1]
+    if write_token:
+        headers['X-Last-Write'] = write_token
+
     try:
-        response = requests.get(f"{API_BASE_URL}{endpoint}", timeout=5)
+        response = api_session.get(f"{API_BASE_URL}{endpoint}", headers=headers, timeout=API_TIMEOUT)
+        if response.status_code == 304 and cached:
+            _, ttl = cache_policy(response)
+            api_cache.touch(key, ttl)
+            return cached[0]
         response.raise_for_status()
-        return response.json()
+        data = response.json()
     except requests.exceptions.RequestException as e:
         print(f"API Error: {e}")
         return None
 
+    cacheable, ttl = cache_policy(response)
+    etag = response.headers.get('ETag')
+    if cacheable and (ttl > 0 or etag):
+        api_cache.set(key, data, etag, ttl)
+    return data
+
+def api_get_many(*endpoints):
+    """Fetch several endpoints in parallel, returning results in the same order."""
+    cache_user = current_cache_user()
+    write_token = current_write_token()
+    return list(api_executor.map(lambda endpoint: api_get(endpoint, cache_user, write_token), endpoints))
+
 def api_post(endpoint, data):
     try:
-        response = requests.post(f"{API_BASE_URL}{endpoint}", json=data, timeout=5)
+        response = api_session.post(f"{API_BASE_URL}{endpoint}", json=data, timeout=API_TIMEOUT)
+        response.raise_for_status()
+        remember_write(response)
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        print(f"API Error: {e}")
+        return None
+
+def api_delete(endpoint):
+    try:
+        response = api_session.delete(f"{API_BASE_URL}{endpoint}", timeout=API_TIMEOUT)
         response.raise_for_status()
+        remember_write(response)
         return response.json()
     except requests.exceptions.RequestException as e:
         print(f"API Error: {e}")
@@ -68,14 +240,15 @@ def discover():
 
     user_id = session['user_id']
 
-    # Get recommendations (you can add lat/lon from request if needed)
-    recommendations = api_get(f'/recommendations/{user_id}')
+    # Get recommendations and pending plans in one call (you can add lat/lon from request if needed)
+    home = api_get(f'/users/{user_id}/home')
 
-    if not recommendations:
-        recommendations = {'recommended_venues': []}
+    if not home:
+        home = {'recommended_venues': [], 'pending_reservations': []}
 
     return render_template('discover.html',
-                         recommendations=recommendations['recommended_venues'],
+                         recommendations=home['recommended_venues'],
+                         pending_reservations=home['pending_reservations'],
                          current_page='discover')
 
 
@@ -119,6 +292,9 @@ def confirm_interest(venue_id):
         'status': 'CONFIRMED'
     })
 
+    # Interests feed friends' recommendations and can auto-create reservations
+    api_cache.invalidate('/recommendations/', '/reservations/', '/users/')
+
     if result:
         return jsonify({'success': True, 'message': 'Interest confirmed!'})
     else:
@@ -157,6 +333,8 @@ def accept_reservation(reservation_id):
         'user_id': user_id
     })
 
+    api_cache.invalidate('/reservations/', '/users/')
+
     if result:
         return jsonify({'success': True, 'message': result.get('message', 'Reservation accepted!')})
     else:
@@ -169,13 +347,12 @@ def cancel_reservation(reservation_id):
     if 'user_id' not in session:
         return jsonify({'error': 'Not logged in'}), 401
 
-    try:
-        response = requests.delete(f"{API_BASE_URL}/reservations/{reservation_id}", timeout=5)
-        response.raise_for_status()
-        result = response.json()
+    result = api_delete(f'/reservations/{reservation_id}')
+    api_cache.invalidate('/reservations/', '/users/')
+
+    if result:
         return jsonify({'success': True, 'message': result.get('message', 'Reservation cancelled!')})
-    except requests.exceptions.RequestException as e:
-        print(f"API Error: {e}")
+    else:
         return jsonify({'success': False, 'message': 'Failed to cancel reservation'}), 500
 
 
@@ -187,19 +364,16 @@ def profile():
 
     user_id = session['user_id']
 
-    # Get user details
-    user = api_get(f'/users/{user_id}')
-
-    # Get user's friends
-    friends = api_get(f'/users/{user_id}/friends')
+    # Get user details, friends and interests in one call
+    profile_data = api_get(f'/users/{user_id}/profile')
 
-    # Get user's interests
-    interests = api_get(f'/users/{user_id}/interests')
+    if not profile_data:
+        profile_data = {'user': None, 'friends': [], 'interests': []}
 
     return render_template('profile.html',
-                         user=user,
-                         friends=friends if friends else [],
-                         interests=interests if interests else [],
+                         user=profile_data['user'],
+                         friends=profile_data['friends'],
+                         interests=profile_data['interests'],
                          current_page='profile')
 
 